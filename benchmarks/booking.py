@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Contention benchmark of the multi-pool resource booking of dci-queue.
+
+Concurrent workers book one resource in each of several pools, hold
+them briefly and free them. The legacy strategy (one symlink at a time,
+given back on failure) is compared with run_cmd.book_resources.
+
+A partial booking is a resource taken then given back because another
+pool was exhausted. A double booking is a resource held by 2 workers at
+the same time: it must never happen.
+
+Usage: python3 benchmarks/booking.py [-w WORKERS] [-p POOLS] [-r RESOURCES] [--json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dciqueue import main as dciqueue_main  # noqa: E402
+from dciqueue import run_cmd  # noqa: E402
+
+
+def legacy_book_resources(top_dir, pools, stats):
+    """Book the resources one pool at a time like dci-queue used to."""
+    booked = []
+    for pool in pools:
+        available_dir = os.path.join(top_dir, "available", pool)
+        res = None
+        for name in os.listdir(available_dir):
+            if not os.path.islink(os.path.join(available_dir, name)):
+                continue
+            try:
+                os.remove(os.path.join(available_dir, name))
+                res = name
+                break
+            except FileNotFoundError:
+                continue
+        if res is None:
+            if booked:
+                stats["partial"] += len(booked)
+            run_cmd.free_resources(booked, top_dir)
+            return None
+        booked.append((res, pool))
+    return booked
+
+
+def worker(top_dir, strategy, pools, duration, queue):
+    stats = {"booked": 0, "failed": 0, "partial": 0, "double": 0}
+    hold_dir = os.path.join(top_dir, "held")
+    end = time.time() + duration
+    while time.time() < end:
+        if strategy == "legacy":
+            booked = legacy_book_resources(top_dir, pools, stats)
+        else:
+            booked = run_cmd.book_resources(top_dir, pools)
+        if booked is None:
+            stats["failed"] += 1
+            continue
+        markers = []
+        for res, pool in booked:
+            marker = os.path.join(hold_dir, "%s-%s" % (pool, res))
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+                markers.append(marker)
+            except FileExistsError:
+                stats["double"] += 1
+        stats["booked"] += 1
+        time.sleep(0.001)
+        for marker in markers:
+            os.unlink(marker)
+        run_cmd.free_resources(booked, top_dir)
+    queue.put(stats)
+
+
+def run(strategy, args):
+    top_dir = tempfile.mkdtemp(prefix="dci-queue-bench-")
+    os.environ["DCI_QUEUE_DIR"] = top_dir
+    os.environ["DCI_QUEUE_LOG_LEVEL"] = "ERROR"
+    try:
+        pools = ["pool%d" % num for num in range(args.pools)]
+        for pool in pools:
+            dciqueue_main.main(["dci-queue", "add-pool", "-n", pool])
+            for num in range(args.resources):
+                dciqueue_main.main(["dci-queue", "add-resource", pool, "res%d" % num])
+        os.mkdir(os.path.join(top_dir, "held"))
+        queue = multiprocessing.Queue()
+        procs = []
+        for num in range(args.workers):
+            # each worker books the pools in a different order
+            order = pools[num % len(pools) :] + pools[: num % len(pools)]
+            procs.append(
+                multiprocessing.Process(
+                    target=worker,
+                    args=(top_dir, strategy, order, args.duration, queue),
+                )
+            )
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    finally:
+        shutil.rmtree(top_dir)
+    total = {key: sum(res[key] for res in results) for key in results[0]}
+    total["bookings_per_sec"] = round(total["booked"] / args.duration, 1)
+    return total
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-w", "--workers", type=int, default=8)
+    parser.add_argument("-p", "--pools", type=int, default=3)
+    parser.add_argument("-r", "--resources", type=int, default=3)
+    parser.add_argument("-d", "--duration", type=float, default=3.0)
+    parser.add_argument("--json", action="store_true", help="JSON output")
+    args = parser.parse_args(argv[1:])
+
+    results = {strategy: run(strategy, args) for strategy in ("legacy", "atomic")}
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return 0
+
+    print(
+        "%-8s %10s %10s %10s %10s %12s"
+        % ("strategy", "booked", "failed", "partial", "double", "bookings/s")
+    )
+    for strategy, res in results.items():
+        print(
+            "%-8s %10d %10d %10d %10d %12.1f"
+            % (
+                strategy,
+                res["booked"],
+                res["failed"],
+                res["partial"],
+                res["double"],
+                res["bookings_per_sec"],
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
+
+# booking.py ends here
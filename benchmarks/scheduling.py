@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Simulate the dci-queue scheduling policies on a synthetic workload.
+
+One user floods the pool with high priority commands while other users
+submit normal priority commands. The wait times (p50/p95/max) are
+reported per policy and per user.
+
+Usage: python3 benchmarks/scheduling.py [-r RESOURCES] [-n COMMANDS] [--json]
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dciqueue import lib, scheduling  # noqa: E402
+
+# user: (share of the submissions, priority, mean duration in seconds)
+WORKLOAD = {
+    "ci": (0.6, 1, 3600),
+    "fred": (0.2, 0, 3600),
+    "alice": (0.2, 0, 1800),
+}
+
+
+def generate(count, resources, load, seed):
+    """Return (arrival, duration, user, priority) tuples for a Poisson arrival."""
+    rng = random.Random(seed)
+    users = list(WORKLOAD)
+    weights = [WORKLOAD[u][0] for u in users]
+    mean = sum(WORKLOAD[u][0] * WORKLOAD[u][2] for u in users)
+    rate = load * resources / mean
+    now = 0.0
+    commands = []
+    for _ in range(count):
+        now += rng.expovariate(rate)
+        user = rng.choices(users, weights)[0]
+        _, priority, duration = WORKLOAD[user]
+        commands.append((now, rng.expovariate(1.0 / duration), user, priority))
+    return commands
+
+
+def get_estimates():
+    """Expected durations as the history would compute them."""
+    estimates = {
+        lib.get_fingerprint({"cmd": [user], "wd": "/home/" + user}): duration
+        for user, (_, _, duration) in WORKLOAD.items()
+    }
+    estimates[None] = None
+    return estimates
+
+
+def simulate(commands, resources, config):
+    """Return {user: [wait times]} running the commands with a policy."""
+    estimates = get_estimates()
+    waits = {}
+    queued = []
+    executing = {}
+    completions = []
+    free = resources
+    pos = 0
+    while pos < len(commands) or queued or completions:
+        if completions and (
+            pos >= len(commands) or completions[0][0] <= commands[pos][0]
+        ):
+            now, idx = heapq.heappop(completions)
+            del executing[idx]
+            free += 1
+        else:
+            arrival, duration, user, priority = commands[pos]
+            now = arrival
+            data = {
+                "priority": priority,
+                "user": user,
+                "cmd": [user],
+                "wd": "/home/" + user,
+                "queued_at": arrival,
+                "duration": duration,
+            }
+            queued.append((pos, data, arrival))
+            pos += 1
+        while free and queued:
+            cmd = scheduling.select_command(
+                queued, list(executing.values()), config, now, estimates
+            )
+            queued.remove(cmd)
+            idx, data, _ = cmd
+            executing[idx] = cmd
+            free -= 1
+            waits.setdefault(data["user"], []).append(now - data["queued_at"])
+            heapq.heappush(completions, (now + data["duration"], idx))
+    return waits
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def stats(values):
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "max": round(max(values) if values else 0.0, 1),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-r", "--resources", type=int, default=4)
+    parser.add_argument("-n", "--commands", type=int, default=2000)
+    parser.add_argument("-l", "--load", type=float, default=0.95)
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("--aging-interval", type=int, default=3600)
+    parser.add_argument("--json", action="store_true", help="JSON output")
+    args = parser.parse_args(argv[1:])
+
+    commands = generate(args.commands, args.resources, args.load, args.seed)
+    results = {}
+    for policy in sorted(scheduling.POLICIES):
+        config = {
+            "scheduling-policy": policy,
+            "aging-interval": args.aging_interval,
+            "fair-share-key": "user",
+            "fair-share-weights": {},
+        }
+        waits = simulate(commands, args.resources, config)
+        results[policy] = {
+            user: stats(values) for user, values in sorted(waits.items())
+        }
+        results[policy]["all"] = stats([w for values in waits.values() for w in values])
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return 0
+
+    print(
+        "%-20s %-8s %6s %10s %10s %10s"
+        % ("policy", "user", "count", "p50", "p95", "max")
+    )
+    for policy, users in results.items():
+        for user, res in users.items():
+            print(
+                "%-20s %-8s %6d %10.1f %10.1f %10.1f"
+                % (policy, user, res["count"], res["p50"], res["p95"], res["max"])
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
+
+# scheduling.py ends here
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Synthetic workload benchmark of the dci-queue commands.
+
+A temporary top directory is filled with pools, resources and queued
+commands, then concurrent workers drive schedule, run, list, search and
+unschedule for a fixed duration. The queued commands are fake commands
+sleeping for a random duration around the requested one.
+
+Each worker counts its file operations with an audit hook and times the
+sequence and booking locks. The report has the throughput and latency
+of each operation, the dispatch latency of the commands (time between
+a free resource and the start of the command), the lock wait and the
+file operations per command. Several queue sizes can be given to see
+how the costs grow.
+
+Usage: python3 benchmarks/workload.py [-p POOLS] [-r RESOURCES] [-q QUEUED[,QUEUED...]] [--json]
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dciqueue import history, lib, metrics  # noqa: E402
+from dciqueue import main as dciqueue_main  # noqa: E402
+
+# fake command sleeping for its first argument, the others making it unique
+FAKE_CMD = ["sh", "-c", 'sleep "$0"']
+# audit events counted as file operations
+FILE_EVENTS = (
+    "open",
+    "os.listdir",
+    "os.scandir",
+    "os.rename",
+    "os.remove",
+    "os.symlink",
+    "os.mkdir",
+    "os.rmdir",
+    "os.utime",
+    "fcntl.lockf",
+)
+OPERATIONS = ("schedule", "run", "list", "search", "unschedule")
+
+
+class Recorder(object):
+    """Instrumentation of a worker process."""
+
+    def __init__(self):
+        self.file_ops = dict.fromkeys(FILE_EVENTS, 0)
+        self.locks = {"seq": [], "booking": []}
+        self.latencies = []
+        self.started = 0
+
+    def install(self):
+        sys.addaudithook(self.audit)
+        lib.Seq.lock = self.timed("seq", lib.Seq.lock)
+        lib.BookingLock.lock = self.timed("booking", lib.BookingLock.lock)
+        publish = metrics.publish
+
+        def record_publish(top_dir, pool, **kwargs):
+            if "latency" in kwargs:
+                self.started += 1
+                self.latencies.append(kwargs["latency"])
+            return publish(top_dir, pool, **kwargs)
+
+        metrics.publish = record_publish
+
+    def audit(self, event, _):
+        if event in self.file_ops:
+            self.file_ops[event] += 1
+
+    def timed(self, name, func):
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.locks[name].append(time.monotonic() - start)
+
+        return wrapper
+
+    def result(self, ops):
+        return {
+            "ops": ops,
+            "file_ops": self.file_ops,
+            "locks": self.locks,
+            "latencies": self.latencies,
+            "started": self.started,
+        }
+
+
+def fake_cmd(args, rng, num):
+    duration = args.cmd_duration * rng.uniform(1 - args.jitter, 1 + args.jitter)
+    return FAKE_CMD + ["%.3f" % duration, "@RESOURCE", str(num)]
+
+
+def call(*argv):
+    """Run a dci-queue command, discarding its output, and return its latency."""
+    start = time.monotonic()
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        dciqueue_main.main(["dci-queue"] + list(argv))
+    return time.monotonic() - start
+
+
+def queued_ids(top_dir, pool):
+    return [
+        name
+        for name in os.listdir(os.path.join(top_dir, "queue", pool))
+        if name.isdigit()
+    ]
+
+
+def worker(top_dir, role, num, args, end, queue):
+    recorder = Recorder()
+    recorder.install()
+    rng = random.Random(args.seed + num)
+    pools = ["pool%d" % idx for idx in range(args.pools)]
+    ops = {}
+    count = 0
+    try:
+        while time.time() < end:
+            pool = rng.choice(pools)
+            if role == "schedule":
+                count += 1
+                cmd = fake_cmd(args, rng, args.seed * 1000000 + num * 100000 + count)
+                latency = call("schedule", pool, "--", *cmd)
+            elif role == "run":
+                pool = pools[num % len(pools)]
+                latency = call("run", pool)
+                time.sleep(args.run_interval)
+            elif role == "list":
+                latency = call("list", "-j", pool)
+            elif role == "search":
+                latency = call("search", pool, "--", *FAKE_CMD)
+            else:
+                ids = queued_ids(top_dir, pool)
+                if not ids:
+                    time.sleep(0.01)
+                    continue
+                latency = call("unschedule", pool, rng.choice(ids))
+            ops.setdefault(role, []).append(latency)
+    finally:
+        # always report to not block the main process
+        queue.put(recorder.result(ops))
+
+
+def fill(top_dir, args, queued):
+    """Create the pools and queue the commands. Return the time taken."""
+    rng = random.Random(args.seed)
+    pools = ["pool%d" % num for num in range(args.pools)]
+    for pool in pools:
+        dciqueue_main.main(["dci-queue", "add-pool", "-n", pool])
+        for num in range(args.resources):
+            dciqueue_main.main(["dci-queue", "add-resource", pool, "res%d" % num])
+    start = time.monotonic()
+    for pool in pools:
+        manifest = os.path.join(top_dir, pool + ".jsonl")
+        with open(manifest, "w") as f:
+            for num in range(queued):
+                f.write(json.dumps({"cmd": fake_cmd(args, rng, num)}) + "\n")
+        with redirect_stdout(io.StringIO()):
+            dciqueue_main.main(["dci-queue", "schedule", "--from-file", manifest, pool])
+    return time.monotonic() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def stats(values, scale=1000.0):
+    """Return count, p50, p95 and max of values (in ms by default)."""
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) * scale, 2),
+        "p95": round(percentile(values, 95) * scale, 2),
+        "max": round((max(values) if values else 0.0) * scale, 2),
+    }
+
+
+def run(args, queued):
+    top_dir = tempfile.mkdtemp(prefix="dci-queue-bench-")
+    os.environ["DCI_QUEUE_DIR"] = top_dir
+    os.environ["DCI_QUEUE_LOG_LEVEL"] = "ERROR"
+    cwd = os.getcwd()
+    # the commands are run from their scheduling directory
+    os.chdir(top_dir)
+    try:
+        fill_time = fill(top_dir, args, queued)
+        roles = (
+            ["schedule"] * args.schedulers
+            + ["run"] * args.runners
+            + ["list"] * args.listers
+            + ["search"] * args.searchers
+            + ["unschedule"] * args.unschedulers
+        )
+        queue = multiprocessing.Queue()
+        start = time.time()
+        end = start + args.duration
+        procs = [
+            multiprocessing.Process(
+                target=worker, args=(top_dir, role, num, args, end, queue)
+            )
+            for num, role in enumerate(roles)
+        ]
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+        elapsed = time.time() - start
+        completed = [
+            entry
+            for num in range(args.pools)
+            for entry in history.read(top_dir, "pool%d" % num)
+        ]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(top_dir)
+
+    operations = {}
+    for name in OPERATIONS:
+        values = [lat for res in results for lat in res["ops"].get(name, [])]
+        operations[name] = stats(values)
+        operations[name]["per_sec"] = round(len(values) / elapsed, 1)
+    file_ops = {
+        event: sum(res["file_ops"][event] for res in results) for event in FILE_EVENTS
+    }
+    file_ops["total"] = sum(file_ops.values())
+    file_ops["per_command"] = round(file_ops["total"] / max(len(completed), 1), 1)
+    locks = {}
+    for name in ("seq", "booking"):
+        values = [wait for res in results for wait in res["locks"][name]]
+        locks[name] = stats(values)
+        locks[name]["total"] = round(sum(values), 3)
+    return {
+        "fill_seconds": round(fill_time, 3),
+        "operations": operations,
+        "commands": {
+            "started": sum(res["started"] for res in results),
+            "completed": len(completed),
+            "per_sec": round(len(completed) / elapsed, 2),
+            "dispatch_latency": stats(
+                [lat for res in results for lat in res["latencies"]]
+            ),
+        },
+        "locks": locks,
+        "file_operations": file_ops,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-p", "--pools", type=int, default=2)
+    parser.add_argument("-r", "--resources", type=int, default=4)
+    parser.add_argument(
+        "-q",
+        "--queued",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[100],
+        help="Commands queued in each pool before the run (comma separated sizes)",
+    )
+    parser.add_argument("-d", "--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--cmd-duration", type=float, default=0.2, help="Mean command duration"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.5, help="Relative spread of the durations"
+    )
+    parser.add_argument("--schedulers", type=int, default=2)
+    parser.add_argument("--runners", type=int, default=2)
+    parser.add_argument("--listers", type=int, default=1)
+    parser.add_argument("--searchers", type=int, default=1)
+    parser.add_argument("--unschedulers", type=int, default=1)
+    parser.add_argument(
+        "--run-interval", type=float, default=0.05, help="Pause between 2 runs"
+    )
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="JSON output")
+    args = parser.parse_args(argv[1:])
+
+    results = {
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("json",)
+        },
+        "queued": {str(size): run(args, size) for size in args.queued},
+    }
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return 0
+
+    for size, res in results["queued"].items():
+        cmds = res["commands"]
+        print(
+            "queued=%s fill=%.2fs completed=%d (%.2f/s) dispatch p50=%.1fms p95=%.1fms "
+            "file ops/command=%.1f"
+            % (
+                size,
+                res["fill_seconds"],
+                cmds["completed"],
+                cmds["per_sec"],
+                cmds["dispatch_latency"]["p50"],
+                cmds["dispatch_latency"]["p95"],
+                res["file_operations"]["per_command"],
+            )
+        )
+        print(
+            "  %-12s %8s %8s %10s %10s %10s"
+            % ("operation", "count", "per_sec", "p50(ms)", "p95(ms)", "max(ms)")
+        )
+        for name, op in res["operations"].items():
+            print(
+                "  %-12s %8d %8.1f %10.2f %10.2f %10.2f"
+                % (name, op["count"], op["per_sec"], op["p50"], op["p95"], op["max"])
+            )
+        # a lock wait has no rate: show the total time spent waiting instead
+        print(
+            "  %-12s %8s %8s %10s %10s %10s"
+            % ("lock wait", "count", "total(s)", "p50(ms)", "p95(ms)", "max(ms)")
+        )
+        for name, lock in res["locks"].items():
+            print(
+                "  %-12s %8d %8.2f %10.2f %10.2f %10.2f"
+                % (
+                    name,
+                    lock["count"],
+                    lock["total"],
+                    lock["p50"],
+                    lock["p95"],
+                    lock["max"],
+                )
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
+
+# workload.py ends here
@@ -19,7 +19,6 @@
 import atexit
 import os
 import shutil
-import subprocess
 import sys
 import tempfile
 
@@ -29,8 +28,6 @@ from ansible.parsing.dataloader import DataLoader
 from ansible.parsing.utils.yaml import from_yaml
 from ansible.parsing.yaml.dumper import AnsibleDumper
 
-TOP_DIR = os.path.join(os.path.dirname(__file__))
-
 
 def fix_path(filename, basedir):
     if filename[0] != "/":
@@ -44,6 +41,7 @@ KEYS = [
     "ansible_playbook",
     "dci_agent",
     "dci_credentials",
+    "dci_vault_file",
     "name",
     "type",
 ]
@@ -66,17 +64,82 @@ OPT_KEYS = [
 ]
 
 
+_VAULT_SECRETS = {}
+
+
 def get_vault_client():
     return os.getenv("DCI_VAULT_CLIENT", shutil.which("dci-vault-client"))
 
 
-def process_settings(settings_filename, pipelines, current_stage, prev_stage):
-    loader = DataLoader()
-    vault_secrets = CLI.setup_vault_secrets(
-        loader=loader, vault_ids=[get_vault_client()]
+def get_credentials_path(settings_filename, settings):
+    base_dir = os.path.dirname(settings_filename)
+    if "dci_credentials" in settings:
+        return fix_path(settings["dci_credentials"], base_dir)
+    return os.path.join(base_dir, "dci_credentials.yml")
+
+
+def get_vault_file(settings_filename, settings):
+    if "dci_vault_file" not in settings:
+        return None
+    return fix_path(
+        os.path.expanduser(settings["dci_vault_file"]),
+        os.path.dirname(settings_filename),
     )
+
+
+def get_vault_secrets(settings_filename):
+    """Set up the vault secrets once as it can run the vault client
+
+    Like dci-pipeline does for a pipeline file, the settings file is
+    first read without decrypting to use its vault password file
+    (dci_vault_file) or the DCI_API_SECRET of its credentials, needed by
+    the vault client to compute the password."""
     with open(settings_filename) as stream:
-        settings = from_yaml(stream, vault_secrets=vault_secrets)
+        settings = yaml.load(stream, Loader=yaml.BaseLoader)
+    if not isinstance(settings, dict):
+        settings = {}
+    vault_file = get_vault_file(settings_filename, settings)
+    if vault_file:
+        key = ("file", vault_file)
+        if key not in _VAULT_SECRETS:
+            _VAULT_SECRETS[key] = CLI.setup_vault_secrets(
+                loader=DataLoader(), vault_ids=[], vault_password_files=[vault_file]
+            )
+        return _VAULT_SECRETS[key]
+    cred_path = get_credentials_path(settings_filename, settings)
+    try:
+        with open(cred_path) as stream:
+            os.environ["DCI_API_SECRET"] = yaml.load(stream, Loader=yaml.SafeLoader)[
+                "DCI_API_SECRET"
+            ]
+    except (OSError, KeyError, TypeError):
+        print(
+            "No credentials found in {} to decrypt vault encrypted data.".format(
+                cred_path
+            ),
+            file=sys.stderr,
+        )
+    vault_client = get_vault_client()
+    key = ("client", vault_client, os.getenv("DCI_API_SECRET"))
+    if key not in _VAULT_SECRETS:
+        _VAULT_SECRETS[key] = CLI.setup_vault_secrets(
+            loader=DataLoader(), vault_ids=[vault_client]
+        )
+    return _VAULT_SECRETS[key]
+
+
+def load_settings(settings_filename, vault_secrets):
+    with open(settings_filename) as stream:
+        return from_yaml(stream, vault_secrets=vault_secrets)
+
+
+def process_settings(
+    settings_filename, pipelines, current_stage, prev_stage, settings=None
+):
+    if settings is None:
+        settings = load_settings(
+            settings_filename, get_vault_secrets(settings_filename)
+        )
     base_dir = os.path.dirname(settings_filename)
     # maintain keys used in settings below in KEYS (without the dci_ prefix)
     if "type" not in settings:
@@ -93,17 +156,15 @@ def process_settings(settings_filename, pipelines, current_stage, prev_stage):
                 settings["dci_agent"], settings["dci_agent"]
             )
         ),
-        "dci_credentials": (
-            fix_path(settings["dci_credentials"], base_dir)
-            if "dci_credentials" in settings
-            else os.path.join(os.path.dirname(settings_filename), "dci_credentials.yml")
-        ),
+        "dci_credentials": get_credentials_path(settings_filename, settings),
         "ansible_inventory": (
             fix_path(settings["ansible_inventory"], base_dir)
             if "ansible_inventory" in settings
             else os.path.join(os.path.dirname(settings_filename), "hosts")
         ),
     }
+    if "dci_vault_file" in settings:
+        pipeline["dci_vault_file"] = get_vault_file(settings_filename, settings)
     # copy optional keys
     for key in OPT_KEYS:
         if key in settings:
@@ -149,40 +210,100 @@ def process_settings(settings_filename, pipelines, current_stage, prev_stage):
     return current_stage, prev_stage
 
 
+def is_settings_file(arg):
+    return arg[-12:] == "settings.yml"
+
+
+def load_all_settings(settings_filenames):
+    """Parse the settings files and return them in order
+
+    The vault secrets come from the first settings file, like they come
+    from the first jobdef of a pipeline file in dci-pipeline."""
+    if not settings_filenames:
+        return []
+    vault_secrets = get_vault_secrets(settings_filenames[0])
+    return [load_settings(filename, vault_secrets) for filename in settings_filenames]
+
+
 def process_all_settings(args, first=None):
     pipelines = []
     dci_pipeline_args = [first] if first else []
     prev_stage = None
     current_stage = None
-    # process args by replacing settings files by one pipeline file
+    all_settings = iter(
+        load_all_settings([arg for arg in args if is_settings_file(arg)])
+    )
+    # process args by replacing settings files by one pipeline file, in
+    # order to chain the stages
     for arg in args:
-        if arg[-12:] == "settings.yml":
+        if is_settings_file(arg):
             current_stage, prev_stage = process_settings(
-                arg, pipelines, current_stage, prev_stage
+                arg, pipelines, current_stage, prev_stage, next(all_settings)
             )
         else:
             dci_pipeline_args.append(arg)
     return dci_pipeline_args, pipelines
 
 
+def write_pipeline(pipelines, pipeline_filename):
+    with open(pipeline_filename, "w") as pipeline_fd:
+        yaml.dump(pipelines, pipeline_fd, Dumper=AnsibleDumper)
+
+
 def process_args(args):
     tempdir = tempfile.mkdtemp()
     atexit.register(lambda: shutil.rmtree(tempdir))
     pipeline_filename = os.path.join(tempdir, "pipeline.yml")
     dci_pipeline_args, pipelines = process_all_settings(args, pipeline_filename)
-    with open(pipeline_filename, "w") as pipeline_fd:
-        yaml.dump(pipelines, pipeline_fd, Dumper=AnsibleDumper)
+    write_pipeline(pipelines, pipeline_filename)
     return dci_pipeline_args
 
 
+def extract_emit_pipeline(args):
+    """Remove --emit-pipeline <file> from args and return (file, args)"""
+    emit = None
+    rest = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == "--emit-pipeline":
+            if not args:
+                print("--emit-pipeline needs a file name", file=sys.stderr)
+                sys.exit(1)
+            emit = args.pop(0)
+        elif arg.startswith("--emit-pipeline="):
+            emit = arg.split("=", 1)[1]
+        else:
+            rest.append(arg)
+    return emit, rest
+
+
 def main(args=sys.argv):
-    pipeline_args = process_args(args[1:])
-    dci_pipeline = os.path.join(TOP_DIR, "dci-pipeline")
-    if not os.path.exists(dci_pipeline):
-        dci_pipeline = "dci-pipeline"
-    print("+", dci_pipeline, " ".join(pipeline_args), file=sys.stderr)
-    ret = subprocess.run([dci_pipeline] + pipeline_args)
-    return ret.returncode
+    # imported here to not load the dci-pipeline engine in dci-settings2pipeline
+    from dcipipeline import main as dcipipeline_main
+
+    emit, args = extract_emit_pipeline(args[1:])
+    pipeline_args, pipelines = process_all_settings(args)
+    settings_files = [arg for arg in args if is_settings_file(arg)]
+    if emit:
+        write_pipeline(pipelines, emit)
+        print("Pipeline written to", emit, file=sys.stderr)
+    # the pipelines are run in memory, from their settings file
+    for pipeline, settings_file in zip(pipelines, settings_files):
+        pipeline["_pipeline_path_"] = os.path.abspath(settings_file)
+    config_dir = (
+        os.path.dirname(os.path.abspath(settings_files[-1])) if settings_files else None
+    )
+    print(
+        "+ dci-pipeline",
+        " ".join(settings_files + pipeline_args),
+        file=sys.stderr,
+    )
+    return dcipipeline_main.main(
+        ["dci-pipeline"] + pipeline_args,
+        dcipipeline_main.prepare_jobdefs(pipelines, None, config_dir),
+        config_dir,
+    )
 
 
 def main_s2p(args=sys.argv):
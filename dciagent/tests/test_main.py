@@ -13,10 +13,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import hashlib
 import os
+import tempfile
 import unittest
+from unittest import mock
 
 import yaml
+from ansible.parsing.vault import VaultLib, VaultSecret
 
 import dciagent.main as main
 
@@ -97,6 +101,109 @@ class TestMain(unittest.TestCase):
         self.assertEqual(pipelines[3]["type"], "openshift-upgrade")
         self.assertEqual(pipelines[3]["prev_stages"], ["openshift-app"])
 
+    def test_process_all_settings_once(self):
+        args = [
+            os.path.join(DATA_DIR, "settings.yml"),
+            os.path.join(DATA_DIR, "my-app-settings.yml"),
+            "titi",
+            os.path.join(DATA_DIR, "my-app-settings.yml"),
+            os.path.join(DATA_DIR, "upgrade-settings.yml"),
+        ]
+        sequential = []
+        current_stage = prev_stage = None
+        for arg in args:
+            if arg != "titi":
+                current_stage, prev_stage = main.process_settings(
+                    arg, sequential, current_stage, prev_stage
+                )
+        main._VAULT_SECRETS.clear()
+        with mock.patch.object(
+            main.CLI, "setup_vault_secrets", wraps=main.CLI.setup_vault_secrets
+        ) as setup_vault_secrets:
+            pipeline_args, pipelines = main.process_all_settings(args)
+        self.assertEqual(setup_vault_secrets.call_count, 1)
+        self.assertEqual(pipeline_args, ["titi"])
+        self.assertEqual(
+            yaml.dump(pipelines, Dumper=main.AnsibleDumper),
+            yaml.dump(sequential, Dumper=main.AnsibleDumper),
+        )
+
+    def write_vaulted_settings(self, tempdir, password, extra=""):
+        vault = VaultLib([("default", VaultSecret(password.encode("utf-8")))])
+        encrypted = vault.encrypt("s3cr3t").decode("utf-8")
+        settings = os.path.join(tempdir, "settings.yml")
+        with open(settings, "w") as f:
+            f.write(
+                "dci_agent: openshift\n"
+                "secret: !vault |\n"
+                + "".join("  %s\n" % line for line in encrypted.splitlines())
+                + extra
+            )
+        return settings
+
+    def test_process_all_settings_vault(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            with open(os.path.join(tempdir, "dci_credentials.yml"), "w") as f:
+                f.write("DCI_API_SECRET: credsecret\n")
+            password = hashlib.sha256(b"credsecret").hexdigest()
+            settings = self.write_vaulted_settings(tempdir, password)
+            main._VAULT_SECRETS.clear()
+            # the secret only comes from the credentials file
+            with mock.patch.dict(os.environ):
+                os.environ.pop("DCI_API_SECRET", None)
+                _, pipelines = main.process_all_settings([settings])
+            self.assertEqual(pipelines[0]["ansible_extravars"]["secret"], "s3cr3t")
+
+    def test_process_all_settings_vault_file(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            with open(os.path.join(tempdir, "vault_pass"), "w") as f:
+                f.write("filepassword\n")
+            settings = self.write_vaulted_settings(
+                tempdir, "filepassword", "dci_vault_file: vault_pass\n"
+            )
+            main._VAULT_SECRETS.clear()
+            _, pipelines = main.process_all_settings([settings])
+        self.assertEqual(pipelines[0]["ansible_extravars"]["secret"], "s3cr3t")
+        self.assertEqual(
+            pipelines[0]["dci_vault_file"], os.path.join(tempdir, "vault_pass")
+        )
+        self.assertNotIn("dci_vault_file", pipelines[0]["ansible_extravars"])
+
+    @mock.patch("dcipipeline.main.run_stage", return_value=(0, []))
+    def test_main_in_memory(self, run_stage):
+        settings = os.path.join(DATA_DIR, "settings.yml")
+        with tempfile.TemporaryDirectory() as tempdir:
+            emitted = os.path.join(tempdir, "pipeline.yml")
+            self.assertEqual(
+                main.main(
+                    [
+                        "dci-agent-ctl",
+                        settings,
+                        "--emit-pipeline",
+                        emitted,
+                        "openshift-vanilla:ansible_extravars=answer:43",
+                    ]
+                ),
+                0,
+            )
+            with open(emitted) as stream:
+                pipelines = yaml.load(stream, Loader=yaml.SafeLoader)
+        self.assertEqual(pipelines[0]["name"], "openshift-vanilla")
+        self.assertNotIn("_pipeline_path_", pipelines[0])
+        stage, pipeline, config_dir = run_stage.call_args[0][:3]
+        self.assertEqual(stage, "openshift")
+        self.assertEqual(pipeline[0]["name"], "openshift-vanilla")
+        self.assertEqual(pipeline[0]["ansible_extravars"]["answer"], 43)
+        self.assertEqual(pipeline[0]["_pipeline_path_"], settings)
+        self.assertEqual(config_dir, DATA_DIR)
+
+    def test_extract_emit_pipeline(self):
+        self.assertEqual(
+            main.extract_emit_pipeline(["a", "--emit-pipeline=p.yml", "b"]),
+            ("p.yml", ["a", "b"]),
+        )
+        self.assertEqual(main.extract_emit_pipeline(["a"]), (None, ["a"]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -33,15 +33,22 @@ $ dci-pipeline-auto https://example.com/r/c/dci-openshift-agent/+/30337 <<< <des
 will launch:
 
 dci-pipeline-check https://example.com/r/c/dci-openshift-agent/+/30337 -p <dci-queue> <dci-pipeline args>
+
+The pipelines are launched concurrently, at most --jobs at a time (all
+of them by default). Their output is prefixed by their name and a
+summary of the exit codes is printed at the end.
 """
 
 import argparse
+import concurrent.futures
 import configparser
 import os.path
 import re
 import shlex
 import subprocess
 import sys
+import threading
+import time
 
 _TEST_PIPELINE_RE = re.compile(r"Test(?P<name>\w+):\s*(?P<args>.*)")
 
@@ -58,6 +65,17 @@ def cleanup(args):
     return args.replace(";", "").replace("&", "").replace("|", "").strip()
 
 
+def non_negative_int(value):
+    "argparse type of the --jobs option"
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid int value: %r" % value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("must be 0 or more: %d" % number)
+    return number
+
+
 def parse_description(description):
     "Extract lines like Test<name>: <dci-pipeline args>"
     ret = {}
@@ -68,6 +86,71 @@ def parse_description(description):
     return ret
 
 
+def get_commands(config, pipelines, url):
+    "Return the commands of the configured pipelines by name"
+    cmds = {}
+    for name, pipeline_args in pipelines.items():
+        if name in config and "cmd" in config[name]:
+            cmds[name] = (
+                shlex.split(config[name]["cmd"].replace("@URL", url)) + pipeline_args
+            )
+    return cmds
+
+
+def launch(name, cmd, out, lock):
+    "Run a command printing its output prefixed by name and return its exit code"
+    with lock:
+        print(f"+ [{name}] {' '.join(cmd)}", file=sys.stderr)
+    try:
+        # avoid shell injection by using shell=False
+        proc = subprocess.Popen(
+            cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+    except OSError as excp:
+        with lock:
+            print(f"[{name}] {excp}", file=out)
+        return 127
+    for line in proc.stdout:
+        with lock:
+            print(
+                f"[{name}] {line.decode('utf-8', errors='replace').rstrip()}",
+                file=out,
+                flush=True,
+            )
+    proc.stdout.close()
+    return proc.wait()
+
+
+def run_pipelines(cmds, jobs=0, out=sys.stdout):
+    """Run the commands concurrently, at most jobs at once (0 for all).
+
+    Return {name: (exit code, duration)}."""
+    lock = threading.Lock()
+    results = {}
+
+    def run(name):
+        start = time.time()
+        ret = launch(name, cmds[name], out, lock)
+        results[name] = (ret, time.time() - start)
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=jobs or max(len(cmds), 1)
+    ) as executor:
+        for future in [executor.submit(run, name) for name in cmds]:
+            future.result()
+    # keep the order of the description
+    return {name: results[name] for name in cmds}
+
+
+def print_summary(results, out=sys.stdout):
+    "Print a table of the exit codes"
+    width = max([len("PIPELINE")] + [len(name) for name in results])
+    print(f"{'PIPELINE':<{width}} {'STATUS':<7} {'RC':>3} DURATION", file=out)
+    for name, (ret, duration) in results.items():
+        status = "success" if ret == 0 else "failure"
+        print(f"{name:<{width}} {status:<7} {ret:>3} {duration:.0f}s", file=out)
+
+
 def main(argv=sys.argv):
     """main"""
     parser = argparse.ArgumentParser(
@@ -83,25 +166,22 @@ def main(argv=sys.argv):
         default=sys.stdin,
         help="STDIN",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=non_negative_int,
+        default=0,
+        help="maximum number of pipelines launched at once (default: all)",
+    )
     args = parser.parse_args(argv[1:])
 
     config = load_config("~/.config/dci-pipeline/auto.conf")
-    pipelines = parse_description(args.infile.read())
-    nb = 0
-    for name, pipeline_args in pipelines.items():
-        if name in config and "cmd" in config[name]:
-            cmd = (
-                shlex.split(config[name]["cmd"].replace("@URL", args.url))
-                + pipeline_args
-            )
-            print(
-                f"+ {' '.join(cmd)}",
-                file=sys.stderr,
-            )
-            # avoid shell injection by using shell=False
-            subprocess.check_call(cmd, shell=False)
-            nb += 1
-    return 0 if nb else 1
+    cmds = get_commands(config, parse_description(args.infile.read()), args.url)
+    if not cmds:
+        return 1
+    results = run_pipelines(cmds, args.jobs)
+    print_summary(results)
+    return 0 if all(ret == 0 for ret, _ in results.values()) else 1
 
 
 if __name__ == "__main__":
@@ -55,6 +55,24 @@ def parse_arguments(args, environment={}):
         type=str,
         default=None,
     )
+    p.add_argument(
+        "--range",
+        help=(
+            "Bisect the history of the named pipeline (by default the pipeline"
+            " of --job_id_1 or the last pipeline) to find where the results"
+            " flipped and the components changed"
+        ),
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PIPELINE_NAME",
+    )
+    p.add_argument(
+        "--limit",
+        help="Number of pipeline runs to bisect with --range",
+        type=int,
+        default=30,
+    )
     args = p.parse_args(args)
 
     return args
@@ -64,6 +82,164 @@ def get_stage(pipeline):
     return pipeline.get("stage", pipeline.get("type"))
 
 
+def get_pipeline_status(jobs):
+    """Return success, failure or None for a pipeline without result: empty,
+    unfinished, killed or in error"""
+    statuses = set(j["status"] for j in jobs)
+    if not statuses or not statuses <= set(("success", "failure")):
+        return None
+    return "failure" if "failure" in statuses else "success"
+
+
+def index_components(jobs):
+    """Return {(job name, component type): component name}"""
+    components = {}
+    for job in jobs:
+        for c in job["components"]:
+            c_type, c_name = get_component_info(c)
+            components[(job["data"]["pipeline"]["name"], c_type)] = c_name
+    return components
+
+
+def bisect(indices, is_after):
+    """Return the last index of indices for which is_after is false and the
+    next one, is_after being false for the first index and true for the
+    last one. The indices for which is_after returns None are skipped"""
+    indices = list(indices)
+    low, high = 0, len(indices) - 1
+    while high - low > 1:
+        middle = (low + high) // 2
+        after = is_after(indices[middle])
+        if after is None:
+            del indices[middle]
+            high -= 1
+        elif after:
+            high = middle
+        else:
+            low = middle
+    return indices[low], indices[high]
+
+
+def get_range_name(u_context, args):
+    if args.range:
+        return args.range
+    if args.job_id_1 is None:
+        pipelines = dci_pipeline.list(
+            u_context, sort="-created_at", limit=1, offset=0
+        ).json()["pipelines"]
+        if not pipelines:
+            print("No pipeline found", file=sys.stderr)
+            sys.exit(1)
+        return pipelines[0]["name"]
+    pipeline_id = pu.get_job(u_context, args.job_id_1)["pipeline_id"]
+    return dci_pipeline.get(u_context, pipeline_id).json()["pipeline"]["name"]
+
+
+def search_range(u_context, args):
+    """Bisect the runs of a pipeline to find where its results flipped and
+    where its components changed, fetching only the needed runs"""
+    name = get_range_name(u_context, args)
+    runs = dci_pipeline.list(
+        u_context,
+        where=f"name:{name}",
+        sort="-created_at",
+        limit=args.limit,
+        offset=0,
+    ).json()["pipelines"]
+    # oldest first
+    runs.reverse()
+    if len(runs) < 2:
+        print(f"Not enough runs of pipeline {name}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Bisecting {len(runs)} runs of pipeline {name}", file=sys.stderr)
+
+    cache = {}
+
+    def get_jobs(idx):
+        if idx not in cache:
+            cache[idx] = pu.get_pipeline_jobs(u_context, runs[idx]["id"])
+        return cache[idx]
+
+    def get_status(idx):
+        return get_pipeline_status(get_jobs(idx))
+
+    def describe(idx):
+        return "%s (%s)" % (runs[idx]["id"], runs[idx]["created_at"])
+
+    # the running, empty or unfinished runs have no result
+    first = next((idx for idx in range(len(runs)) if get_status(idx)), None)
+    last = next((idx for idx in reversed(range(len(runs))) if get_status(idx)), None)
+    if first is None or first == last:
+        print(f"Not enough finished runs of pipeline {name}", file=sys.stderr)
+        sys.exit(1)
+    first_status = get_status(first)
+    last_status = get_status(last)
+    if first_status != last_status:
+        # the results flipped: the minimal set of changes is between the
+        # last run with the old status and the first with the new one
+        before_idx, flip = bisect(
+            range(first, last + 1),
+            lambda idx: (
+                None if get_status(idx) is None else get_status(idx) == last_status
+            ),
+        )
+        print(
+            "Results flipped from %s to %s between %s and %s"
+            % (first_status, last_status, describe(before_idx), describe(flip)),
+            file=sys.stderr,
+        )
+        before = index_components(get_jobs(before_idx))
+        after = index_components(get_jobs(flip))
+        changes = [
+            (key, before.get(key, "Not found"), after.get(key, "Not found"), flip)
+            for key in sorted(set(before) | set(after))
+            if before.get(key) != after.get(key)
+        ]
+    else:
+        print(
+            "Results did not flip (%s), looking for the component changes"
+            % last_status,
+            file=sys.stderr,
+        )
+        initial = index_components(get_jobs(first))
+        final = index_components(get_jobs(last))
+        changes = []
+        for key in sorted(set(initial) | set(final)):
+            if initial.get(key) == final.get(key):
+                continue
+            before_idx, idx = bisect(
+                range(first, last + 1),
+                lambda idx: index_components(get_jobs(idx)).get(key) == final.get(key),
+            )
+            changes.append(
+                (
+                    key,
+                    index_components(get_jobs(before_idx)).get(key, "Not found"),
+                    final.get(key, "Not found"),
+                    idx,
+                )
+            )
+    print(
+        "%d runs fetched out of %d" % (len(cache), len(runs)),
+        file=sys.stderr,
+    )
+    print_result(
+        [
+            {
+                "name": c_type,
+                "pipeline": job_name,
+                "before": c_before,
+                "after": c_after,
+                "changed in": describe(idx),
+            }
+            for (job_name, c_type), c_before, c_after, idx in changes
+        ],
+        args.format,
+        args.verbose,
+        ["name", "pipeline", "before", "after", "changed in"],
+    )
+
+
 def search(args=sys.argv):
     args = parse_arguments(sys.argv[1:], os.environ)
     u_context = dci_context.build_context(args)
@@ -72,6 +248,9 @@ def search(args=sys.argv):
         print("Unable to authenticate. aborting", file=sys.stderr)
         sys.exit(2)
 
+    if args.range is not None:
+        return search_range(u_context, args)
+
     if args.job_id_1 is None:
         print(
             "no job_id_1 provided, getting latest known job with a pipeline",
@@ -143,10 +322,10 @@ def search(args=sys.argv):
     for i in range(0, len(pipeline_1)):
         components_1 = {}
         components_2 = {}
-        for c in pu.get_job_components(u_context, pipeline_1[i]["id"]):
+        for c in pipeline_1[i]["components"]:
             c_type, c_name = get_component_info(c)
             components_1[c_type] = c_name
-        for c in pu.get_job_components(u_context, pipeline_2[i]["id"]):
+        for c in pipeline_2[i]["components"]:
             c_type, c_name = get_component_info(c)
             components_2[c_type] = c_name
         for c1 in components_1:
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -178,6 +178,23 @@ def load_jobdef_file(path, config_dir):
     return ansible_yaml
 
 
+def prepare_jobdefs(jobdefs, path, config_dir):
+    """Prepare jobdefs built in memory like load_jobdef_file does for a file.
+
+    path is the file the jobdefs come from, unless already set, used to
+    find the relative files, and the vault client gets the secret from
+    the credentials of the first jobdef."""
+    if jobdefs and "dci_vault_file" not in jobdefs[0]:
+        try:
+            creds = load_credentials(jobdefs[0], config_dir)
+            os.environ["DCI_API_SECRET"] = creds["DCI_API_SECRET"]
+        except (KeyError, OSError):
+            log.warning("No credentials found to decrypt vault encrypted data.")
+    for jobdef in jobdefs:
+        jobdef.setdefault("_pipeline_path_", path)
+    return jobdefs
+
+
 def load_credentials(jobdef, config_dir):
     cred_path = jobdef.get(
         "dci_credentials",
@@ -685,6 +702,7 @@ def schedule_job(
             get_data_dir(job_info, jobdef)
 
             log.info("Scheduled DCI job %s" % job_id)
+            record_job(jobdef["name"], job_id, "new")
 
             return job_info
         else:
@@ -694,6 +712,45 @@ def schedule_job(
     return None
 
 
+def record_job(name, job_id, status):
+    """Append a job event to the JSON lines file set in DCI_PIPELINE_JOBS_FILE.
+
+    It allows dci-queue dci-job and test-runner to find the DCI jobs
+    without parsing the whole output of dci-pipeline.
+    """
+    path = os.getenv("DCI_PIPELINE_JOBS_FILE")
+    if not path:
+        return
+    try:
+        with open(path, "a") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "name": name,
+                        "job_id": job_id,
+                        "status": status,
+                        "date": datetime.datetime.now(
+                            datetime.timezone.utc
+                        ).isoformat(),
+                    }
+                )
+                + "\n"
+            )
+    except OSError as excp:
+        log.warning("Unable to record job %s in %s: %s" % (job_id, path, excp))
+
+
+def log_jobdef_status(jobdef, job_info):
+    job_states = sorted(
+        job_info["job"]["jobstates"],
+        key=lambda x: x["created_at"],
+    )
+    status = job_states[-1]["status"]
+    log.info("Jobdef %s status=%s" % (jobdef["name"], status))
+    record_job(jobdef["name"], job_info["job"]["id"], status)
+    return status
+
+
 def add_tags_to_job(job_id, tags, context):
     for tag in tags:
         log.info("Setting tag %s on job %s" % (tag, job_id))
@@ -1075,12 +1132,14 @@ def overload_dicts(overload, target):
     return target
 
 
-def get_config(args):
+def get_config(args, jobdefs=None, config_dir=None):
+    """Load the pipeline files of the command line after the jobdefs
+    already loaded from config_dir, then apply the overloads"""
     lst, args, opts = process_args(args)
     log.info(f"overload={lst} options={opts}")
-    if len(args) == 0:
+    if len(args) == 0 and jobdefs is None:
         args = [os.path.join(TOPDIR, "dcipipeline/pipeline.yml")]
-    pipeline = []
+    pipeline = list(jobdefs or [])
     for config in args:
         config_dir = os.path.abspath(os.path.dirname(config))
         jobdefs = load_jobdef_file(config, config_dir)
@@ -1317,12 +1376,7 @@ def run_stage(
             dci_remoteci_context, jobdef, dci_credentials, config_dir, cancel_cb
         ):
             set_success_tag(jobdef, jobdef["job_info"], dci_remoteci_context)
-            job_info = jobdef["job_info"]
-            job_states = sorted(
-                job_info["job"]["jobstates"],
-                key=lambda x: x["created_at"],
-            )
-            log.info("Jobdef %s status=%s" % (jobdef["name"], job_states[-1]["status"]))
+            log_jobdef_status(jobdef, jobdef["job_info"])
         else:
             log.error(
                 "Unable to run successfully job %s (%s)"
@@ -1367,15 +1421,7 @@ def run_stage(
                         set_success_tag(
                             jobdef, jobdef["job_info"], dci_remoteci_context
                         )
-                        job_info = jobdef["job_info"]
-                        job_states = sorted(
-                            job_info["job"]["jobstates"],
-                            key=lambda x: x["created_at"],
-                        )
-                        log.info(
-                            "Jobdef %s status=%s"
-                            % (jobdef["name"], job_states[-1]["status"])
-                        )
+                        log_jobdef_status(jobdef, jobdef["job_info"])
                     else:
                         log.error(
                             "Unable to run successfully job %s on tag %s"
@@ -1392,11 +1438,15 @@ def run_stage(
 PIPELINE = []
 
 
-def main(args=sys.argv):
+def main(args=sys.argv, jobdefs=None, config_dir=None):
+    """Run a pipeline.
+
+    jobdefs built in memory (see prepare_jobdefs) from config_dir are
+    run before the pipeline files of the command line."""
     # Clear the pipeline list safely
     PIPELINE.clear()
     signal_handler = SignalHandler()
-    config_dir, pipeline, options = get_config(args)
+    config_dir, pipeline, options = get_config(args, jobdefs, config_dir)
     PIPELINE.extend(pipeline)
 
     for stage in get_stages_of_jobdefs(pipeline):
@@ -1435,15 +1485,7 @@ def main(args=sys.argv):
                         and "jobstates" in job_info["job"]
                         and len(job_info["job"]["jobstates"]) > 0
                     ):
-                        job_states = sorted(
-                            job_info["job"]["jobstates"],
-                            key=lambda x: x["created_at"],
-                        )
-                        log.info(
-                            "Jobdef %s status=%s"
-                            % (jobdef["name"], job_states[-1]["status"])
-                        )
-                        if job_states[-1]["status"] == "error":
+                        if log_jobdef_status(jobdef, job_info) == "error":
                             return 2
                     else:
                         log.error(
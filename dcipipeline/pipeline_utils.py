@@ -14,10 +14,124 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+"""Fetch the jobs of a pipeline from the DCI API.
+
+The jobs of a pipeline are listed with their components embedded, page
+by page, and the jobs missing their data or components are completed
+by concurrent calls. The jobs of a finished pipeline are cached in
+DCI_PIPELINE_CACHE_DIR (~/.cache/dci-pipeline by default) so that
+dci-diff-pipeline and dci-rebuild-pipeline reuse them. The pipelines not
+read for CACHE_MAX_AGE seconds and the least recently read ones above
+CACHE_MAX_PIPELINES are evicted when a new pipeline is cached.
+
+The next stages of a pipeline can start after its current jobs are
+finished, so a pipeline whose jobs were updated less than
+RECENT_PIPELINE_AGE seconds ago is only cached for RECENT_PIPELINE_TTL
+seconds.
+"""
+
+import calendar
+import concurrent.futures
+import json
+import os
 import sys
+import tempfile
+import time
 
 from dciclient.v1.api import job as dci_job
 
+PAGE_SIZE = 100
+# maximum number of concurrent calls to the DCI API
+MAX_WORKERS = 8
+FINAL_STATUSES = ("success", "failure", "error", "killed")
+CACHE_MAX_AGE = 30 * 86400
+CACHE_MAX_PIPELINES = 1000
+RECENT_PIPELINE_AGE = 86400
+RECENT_PIPELINE_TTL = 600
+
+
+def get_cache_dir():
+    return os.path.expanduser(
+        os.getenv("DCI_PIPELINE_CACHE_DIR", "~/.cache/dci-pipeline")
+    )
+
+
+def read_cache(name):
+    path = os.path.join(get_cache_dir(), name)
+    try:
+        with open(path) as f:
+            content = json.load(f)
+        if isinstance(content, dict):
+            # recent pipeline
+            if content["expires"] < time.time():
+                return None
+            content = content["jobs"]
+        # most recently read pipelines are evicted last
+        os.utime(path)
+        return content
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def prune_cache(cache_dir, now=None):
+    """Evict the old and least recently read pipelines and their job links."""
+    if now is None:
+        now = time.time()
+    pipelines = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(".json"):
+            pipelines.append((entry.stat().st_mtime, entry.path))
+    pipelines.sort(reverse=True)
+    evicted = [
+        path
+        for num, (mtime, path) in enumerate(pipelines)
+        if num >= CACHE_MAX_PIPELINES or now - mtime > CACHE_MAX_AGE
+    ]
+    for path in evicted:
+        os.unlink(path)
+    if evicted:
+        jobs_dir = os.path.join(cache_dir, "jobs")
+        for entry in os.scandir(jobs_dir):
+            # links to an evicted pipeline
+            if entry.is_symlink() and not os.path.exists(entry.path):
+                os.unlink(entry.path)
+    return evicted
+
+
+def write_cache(pipeline_id, jobs, expires=None):
+    """Store the jobs of a pipeline and index them by job id.
+
+    The jobs are not read from the cache after the expires timestamp.
+    """
+    cache_dir = get_cache_dir()
+    try:
+        os.makedirs(os.path.join(cache_dir, "jobs"), exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, "w") as f:
+            if expires is None:
+                json.dump(jobs, f)
+            else:
+                json.dump({"expires": expires, "jobs": jobs}, f)
+        os.replace(path, os.path.join(cache_dir, "%s.json" % pipeline_id))
+        for job in jobs:
+            link = os.path.join(cache_dir, "jobs", "%s.json" % job["id"])
+            if not os.path.islink(link):
+                os.symlink(os.path.join("..", "%s.json" % pipeline_id), link)
+        prune_cache(cache_dir)
+    except OSError as excp:
+        print("unable to cache pipeline %s: %s" % (pipeline_id, excp), file=sys.stderr)
+
+
+def get_update_time(jobs):
+    """Return the time of the last update of the jobs or None if unknown."""
+    try:
+        return max(
+            calendar.timegm(time.strptime(job["updated_at"][:19], "%Y-%m-%dT%H:%M:%S"))
+            for job in jobs
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
 
 def get_job(context, job_id):
     print("getting info for job %s" % job_id, file=sys.stderr)
@@ -38,24 +152,82 @@ def get_job_components(context, job_id):
         sys.exit(1)
 
 
-def get_stage_components(context, job_id):
-    c = dci_job.get_components(context, job_id)
-    if c.status_code == 200:
-        components = c.json()["components"]
-        return ["%s=%s" % (c["type"], c["name"]) for c in components]
+def get_stage_components(context, job):
+    """Return the components of a job as type=name, job is a job or its id."""
+    if isinstance(job, dict) and "components" in job:
+        components = job["components"]
     else:
-        print("get_stage_components error: %s" % c.text)
-        sys.exit(1)
+        components = get_job_components(
+            context, job["id"] if isinstance(job, dict) else job
+        )
+    return ["%s=%s" % (c["type"], c["name"]) for c in components]
+
+
+def list_pipeline_jobs(context, pipeline_id):
+    """Return the jobs of a pipeline, with their components, page by page."""
+    jobs = []
+    while True:
+        resp = dci_job.list(
+            context,
+            sort="created_at",
+            where="pipeline_id:%s" % pipeline_id,
+            embed="components",
+            limit=PAGE_SIZE,
+            offset=len(jobs),
+        )
+        if resp.status_code != 200:
+            print("list_pipeline_jobs error: %s" % resp.text)
+            sys.exit(1)
+        page = resp.json()["jobs"]
+        jobs += page
+        if len(page) < PAGE_SIZE or len(jobs) >= resp.json()["_meta"]["count"]:
+            return jobs
+
+
+def complete_job(context, job):
+    """Fetch the data and components missing from a listed job."""
+    if "data" not in job:
+        job = get_job(context, job["id"])
+    if "components" not in job:
+        job["components"] = get_job_components(context, job["id"])
+    return job
 
 
 def get_pipeline_jobs(context, pipeline_id):
     print("pipeline_id=%s" % pipeline_id, file=sys.stderr)
-    jobs = dci_job.list(
-        context, sort="created_at", where="pipeline_id:%s" % pipeline_id
-    )
-    return [get_job(context, job["id"]) for job in jobs.json()["jobs"]]
+    jobs = read_cache("%s.json" % pipeline_id)
+    if jobs is not None:
+        return jobs
+    jobs = list_pipeline_jobs(context, pipeline_id)
+    incomplete = [
+        idx
+        for idx, job in enumerate(jobs)
+        if "data" not in job or "components" not in job
+    ]
+    if incomplete:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(incomplete), MAX_WORKERS)
+        ) as executor:
+            for idx, job in zip(
+                incomplete,
+                executor.map(lambda idx: complete_job(context, jobs[idx]), incomplete),
+            ):
+                jobs[idx] = job
+    # a running pipeline can still change
+    if jobs and all(job.get("status") in FINAL_STATUSES for job in jobs):
+        now = time.time()
+        updated = get_update_time(jobs)
+        if updated is None or now - updated < RECENT_PIPELINE_AGE:
+            # its next stages may not have started yet
+            write_cache(pipeline_id, jobs, now + RECENT_PIPELINE_TTL)
+        else:
+            write_cache(pipeline_id, jobs)
+    return jobs
 
 
 def get_pipeline_from_job(context, job_id):
+    jobs = read_cache(os.path.join("jobs", "%s.json" % job_id))
+    if jobs is not None:
+        return jobs
     initial_job = get_job(context, job_id)
     return get_pipeline_jobs(context, initial_job["pipeline_id"])
@@ -33,7 +33,7 @@ def save_pipeline(pipeline_jobs, pipeline_filename):
 
 def update_pipeline_with_component_version(context, pipeline_jobs):
     for pj in pipeline_jobs:
-        components = pu.get_stage_components(context, pj["id"])
+        components = pu.get_stage_components(context, pj)
         pj["data"]["pipeline"]["components"] = components
 
 
@@ -13,7 +13,11 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import argparse
+import configparser
+import io
 import unittest
+from contextlib import redirect_stderr
 
 from dcipipeline import auto
 
@@ -27,6 +31,50 @@ class TestAuto(unittest.TestCase):
         self.assertEqual(auto.cleanup("foo; bar"), "foo bar")
         self.assertEqual(auto.cleanup("foo& bar"), "foo bar")
 
+    def test_get_commands(self):
+        config = configparser.ConfigParser()
+        config.read_string("[Lab]\ncmd = dci-pipeline-check @URL -p pool\n")
+        self.assertEqual(
+            auto.get_commands(
+                config, {"Lab": ["ocp"], "Unknown": ["foo"]}, "https://change/1"
+            ),
+            {"Lab": ["dci-pipeline-check", "https://change/1", "-p", "pool", "ocp"]},
+        )
+
+    def test_jobs(self):
+        self.assertEqual(auto.non_negative_int("0"), 0)
+        self.assertEqual(auto.non_negative_int("4"), 4)
+        for value in ("-1", "foo"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                auto.non_negative_int(value)
+        with io.StringIO() as buf, redirect_stderr(buf):
+            with self.assertRaises(SystemExit) as ctx:
+                auto.main(["dci-auto-launch", "-j", "-1", "https://change/1"])
+            self.assertIn("must be 0 or more: -1", buf.getvalue())
+        self.assertEqual(ctx.exception.code, 2)
+
+    def test_run_pipelines(self):
+        cmds = {
+            "Foo": ["sh", "-c", "sleep 0.5; echo foo; exit 2"],
+            "Bar": ["sh", "-c", "echo bar"],
+            "Baz": ["/nonexistent/cmd"],
+        }
+        out = io.StringIO()
+        results = auto.run_pipelines(cmds, 2, out)
+        self.assertEqual(list(results), ["Foo", "Bar", "Baz"])
+        self.assertEqual(
+            {name: res[0] for name, res in results.items()},
+            {"Foo": 2, "Bar": 0, "Baz": 127},
+        )
+        lines = out.getvalue().splitlines()
+        # Bar and Baz do not wait for Foo
+        self.assertEqual(lines[-1], "[Foo] foo")
+        self.assertIn("[Bar] bar", lines)
+        out = io.StringIO()
+        auto.print_summary(results, out)
+        self.assertRegex(out.getvalue(), r"\nFoo +failure +2 \d+s\n")
+        self.assertRegex(out.getvalue(), r"\nBar +success +0 \d+s\n")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,117 @@
+#
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+from unittest import mock
+
+from dcipipeline import diff_pipeline
+from tests.fake_dci import Response, make_run
+
+
+class TestDiffPipeline(unittest.TestCase):
+    def search_range(self, runs):
+        args = diff_pipeline.parse_arguments(
+            ["--range", "my-pipeline", "--format", "json"],
+            {"DCI_CLIENT_ID": "id", "DCI_API_SECRET": "secret"},
+        )
+        pipelines = [
+            {"id": "pipeline%d" % num, "created_at": "2026-01-%02d" % (num + 1)}
+            for num in range(len(runs))
+        ]
+        with mock.patch.object(
+            diff_pipeline, "dci_pipeline"
+        ) as dci_pipeline, mock.patch.object(
+            diff_pipeline.pu, "get_pipeline_jobs"
+        ) as get_pipeline_jobs, mock.patch.object(
+            diff_pipeline, "print_result"
+        ) as print_result:
+            dci_pipeline.list.return_value = Response(
+                {"pipelines": list(reversed(pipelines))}
+            )
+            get_pipeline_jobs.side_effect = lambda context, pipeline_id: runs[
+                int(pipeline_id[8:])
+            ]
+            diff_pipeline.search_range(None, args)
+        self.assertEqual(dci_pipeline.list.call_args[1]["where"], "name:my-pipeline")
+        return (
+            print_result.call_args[0][0],
+            sorted(c[0][1] for c in get_pipeline_jobs.call_args_list),
+        )
+
+    def test_search_range_flip(self):
+        runs = [
+            make_run(num, "success" if num < 11 else "failure", [("ocp", "4.%d" % num)])
+            for num in range(16)
+        ]
+        result, fetched = self.search_range(runs)
+        self.assertEqual(
+            result,
+            [
+                {
+                    "name": "ocp",
+                    "pipeline": "openshift",
+                    "before": "4.10",
+                    "after": "4.11",
+                    "changed in": "pipeline11 (2026-01-12)",
+                }
+            ],
+        )
+        # only a logarithmic number of runs is fetched
+        self.assertEqual(len(fetched), len(set(fetched)))
+        self.assertLessEqual(len(fetched), 6)
+
+    def test_search_range_unfinished(self):
+        statuses = ["success"] * 5 + ["error", "failure", "killed", "failure"]
+        statuses.append("running")
+        runs = [
+            make_run(num, status, [("ocp", "4.%d" % num)])
+            for num, status in enumerate(statuses)
+        ]
+        # a run without jobs, skipped with the runs in error
+        runs[4] = []
+        result, fetched = self.search_range(runs)
+        self.assertEqual(
+            [(r["before"], r["after"], r["changed in"]) for r in result],
+            [("4.3", "4.6", "pipeline6 (2026-01-07)")],
+        )
+        self.assertEqual(len(fetched), len(set(fetched)))
+
+    def test_search_range_components(self):
+        runs = [
+            make_run(
+                num,
+                "success",
+                [
+                    ("ocp", "4.14" if num < 5 else "4.15"),
+                    ("git", "repo %s" % ("v1" if num < 9 else "v2")),
+                ],
+            )
+            for num in range(12)
+        ]
+        result, fetched = self.search_range(runs)
+        self.assertEqual(
+            [(r["name"], r["before"], r["after"], r["changed in"]) for r in result],
+            [
+                ("ocp", "4.14", "4.15", "pipeline5 (2026-01-06)"),
+                ("repo", "v1", "v2", "pipeline9 (2026-01-10)"),
+            ],
+        )
+        self.assertLess(len(fetched), len(runs))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_diff_pipeline.py ends here
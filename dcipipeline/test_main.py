@@ -1,5 +1,5 @@
 #
-# Copyright (C) 2020-2025 Red Hat, Inc.
+# Copyright (C) 2020-2026 Red Hat, Inc.
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -13,7 +13,9 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import json
 import os
+import tempfile
 import unittest
 
 import mock
@@ -32,10 +34,12 @@ from dcipipeline.main import (
     get_config,
     get_prev_jobdefs,
     load_jobdef_file,
+    log_jobdef_status,
     overload_dicts,
     post_process_jobdef,
     pre_process_jobdef,
     process_args,
+    record_job,
     upload_junit_files_from_dir,
 )
 
@@ -416,6 +420,35 @@ class TestMain(unittest.TestCase):
         self.assertEqual(result, resp_200)
         self.assertEqual(func.call_count, 2)
 
+    def test_record_job(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "jobs")
+            with mock.patch.dict(os.environ, {"DCI_PIPELINE_JOBS_FILE": path}):
+                record_job("ocp", "1234", "new")
+                status = log_jobdef_status(
+                    {"name": "ocp"},
+                    {
+                        "job": {
+                            "id": "1234",
+                            "jobstates": [
+                                {"created_at": "2", "status": "success"},
+                                {"created_at": "1", "status": "running"},
+                            ],
+                        }
+                    },
+                )
+            self.assertEqual(status, "success")
+            with open(path) as f:
+                events = [json.loads(line) for line in f]
+        self.assertEqual(
+            [(e["name"], e["job_id"], e["status"]) for e in events],
+            [("ocp", "1234", "new"), ("ocp", "1234", "success")],
+        )
+
+    def test_record_job_no_file(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            record_job("ocp", "1234", "new")
+
 
 class TestBuildCmdline(unittest.TestCase):
     @mock.patch(
@@ -0,0 +1,132 @@
+#
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from dcipipeline import pipeline_utils as pu
+from tests.fake_dci import Response, make_job
+
+
+class TestPipelineUtils(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        os.environ["DCI_PIPELINE_CACHE_DIR"] = self.cache_dir
+
+    def tearDown(self):
+        del os.environ["DCI_PIPELINE_CACHE_DIR"]
+        shutil.rmtree(self.cache_dir)
+
+    @mock.patch.object(pu, "PAGE_SIZE", 2)
+    @mock.patch("dcipipeline.pipeline_utils.dci_job")
+    def test_get_pipeline_from_job(self, dci_job):
+        jobs = [make_job(1), make_job(2, components=False), make_job(3)]
+
+        def list_jobs(context, limit, offset, **kwargs):
+            self.assertEqual(kwargs["embed"], "components")
+            return Response(
+                {"jobs": jobs[offset : offset + limit], "_meta": {"count": len(jobs)}}
+            )
+
+        dci_job.list.side_effect = list_jobs
+        dci_job.get.side_effect = lambda context, job_id: Response(
+            {"job": make_job(int(job_id[3:]))}
+        )
+        dci_job.get_components.side_effect = lambda context, job_id: Response(
+            {"components": [{"type": "ocp", "name": "4.2"}]}
+        )
+        pipeline = pu.get_pipeline_from_job(None, "job1")
+        self.assertEqual([job["id"] for job in pipeline], ["job1", "job2", "job3"])
+        self.assertEqual(
+            [pu.get_stage_components(None, job) for job in pipeline],
+            [["ocp=4.1"], ["ocp=4.2"], ["ocp=4.3"]],
+        )
+        self.assertEqual(dci_job.list.call_count, 2)
+        # only job2 needs another call
+        self.assertEqual(
+            [c[0][1] for c in dci_job.get_components.call_args_list], ["job2"]
+        )
+        # finished pipeline read from the cache
+        dci_job.reset_mock()
+        self.assertEqual(pu.get_pipeline_from_job(None, "job3"), pipeline)
+        self.assertEqual(pu.get_pipeline_jobs(None, "pipeline1"), pipeline)
+        dci_job.get.assert_not_called()
+        dci_job.list.assert_not_called()
+
+    @mock.patch("dcipipeline.pipeline_utils.dci_job")
+    def test_running_pipeline_not_cached(self, dci_job):
+        dci_job.list.return_value = Response(
+            {
+                "jobs": [make_job(1), make_job(2, status="running")],
+                "_meta": {"count": 2},
+            }
+        )
+        self.assertEqual(len(pu.get_pipeline_jobs(None, "pipeline1")), 2)
+        self.assertEqual(len(pu.get_pipeline_jobs(None, "pipeline1")), 2)
+        self.assertEqual(dci_job.list.call_count, 2)
+
+    @mock.patch("dcipipeline.pipeline_utils.dci_job")
+    def test_recent_pipeline_cache(self, dci_job):
+        now = 1700000000
+        stage1 = make_job(1, updated_at="2023-11-14T22:00:00.123456")
+        dci_job.list.return_value = Response({"jobs": [stage1], "_meta": {"count": 1}})
+        with mock.patch("time.time", return_value=now):
+            self.assertEqual(pu.get_pipeline_jobs(None, "pipeline1"), [stage1])
+            self.assertEqual(pu.get_pipeline_jobs(None, "pipeline1"), [stage1])
+        self.assertEqual(dci_job.list.call_count, 1)
+        # the next stage started after the cache of the recent pipeline expired
+        stage2 = make_job(2, updated_at="2023-11-14T22:20:00")
+        dci_job.list.return_value = Response(
+            {"jobs": [stage1, stage2], "_meta": {"count": 2}}
+        )
+        with mock.patch("time.time", return_value=now + pu.RECENT_PIPELINE_TTL + 1):
+            self.assertEqual(pu.get_pipeline_jobs(None, "pipeline1"), [stage1, stage2])
+        self.assertEqual(dci_job.list.call_count, 2)
+        # an old pipeline is cached for good
+        with mock.patch("time.time", return_value=now + pu.RECENT_PIPELINE_AGE * 2):
+            self.assertEqual(pu.get_pipeline_jobs(None, "pipeline1"), [stage1, stage2])
+            self.assertEqual(dci_job.list.call_count, 3)
+        self.assertEqual(pu.get_pipeline_jobs(None, "pipeline1"), [stage1, stage2])
+        self.assertEqual(pu.get_pipeline_from_job(None, "job2"), [stage1, stage2])
+        self.assertEqual(dci_job.list.call_count, 3)
+
+    def test_prune_cache(self):
+        for num in range(4):
+            pu.write_cache("pipeline%d" % num, [make_job(num)])
+        for num in range(4):
+            path = os.path.join(self.cache_dir, "pipeline%d.json" % num)
+            os.utime(path, (1000 * num, 1000 * num))
+        # read recently
+        self.assertIsNotNone(pu.read_cache("jobs/job0.json"))
+        # pipeline1 is too old and pipeline2 above the limit
+        with mock.patch.object(pu, "CACHE_MAX_PIPELINES", 2):
+            evicted = pu.prune_cache(self.cache_dir, now=pu.CACHE_MAX_AGE + 1500)
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in evicted),
+            ["pipeline1.json", "pipeline2.json"],
+        )
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.cache_dir, "jobs"))),
+            ["job0.json", "job3.json"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_pipeline_utils.py ends here
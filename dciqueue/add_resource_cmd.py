@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -19,7 +19,7 @@ import json
 import logging
 import os
 
-from dciqueue import lib
+from dciqueue import lib, metrics
 from dciqueue.run_cmd import EXT
 
 log = logging.getLogger(__name__)
@@ -66,6 +66,7 @@ def execute_command(args):
         log.debug("Removing reason file %s" % reason)
         os.unlink(reason)
 
+    metrics.publish(args.top_dir, args.pool)
     return 0
 
 
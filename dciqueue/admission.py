@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Admission control of the commands started on the host.
+
+Before starting a command of a pool, the number of running commands of
+the pool (max-running setting) and of all the pools of the host
+(host-max-running) are checked, as well as the 1 minute load average
+(host-max-load) and the available memory (host-min-memory) read from
+/proc. The command stays queued when a limit is reached.
+
+The host-* settings are stored once for the host (see
+lib.HOST_CONFIG_KEYS) and the limits are checked under a lock of the
+host so that concurrent runners of different pools cannot exceed them.
+
+For a command claimed through the server by a remote runner, the host
+limits apply to the runner host: its load and available memory are
+sent with the claim and its running commands are the ones leased to it.
+The commands leased to remote hosts do not count for the local host.
+"""
+
+import json
+import logging
+import os
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+MEMINFO = "/proc/meminfo"
+
+
+def get_host(execfile):
+    """Return the remote host running a command or None for the local host."""
+    try:
+        with open(execfile) as f:
+            lease = json.load(f).get("lease")
+    except (OSError, ValueError):
+        return None
+    return lease.get("host") if lease else None
+
+
+def count_running(top_dir, pool=None, host=None):
+    """Return the number of running commands of a pool or of a host.
+
+    Without pool, the running commands of all the pools are counted on
+    host, the local host when host is None.
+    """
+    queue_dir = os.path.join(top_dir, "queue")
+    pools = [pool] if pool else os.listdir(queue_dir)
+    count = 0
+    for name in pools:
+        try:
+            with os.scandir(os.path.join(queue_dir, name)) as entries:
+                execfiles = [e.path for e in entries if e.name.endswith(lib.EXEC_EXT)]
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        if pool is None:
+            execfiles = [path for path in execfiles if get_host(path) == host]
+        count += len(execfiles)
+    return count
+
+
+def get_load():
+    """Return the 1 minute load average of the host."""
+    return os.getloadavg()[0]
+
+
+def get_available_memory(meminfo=MEMINFO):
+    """Return the available memory of the host in bytes or None."""
+    try:
+        with open(meminfo) as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def check(top_dir, pool, config, host=None):
+    """Return why no more command can be started, or None.
+
+    host is the {"name", "load", "memory"} state sent by a remote runner
+    claiming the command, None for the local host. A load or memory
+    unknown to the remote runner is not checked.
+
+    The caller holds lib.HostLock until the command is started so that
+    the runners of the other pools see it running.
+    """
+    if config["max-running"]:
+        running = count_running(top_dir, pool)
+        if running >= config["max-running"]:
+            return "%d commands running in the pool" % running
+    if config["host-max-running"]:
+        running = count_running(top_dir, host=host["name"] if host else None)
+        if running >= config["host-max-running"]:
+            return "%d commands running on the host" % running
+    if config["host-max-load"]:
+        load = host.get("load") if host else get_load()
+        if load is not None and load > config["host-max-load"]:
+            return "load average of %.2f" % load
+    if config["host-min-memory"]:
+        memory = host.get("memory") if host else get_available_memory()
+        if memory is not None and memory < config["host-min-memory"]:
+            return "%dM of available memory" % (memory // 1024**2)
+    return None
+
+
+# admission.py ends here
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Sticky affinity between the commands and the resources of a pool.
+
+The resources used by the last run of a command are recorded under an
+affinity key: the key given with schedule -a (a pipeline name for
+example) or a hash of the command and its working directory. The next
+run of the same key prefers these resources to reuse their state.
+
+Only the MAX_KEYS most recently run keys are kept so that the state
+does not grow with every command ever run in the pool.
+
+The file config/<pool>/affinity.json also keeps, for each outcome
+(hit: the preferred resources were used, miss: other resources were
+used, new: nothing recorded yet), the number of commands and their
+total duration to measure the benefit of the affinity.
+"""
+
+import json
+import logging
+import os
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+AFFINITY_FILE = "affinity.json"
+OUTCOMES = ("hit", "miss", "new")
+# number of affinity keys, the most recently run, kept
+MAX_KEYS = 1000
+
+
+def get_affinity_path(top_dir, pool):
+    return os.path.join(top_dir, "config", pool, AFFINITY_FILE)
+
+
+def get_affinity_key(data):
+    """Return the affinity key of a command."""
+    if data.get("affinity_key"):
+        return data["affinity_key"]
+    return lib.get_fingerprint(data)
+
+
+def load(top_dir, pool):
+    try:
+        with open(get_affinity_path(top_dir, pool)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = {}
+    state.setdefault("resources", {})
+    state.setdefault("stats", {})
+    return state
+
+
+def update(top_dir, pool, func):
+    """Apply func on the affinity state of the pool under the booking lock."""
+    path = get_affinity_path(top_dir, pool)
+    locks = lib.BookingLock(top_dir, [pool])
+    locks.lock()
+    try:
+        state = load(top_dir, pool)
+        func(state)
+        tmpfile = path + ".tmp"
+        with open(tmpfile, "w") as f:
+            json.dump(state, f)
+        os.rename(tmpfile, path)
+    finally:
+        locks.unlock()
+    return state
+
+
+def get_preferred(state, key):
+    """Return the resources used by the last run of the affinity key."""
+    return state["resources"].get(key, [])
+
+
+def record_resources(top_dir, pool, key, resources):
+    def set_resources(state):
+        runs = state["resources"]
+        # the most recently run keys last
+        runs.pop(key, None)
+        runs[key] = resources
+        while len(runs) > MAX_KEYS:
+            del runs[next(iter(runs))]
+
+    return update(top_dir, pool, set_resources)
+
+
+def record_outcome(top_dir, pool, outcome, duration):
+    def add_outcome(state):
+        stats = state["stats"].setdefault(outcome, {"count": 0, "duration": 0})
+        stats["count"] += 1
+        stats["duration"] += duration
+
+    return update(top_dir, pool, add_outcome)
+
+
+def get_stats(top_dir, pool):
+    """Return {outcome: {"count": ..., "average": ...}} for the pool."""
+    stats = {}
+    for outcome, value in load(top_dir, pool)["stats"].items():
+        stats[outcome] = {
+            "count": value["count"],
+            "average": value["duration"] / value["count"] if value["count"] else 0,
+        }
+    return stats
+
+
+# affinity.py ends here
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Automatic scaling of the resources of a pool.
+
+When the queue is deeper than scale-up-queue-depth and no resource is
+free, the scale-up-cmd hook is called and each line it prints is added
+as a new resource. When the queue is empty, a resource added this way
+and free for more than scale-down-idle-time seconds is booked and passed
+to the scale-down-cmd hook, then removed from the pool if the hook
+succeeds. Two actions are separated by at least scale-cooldown seconds
+and the pool size stays between scale-min-size and scale-max-size.
+
+The resources added by the hooks and the time of the last action are
+stored in config/<pool>/autoscale.json. dci-queue run starts the check
+in a detached dci-queue autoscale process to never wait for the hooks.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from dciqueue import lib, metrics
+
+log = logging.getLogger(__name__)
+
+AUTOSCALE_FILE = "autoscale.json"
+
+
+def get_state_path(top_dir, pool):
+    return os.path.join(top_dir, "config", pool, AUTOSCALE_FILE)
+
+
+def get_lock_path(top_dir, pool):
+    return get_state_path(top_dir, pool) + ".lck"
+
+
+def load(top_dir, pool):
+    try:
+        with open(get_state_path(top_dir, pool)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = {}
+    state.setdefault("resources", [])
+    state.setdefault("last_action", 0)
+    return state
+
+
+def save(top_dir, pool, state):
+    path = get_state_path(top_dir, pool)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.rename(path + ".tmp", path)
+
+
+def add_resource(top_dir, pool, name):
+    path = os.path.join(top_dir, "pool", pool, name)
+    if not os.path.exists(path):
+        open(path, "w").close()
+    link = os.path.join(top_dir, "available", pool, name)
+    if not os.path.islink(link):
+        os.symlink(path, link)
+
+
+def scale_up(top_dir, pool, config, state, env):
+    ret, output = lib.call_hook(
+        config["scale-up-cmd"], pool, env, config["scale-timeout"]
+    )
+    if ret != 0:
+        log.error("Scale up hook of pool %s failed (%s): %s" % (pool, ret, output))
+        return []
+    added = []
+    size = len(os.listdir(os.path.join(top_dir, "pool", pool)))
+    for name in output.split():
+        if config["scale-max-size"] and size + len(added) >= config["scale-max-size"]:
+            log.warning("Pool %s reached its maximum size, ignoring %s" % (pool, name))
+            break
+        if "/" in name or name.startswith("."):
+            log.error("Invalid resource name %s from scale up hook" % name)
+            continue
+        add_resource(top_dir, pool, name)
+        log.info("Added resource %s to pool %s" % (name, pool))
+        added.append(name)
+        if name not in state["resources"]:
+            state["resources"].append(name)
+    return added
+
+
+def get_idle_resource(top_dir, pool, state, idle_time, now):
+    """Return the autoscaled resource free for the longest time, if idle enough."""
+    idle = []
+    for name in state["resources"]:
+        link = os.path.join(top_dir, "available", pool, name)
+        try:
+            freed_at = os.lstat(link).st_mtime
+        except FileNotFoundError:
+            continue
+        if now - freed_at >= idle_time:
+            idle.append((freed_at, name))
+    return min(idle)[1] if idle else None
+
+
+def scale_down(top_dir, pool, config, state, env, name):
+    # book the resource so that no command starts on it during the hook
+    link = os.path.join(top_dir, "available", pool, name)
+    locks = lib.BookingLock(top_dir, [pool])
+    locks.lock()
+    try:
+        os.unlink(link)
+    except FileNotFoundError:
+        return None
+    finally:
+        locks.unlock()
+    env = dict(env, DCI_QUEUE_RES=name)
+    ret, output = lib.call_hook(
+        config["scale-down-cmd"], pool, env, config["scale-timeout"], name
+    )
+    path = os.path.join(top_dir, "pool", pool, name)
+    if ret != 0:
+        log.error(
+            "Scale down hook of pool %s failed for %s (%s): %s"
+            % (pool, name, ret, output)
+        )
+        os.symlink(path, link)
+        return None
+    if os.path.exists(path):
+        os.unlink(path)
+    state["resources"].remove(name)
+    log.info("Removed resource %s from pool %s" % (name, pool))
+    return name
+
+
+def check(top_dir, pool, now=None):
+    """Scale the pool up or down if needed. Return the added/removed resources."""
+    config = lib.get_config(top_dir, pool)
+    if not config["scale-up-cmd"] and not config["scale-down-cmd"]:
+        return [], []
+    if now is None:
+        now = time.time()
+
+    # only one process takes autoscaling decisions at a time
+    os.makedirs(os.path.dirname(get_state_path(top_dir, pool)), exist_ok=True)
+    lock_fd = open(get_lock_path(top_dir, pool), "w")
+    try:
+        fcntl.lockf(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        log.debug("Autoscaling of pool %s already in progress" % pool)
+        lock_fd.close()
+        return [], []
+
+    added = []
+    removed = []
+    try:
+        state = load(top_dir, pool)
+        if now - state["last_action"] < config["scale-cooldown"]:
+            log.debug("Autoscaling of pool %s in cooldown" % pool)
+            return [], []
+        _, queued = lib.read_queue(top_dir, pool)
+        size = len(os.listdir(os.path.join(top_dir, "pool", pool)))
+        free = len(os.listdir(os.path.join(top_dir, "available", pool)))
+        env = {"DCI_QUEUE_DEPTH": str(len(queued)), "DCI_QUEUE_SIZE": str(size)}
+        log.debug(
+            "Autoscaling pool %s: depth=%d size=%d free=%d"
+            % (pool, len(queued), size, free)
+        )
+
+        if (
+            config["scale-up-cmd"]
+            and config["scale-up-queue-depth"]
+            and len(queued) >= config["scale-up-queue-depth"]
+            and free == 0
+            and (not config["scale-max-size"] or size < config["scale-max-size"])
+        ):
+            state["last_action"] = now
+            added = scale_up(top_dir, pool, config, state, env)
+        elif (
+            config["scale-down-cmd"]
+            and config["scale-down-idle-time"]
+            and len(queued) == 0
+            and size > config["scale-min-size"]
+        ):
+            name = get_idle_resource(
+                top_dir, pool, state, config["scale-down-idle-time"], now
+            )
+            if name:
+                state["last_action"] = now
+                if scale_down(top_dir, pool, config, state, env, name):
+                    removed.append(name)
+        else:
+            return [], []
+        save(top_dir, pool, state)
+    finally:
+        fcntl.lockf(lock_fd, fcntl.LOCK_UN)
+        lock_fd.close()
+    if added or removed:
+        metrics.publish(top_dir, pool)
+    return added, removed
+
+
+def is_running(top_dir, pool):
+    """Return True when a process is checking the autoscaling of the pool."""
+    try:
+        lock_fd = open(get_lock_path(top_dir, pool), "r")
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.lockf(lock_fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except IOError:
+        return True
+    finally:
+        lock_fd.close()
+    return False
+
+
+def spawn(top_dir, pool, now=None):
+    """Start the autoscaling check of the pool in a detached process.
+
+    Nothing is started when the pool has no hook, is in cooldown or is
+    already being checked. Return the process or None.
+    """
+    config = lib.get_config(top_dir, pool)
+    if not config["scale-up-cmd"] and not config["scale-down-cmd"]:
+        return None
+    if now is None:
+        now = time.time()
+    if now - load(top_dir, pool)["last_action"] < config["scale-cooldown"]:
+        return None
+    if is_running(top_dir, pool):
+        log.debug("Autoscaling of pool %s already in progress" % pool)
+        return None
+    env = dict(os.environ)
+    # the package even when not installed
+    path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(
+        [path] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    log.info("Starting the autoscaling check of pool %s" % pool)
+    return subprocess.Popen(
+        [sys.executable, "-m", "dciqueue.main", "-t", top_dir, "autoscale", pool],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+# autoscale.py ends here
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import logging
+
+from dciqueue import autoscale, lib
+
+log = logging.getLogger(__name__)
+
+COMMAND = "autoscale"
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND,
+        help="Call the scale up or scale down hooks of a pool if needed",
+    )
+    parser.add_argument("pool", help="Name of the pool")
+    return COMMAND
+
+
+def execute_command(args):
+    if not lib.check_pool(args.top_dir, args.pool):
+        return 1
+
+    added, removed = autoscale.check(args.top_dir, args.pool)
+    log.info(
+        "Added %d and removed %d resources in pool %s"
+        % (len(added), len(removed), args.pool)
+    )
+    return 0
+
+
+# autoscale_cmd.py ends here
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Client of the dci-queue server running the claimed commands locally.
+
+The commands are started in their own session with the environment
+variables sent by the server. Their output is sent to the server, their
+lease is renewed every third of the lease time and they are stopped if
+the lease is lost (unscheduled or expired command).
+"""
+
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import threading
+import urllib.error
+import urllib.request
+
+from dciqueue import admission
+
+log = logging.getLogger(__name__)
+
+# time given to a command to exit when its lease is lost
+KILL_GRACE_PERIOD = 60
+# size of the output chunks sent to the server
+CHUNK_SIZE = 65536
+
+
+class ClientError(Exception):
+    def __init__(self, message, code):
+        super(ClientError, self).__init__(message)
+        self.code = code
+
+
+class Client(object):
+    def __init__(self, url, token=None, timeout=60):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, raw=None):
+        """Return (status, headers, body) of an HTTP request.
+
+        A JSON body is decoded. Raise ClientError on HTTP errors.
+        """
+        headers = {}
+        data = raw
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        if self.token:
+            headers["Authorization"] = "Bearer " + self.token
+        req = urllib.request.Request(
+            self.url + path, data=data, headers=headers, method=method
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                content = resp.read()
+                if resp.headers.get("Content-Type") == "application/json":
+                    content = json.loads(content)
+                return resp.status, resp.headers, content
+        except urllib.error.HTTPError as excp:
+            try:
+                message = json.loads(excp.read())["error"]
+            except (ValueError, KeyError):
+                message = excp.reason
+            raise ClientError("%d %s" % (excp.code, message), excp.code)
+
+    def list_pools(self):
+        return self.request("GET", "/pools")[2]["pools"]
+
+    def get_pool_state(self, pool):
+        return self.request("GET", "/pools/%s" % pool)[2]
+
+    def schedule(self, pool, commands):
+        return self.request(
+            "POST", "/pools/%s/commands" % pool, {"commands": commands}
+        )[2]["ids"]
+
+    def claim(self, pool, host=None):
+        """Claim the next command of the pool for this host, or None.
+
+        The load and available memory of this host are sent for the
+        admission control of the server.
+        """
+        status, _, content = self.request(
+            "POST",
+            "/pools/%s/claim" % pool,
+            {
+                "host": host or socket.getfqdn(),
+                "load": admission.get_load(),
+                "memory": admission.get_available_memory(),
+            },
+        )
+        return content if status == 200 else None
+
+    def renew(self, pool, idx, lease):
+        return self.request(
+            "POST", "/pools/%s/commands/%d/renew" % (pool, idx), {"lease": lease}
+        )[2]["expires"]
+
+    def release(self, pool, idx, lease, exit_code):
+        self.request(
+            "POST",
+            "/pools/%s/commands/%d/release" % (pool, idx),
+            {"lease": lease, "exit_code": exit_code},
+        )
+
+    def send_log(self, pool, idx, lease, content):
+        self.request(
+            "POST",
+            "/pools/%s/commands/%d/log?lease=%s" % (pool, idx, lease),
+            raw=content,
+        )
+
+    def read_log(self, pool, idx, offset=0):
+        """Return (content, next offset, running)."""
+        _, headers, content = self.request(
+            "GET", "/pools/%s/commands/%d/log?offset=%d" % (pool, idx, offset)
+        )
+        return content, int(headers["X-Offset"]), headers["X-Running"] == "1"
+
+
+def send_output(client, pool, claim, stream):
+    """Send the output of a command to the server until its end."""
+    while True:
+        content = os.read(stream.fileno(), CHUNK_SIZE)
+        if not content:
+            break
+        try:
+            client.send_log(pool, claim["id"], claim["lease"], content)
+        except (ClientError, OSError) as excp:
+            log.warning(
+                "Unable to send the log of command %d: %s" % (claim["id"], excp)
+            )
+
+
+def stop_command(proc):
+    """Terminate the process group of a command, killing it if needed."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            pass
+        try:
+            proc.wait(KILL_GRACE_PERIOD)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def run_claim(client, pool, claim):
+    """Run a claimed command, renewing its lease, and release it."""
+    idx = claim["id"]
+    wd = claim["wd"]
+    if not os.path.isdir(wd):
+        log.warning("No directory %s on this host, using %s" % (wd, os.getcwd()))
+        wd = None
+    log.info("Running command %d of pool %s: %s" % (idx, pool, claim["cmd"]))
+    try:
+        proc = subprocess.Popen(
+            claim["cmd"],
+            cwd=wd,
+            env=dict(os.environ, **claim["env"]),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    except OSError as excp:
+        log.error("Unable to run command %d: %s" % (idx, excp))
+        client.release(pool, idx, claim["lease"], 127)
+        return 127
+    sender = threading.Thread(
+        target=send_output, args=(client, pool, claim, proc.stdout)
+    )
+    sender.start()
+    while True:
+        try:
+            proc.wait(claim["lease_time"] / 3.0)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        try:
+            client.renew(pool, idx, claim["lease"])
+        except ClientError as excp:
+            log.warning("Stopping command %d: %s" % (idx, excp))
+            stop_command(proc)
+            break
+        except OSError as excp:
+            # the lease expires if the server stays unreachable
+            log.warning("Unable to renew the lease of command %d: %s" % (idx, excp))
+    sender.join()
+    proc.stdout.close()
+    exit_code = 128 - proc.returncode if proc.returncode < 0 else proc.returncode
+    log.info("Command %d of pool %s returned %d" % (idx, pool, exit_code))
+    try:
+        client.release(pool, idx, claim["lease"], exit_code)
+    except ClientError as excp:
+        log.warning("Unable to release command %d: %s" % (idx, excp))
+    return exit_code
+
+
+def run(client, pool, host=None):
+    """Run the commands of the pool that can be claimed until none is left.
+
+    A new command is claimed each time a command ends to use the freed
+    resources. Return {id: exit code}.
+    """
+    results = {}
+
+    def run_claims(claim):
+        while claim is not None:
+            results[claim["id"]] = run_claim(client, pool, claim)
+            claim = client.claim(pool, host)
+
+    threads = []
+    while True:
+        claim = client.claim(pool, host)
+        if claim is None:
+            break
+        thread = threading.Thread(target=run_claims, args=(claim,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# client.py ends here
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import logging
+import sys
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+COMMAND = "config"
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND, help="Display or change the settings of a pool"
+    )
+    parser.add_argument(
+        "-u",
+        "--unset",
+        action="store_true",
+        help="Reset the setting to its default value",
+    )
+    parser.add_argument("pool", help="Name of the pool")
+    parser.add_argument(
+        "key", nargs="?", default=None, choices=sorted(lib.CONFIG_KEYS.keys())
+    )
+    parser.add_argument("value", nargs="?", default=None)
+    return COMMAND
+
+
+def execute_command(args):
+    if not lib.check_pool(args.top_dir, args.pool):
+        return 1
+
+    if args.key is None:
+        for key, value in sorted(lib.get_config(args.top_dir, args.pool).items()):
+            print("%s=%s" % (key, value))
+        return 0
+
+    if args.unset:
+        lib.set_config(args.top_dir, args.pool, args.key, None)
+    elif args.value is not None:
+        try:
+            lib.set_config(args.top_dir, args.pool, args.key, args.value)
+        except ValueError as excp:
+            sys.stderr.write("Invalid value for %s: %s\n" % (args.key, excp))
+            return 1
+        log.info("Set %s to %s on pool %s" % (args.key, args.value, args.pool))
+    else:
+        print(lib.get_config(args.top_dir, args.pool)[args.key])
+    return 0
+
+
+# config_cmd.py ends here
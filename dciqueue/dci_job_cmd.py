@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2022-2025 Red Hat, Inc
+# Copyright (C) 2022-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -17,11 +17,10 @@
 
 import json
 import logging
-import os
 import re
 import sys
 
-from dciqueue import lib
+from dciqueue import lib, retention
 
 log = logging.getLogger(__name__)
 
@@ -42,33 +41,20 @@ def execute_command(args):
     if not lib.check_pool(args.top_dir, args.pool):
         return 1
 
-    logfile = os.path.join(args.top_dir, "log", args.pool, args.id)
-    if not os.path.exists(logfile):
-        sys.stderr.write(
-            ("No log file found in (pool/id): %s/%s\n" % (args.pool, args.id))
-        )
-        log.error("No log file found in (pool/id): %s/%s\n" % (args.pool, args.id))
-        return 1
-
-    dci_pipeline_job_id_regex = re.compile(
-        r"^\d{4}-.*\s+running jobdef: ([\w.-]+) with.*/([0-9a-f-]+) .*$"
-    )
-    dci_check_change_job_id_regex = re.compile(
-        r'^changed: \[[\w-]+\] => (\{"changed": true, "job":.+\})$'
-    )
-
-    with open(logfile, "r") as f:
-        lines = f.readlines()
-
-    jobs = {}
-    for line in lines:
-        m = dci_pipeline_job_id_regex.search(line)
-        if m:
-            jobs[m.group(2)] = m.group(1)
-        m = dci_check_change_job_id_regex.search(line)
-        if m:
-            j = json.loads(m.group(1))
-            jobs[j["job"].get("id")] = j["job"].get("name")
+    jobs_file = retention.get_jobs_path(args.top_dir, args.pool, args.id)
+    if jobs_file:
+        jobs = {
+            job_id: job["name"] for job_id, job in lib.read_jobs_file(jobs_file).items()
+        }
+    else:
+        logfile = retention.get_log_path(args.top_dir, args.pool, args.id)
+        if not logfile:
+            sys.stderr.write(
+                ("No log file found in (pool/id): %s/%s\n" % (args.pool, args.id))
+            )
+            log.error("No log file found in (pool/id): %s/%s\n" % (args.pool, args.id))
+            return 1
+        jobs = scan_log(logfile)
 
     if jobs:
         for job in jobs:
@@ -83,4 +69,26 @@ def execute_command(args):
     return 0
 
 
+def scan_log(logfile):
+    """Look for the DCI job ids in the output of commands without a jobs file."""
+    dci_pipeline_job_id_regex = re.compile(
+        r"^\d{4}-.*\s+running jobdef: ([\w.-]+) with.*/([0-9a-f-]+) .*$"
+    )
+    dci_check_change_job_id_regex = re.compile(
+        r'^changed: \[[\w-]+\] => (\{"changed": true, "job":.+\})$'
+    )
+
+    jobs = {}
+    with retention.open_log(logfile) as f:
+        for line in f:
+            m = dci_pipeline_job_id_regex.search(line)
+            if m:
+                jobs[m.group(2)] = m.group(1)
+            m = dci_check_change_job_id_regex.search(line)
+            if m:
+                j = json.loads(m.group(1))
+                jobs[j["job"].get("id")] = j["job"].get("name")
+    return jobs
+
+
 # dci_job_cmd.py ends here
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Dependencies between the commands of a pool.
+
+A command scheduled with --after waits until the listed commands are
+no longer in the queue. The readiness is computed from the queue
+already read by the dispatcher: a predecessor is finished when its id
+is neither queued nor running. With --after-success, the history is
+read, only when all the predecessors are finished, to check their exit
+code and the command is cancelled if one of them failed or never ran.
+The history compaction keeps the entries of the awaited commands.
+"""
+
+import logging
+
+from dciqueue import history
+
+log = logging.getLogger(__name__)
+
+
+def parse_ids(value):
+    """Convert a list of ids like 1,2,3 to a list of integers."""
+    try:
+        ids = [int(idx) for idx in value.split(",") if idx.strip()]
+    except ValueError:
+        raise ValueError("invalid command ids: %s" % value)
+    if not ids:
+        raise ValueError("no command id: %s" % value)
+    return ids
+
+
+def get_results(top_dir, pool, ids):
+    """Return {id: exit code} of the last complete run of the commands.
+
+    The history is read under its lock so that no compaction runs
+    meanwhile.
+    """
+    results = {}
+    locks = history.get_lock(top_dir, pool)
+    locks.lock()
+    try:
+        for entry in history.read(top_dir, pool):
+            if entry["id"] in ids and "preempted_by" not in entry:
+                results[entry["id"]] = entry["exit_code"]
+    finally:
+        locks.unlock()
+    return results
+
+
+def split_ready(top_dir, pool, queued, executing):
+    """Split the queued commands according to their dependencies.
+
+    Return 3 lists of (id, data, mtime): the commands ready to run, the
+    commands waiting for their predecessors and the commands to cancel
+    because a predecessor required to succeed did not.
+    """
+    pending = set(idx for idx, _, _ in queued) | set(idx for idx, _, _ in executing)
+    ready = []
+    waiting = []
+    to_check = []
+    for cmd in queued:
+        after = cmd[1].get("after")
+        if not after:
+            ready.append(cmd)
+        elif any(idx in pending for idx in after):
+            waiting.append(cmd)
+        elif cmd[1].get("after_success"):
+            to_check.append(cmd)
+        else:
+            ready.append(cmd)
+
+    cancelled = []
+    if to_check:
+        results = get_results(
+            top_dir, pool, set(idx for cmd in to_check for idx in cmd[1]["after"])
+        )
+        for cmd in to_check:
+            failed = [idx for idx in cmd[1]["after"] if results.get(idx) != 0]
+            if failed:
+                log.info(
+                    "Command %d cancelled: command %s did not succeed"
+                    % (cmd[0], ",".join(str(idx) for idx in failed))
+                )
+                cancelled.append(cmd)
+            else:
+                ready.append(cmd)
+    return ready, waiting, cancelled
+
+
+# dependencies.py ends here
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""History of the commands run in a pool and runtime estimations.
+
+Each finished command is appended as a JSON line to log/<pool>/.history
+with its fingerprint (hash of the command line and working directory),
+resources, start and end times and exit code, plus the id of the
+command which preempted it if any. The expected duration of a command
+is the average of the last runs with the same fingerprint or, without
+any, the median duration of the recent commands of the pool.
+
+The durations needed by the estimations are kept up to date by record
+in log/<pool>/.durations so that they are read without parsing the
+whole history.
+
+The compaction keeps the entries of the commands that queued commands
+are waiting for (schedule --after) so that their exit code is still
+known when they are checked.
+"""
+
+import heapq
+import json
+import logging
+import os
+import time
+
+from dciqueue import lib, scheduling
+
+log = logging.getLogger(__name__)
+
+HISTORY_FILE = ".history"
+HISTORY_LOCK = ".history.lck"
+DURATIONS_FILE = ".durations"
+# number of runs used to estimate the duration of a command
+LAST_RUNS = 5
+# number of commands used to estimate the duration of an unknown command
+LAST_POOL_RUNS = 100
+# number of fingerprints, the most recently run, kept in the durations
+MAX_FINGERPRINTS = 1000
+
+
+def get_history_path(top_dir, pool):
+    return os.path.join(top_dir, "log", pool, HISTORY_FILE)
+
+
+def get_durations_path(top_dir, pool):
+    return os.path.join(top_dir, "log", pool, DURATIONS_FILE)
+
+
+def get_lock(top_dir, pool):
+    """Return the lock serializing the appends, compactions and full reads."""
+    return lib.PoolLock(top_dir, [pool], HISTORY_LOCK)
+
+
+def record(top_dir, pool, idx, data, exit_code, ended_at=None, preempted_by=None):
+    """Append a finished command to the history of the pool."""
+    entry = {
+        "id": idx,
+        "fingerprint": lib.get_fingerprint(data),
+        "cmd": data["cmd"],
+        "wd": data["wd"],
+        "user": data.get("user"),
+        "priority": data.get("priority", 0),
+        "resources": [[res, pool] for res, pool in data.get("booked", [])],
+        "queued_at": data.get("queued_at"),
+        "started_at": data.get("started_at"),
+        "ended_at": ended_at or time.time(),
+        "exit_code": exit_code,
+    }
+    if preempted_by is not None:
+        entry["preempted_by"] = preempted_by
+    # not appended to the old file during a compaction
+    locks = get_lock(top_dir, pool)
+    locks.lock()
+    try:
+        durations = load_durations(top_dir, pool)
+        with open(get_history_path(top_dir, pool), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        if durations is None:
+            durations = build_durations(top_dir, pool)
+        else:
+            add_duration(durations, entry)
+        save_durations(top_dir, pool, durations)
+    finally:
+        locks.unlock()
+    return entry
+
+
+def read(top_dir, pool):
+    """Yield the entries of the history of the pool, oldest first."""
+    try:
+        with open(get_history_path(top_dir, pool)) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def get_awaited_ids(top_dir, pool):
+    """Return the ids of the commands queued commands are waiting for."""
+    _, queued = lib.read_queue(top_dir, pool)
+    return set(idx for _, data, _ in queued for idx in data.get("after", []))
+
+
+def is_awaited(line, awaited):
+    try:
+        return json.loads(line)["id"] in awaited
+    except (ValueError, KeyError, TypeError):
+        return False
+
+
+def compact(top_dir, pool, max_size):
+    """Keep the most recent half of the history when it exceeds max_size.
+
+    The older entries of the commands still awaited are kept too.
+    """
+    path = get_history_path(top_dir, pool)
+    try:
+        if not max_size or os.path.getsize(path) <= max_size:
+            return False
+    except FileNotFoundError:
+        return False
+    locks = get_lock(top_dir, pool)
+    locks.lock()
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+        half = len(lines) // 2
+        awaited = get_awaited_ids(top_dir, pool)
+        kept = [line for line in lines[:half] if awaited and is_awaited(line, awaited)]
+        tmpfile = path + ".tmp"
+        with open(tmpfile, "w") as f:
+            f.writelines(kept + lines[half:])
+        os.rename(tmpfile, path)
+    finally:
+        locks.unlock()
+    log.info("Compacted history of pool %s" % pool)
+    return True
+
+
+def add_duration(durations, entry):
+    """Add the duration of a history entry to the last durations."""
+    if not entry.get("started_at") or not entry.get("ended_at"):
+        return
+    # the duration of a preempted run is not the one of the command
+    if "preempted_by" in entry:
+        return
+    duration = entry["ended_at"] - entry["started_at"]
+    runs = durations["fingerprints"]
+    # the most recently run fingerprints last
+    last = runs.pop(entry["fingerprint"], [])
+    runs[entry["fingerprint"]] = (last + [duration])[-LAST_RUNS:]
+    while len(runs) > MAX_FINGERPRINTS:
+        del runs[next(iter(runs))]
+    durations["recent"] = (durations["recent"] + [duration])[-LAST_POOL_RUNS:]
+
+
+def build_durations(top_dir, pool):
+    """Return the last durations computed from the whole history."""
+    durations = {"fingerprints": {}, "recent": []}
+    for entry in read(top_dir, pool):
+        add_duration(durations, entry)
+    return durations
+
+
+def load_durations(top_dir, pool):
+    """Return the last durations of the pool or None if not computed yet."""
+    try:
+        with open(get_durations_path(top_dir, pool)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_durations(top_dir, pool, durations):
+    path = get_durations_path(top_dir, pool)
+    with open(path + ".tmp", "w") as f:
+        json.dump(durations, f)
+    os.rename(path + ".tmp", path)
+
+
+def get_estimates(top_dir, pool):
+    """Return the expected durations: {fingerprint: seconds, None: default}."""
+    durations = load_durations(top_dir, pool)
+    if durations is None:
+        # history recorded before the durations file
+        locks = get_lock(top_dir, pool)
+        locks.lock()
+        try:
+            durations = build_durations(top_dir, pool)
+            save_durations(top_dir, pool, durations)
+        finally:
+            locks.unlock()
+    estimates = {
+        fingerprint: sum(runs) / len(runs)
+        for fingerprint, runs in durations["fingerprints"].items()
+    }
+    recent = sorted(durations["recent"])
+    estimates[None] = recent[len(recent) // 2] if recent else None
+    return estimates
+
+
+def estimate_duration(estimates, data):
+    """Return the expected duration of a command in seconds or None."""
+    return estimates.get(lib.get_fingerprint(data), estimates.get(None))
+
+
+def estimate_start_times(queued, executing, resources, config, estimates, now=None):
+    """Return {id: (estimated start, estimated duration)} for the queued commands.
+
+    The running commands end after their expected duration and the queued
+    ones are started in the order of the scheduling policy as soon as
+    enough resources of the pool are free. Extra pools are ignored. The
+    start time is None when a duration before it is unknown.
+    """
+    if now is None:
+        now = time.time()
+    # time at which each resource of the pool is free, None if unknown
+    held = sum(data.get("num_resources", 1) for _, data, _ in executing)
+    slots = [now] * max(resources - held, 0)
+    for _, data, _ in executing:
+        duration = estimate_duration(estimates, data)
+        if duration is None:
+            slots.append(None)
+        else:
+            slots.append(max(data.get("started_at", now) + duration, now))
+        slots.extend([slots[-1]] * (data.get("num_resources", 1) - 1))
+    heap = [(slot is None, slot or 0) for slot in slots]
+    heapq.heapify(heap)
+
+    eta = {}
+    ordered = scheduling.sort_commands(queued, executing, config, now, estimates)
+    for idx, data, _ in ordered:
+        duration = estimate_duration(estimates, data)
+        num = data.get("num_resources", 1)
+        if len(heap) < num:
+            eta[idx] = (None, duration)
+            continue
+        taken = [heapq.heappop(heap) for _ in range(num)]
+        unknown = any(t[0] for t in taken)
+        start = None if unknown else max(t[1] for t in taken)
+        eta[idx] = (start, duration)
+        for _ in range(num):
+            if start is None or duration is None:
+                heapq.heappush(heap, (True, 0))
+            else:
+                heapq.heappush(heap, (False, start + duration))
+    return eta
+
+
+def get_eta(top_dir, pool, now=None):
+    """Return {id: (estimated start, estimated duration)} for a pool."""
+    if now is None:
+        now = time.time()
+    resources = os.listdir(os.path.join(top_dir, "pool", pool))
+    executing, queued = lib.read_queue(top_dir, pool)
+    return estimate_start_times(
+        queued,
+        executing,
+        len(resources),
+        lib.get_config(top_dir, pool),
+        get_estimates(top_dir, pool),
+        now,
+    )
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    if seconds < 60:
+        return "%ds" % seconds
+    if seconds < 3600:
+        return "%dm" % (seconds // 60)
+    return "%dh%02dm" % (seconds // 3600, seconds % 3600 // 60)
+
+
+def format_eta(start, duration, now):
+    """Return a human readable estimation like: start in 1h05m, duration 45m."""
+    return "start in %s, duration %s" % (
+        format_duration(None if start is None else max(start - now, 0)),
+        format_duration(duration),
+    )
+
+
+# history.py ends here
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2022, 2025 Red Hat, Inc
+# Copyright (C) 2020-2022, 2025-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -15,18 +15,39 @@
 
 """ """
 
+import argparse
 import fcntl
+import gzip
+import hashlib
 import json
 import logging
 import os
+import re
+import select
+import shlex
+import signal
+import subprocess
 import sys
+import threading
 import time
 
 log = logging.getLogger(__name__)
 
-DIRS = ("pool", "queue", "available", "log", "reason")
+DIRS = ("pool", "queue", "available", "log", "reason", "config")
+EXEC_EXT = ".exec"
 CRONTAB_LINE_FMT = "  *  *  *  *  *         dci-queue%s run %s"
 CRONTAB_CLEAN_LINE_FMT = "  @reboot               dci-queue%s clean %s"
+PROC_DIR = "/proc"
+# the fcntl locks belong to the process and closing any descriptor of a
+# lock file drops them: the threads of a process (dci-queue serve) take
+# a thread lock per lock file before the file lock
+THREAD_LOCKS = {}
+THREAD_LOCKS_GUARD = threading.Lock()
+
+
+def get_thread_lock(lckfile):
+    with THREAD_LOCKS_GUARD:
+        return THREAD_LOCKS.setdefault(lckfile, threading.RLock())
 
 
 class Seq(object):
@@ -37,6 +58,8 @@ class Seq(object):
         return os.path.exists(self.seqfile)
 
     def lock(self):
+        self.thread_lock = get_thread_lock(self.seqfile + ".lck")
+        self.thread_lock.acquire()
         self.lock_fd = open(self.seqfile + ".lck", "w")
         while True:
             try:
@@ -49,6 +72,7 @@ class Seq(object):
     def unlock(self):
         fcntl.lockf(self.lock_fd, fcntl.LOCK_UN)
         self.lock_fd.close()
+        self.thread_lock.release()
 
     def get(self):
         with open(self.seqfile) as f:
@@ -62,6 +86,52 @@ class Seq(object):
         log.debug("Updated seq file %s to %d, %d" % (self.seqfile, first, next))
 
 
+class PoolLock(object):
+    """Exclusive locks on a set of pools, stored in config/<pool>/<lckname>.
+
+    The locks are always taken in the order of the pool names so that
+    runners locking overlapping sets of pools cannot deadlock.
+    """
+
+    def __init__(self, top_dir, pools, lckname):
+        self.lckfiles = [
+            os.path.join(top_dir, "config", pool, lckname)
+            for pool in sorted(set(pools))
+        ]
+        self.lock_fds = []
+
+    def lock(self):
+        for lckfile in self.lckfiles:
+            thread_lock = get_thread_lock(lckfile)
+            thread_lock.acquire()
+            os.makedirs(os.path.dirname(lckfile), exist_ok=True)
+            lock_fd = open(lckfile, "w")
+            fcntl.lockf(lock_fd, fcntl.LOCK_EX)
+            self.lock_fds.append((lock_fd, thread_lock))
+
+    def unlock(self):
+        for lock_fd, thread_lock in reversed(self.lock_fds):
+            fcntl.lockf(lock_fd, fcntl.LOCK_UN)
+            lock_fd.close()
+            thread_lock.release()
+        self.lock_fds = []
+
+
+class BookingLock(PoolLock):
+    """Exclusive booking locks on a set of pools."""
+
+    def __init__(self, top_dir, pools):
+        super(BookingLock, self).__init__(top_dir, pools, ".book.lck")
+
+
+class HostLock(PoolLock):
+    """Exclusive lock shared by the runners of all the pools of the host."""
+
+    def __init__(self, top_dir):
+        self.lckfiles = [os.path.join(top_dir, "config", ".host.lck")]
+        self.lock_fds = []
+
+
 def get_seq(args):
     seq_obj = Seq(args)
     seq_obj.lock()
@@ -81,4 +151,493 @@ def check_pool(top_dir, pool):
     return True
 
 
+def read_queue(top_dir, pool):
+    """Read all the command files of a pool in a single directory pass.
+
+    Return 2 lists of (id, data, mtime) tuples: the commands being
+    executed and the queued commands.
+    """
+    executing = []
+    queued = []
+    for entry in os.scandir(os.path.join(top_dir, "queue", pool)):
+        name = entry.name
+        if name.endswith(EXEC_EXT):
+            name = name[: -len(EXEC_EXT)]
+            target = executing
+        else:
+            target = queued
+        if not name.isdigit():
+            continue
+        try:
+            with open(entry.path) as f:
+                data = json.load(f)
+            mtime = entry.stat().st_mtime
+        except (FileNotFoundError, ValueError):
+            # the command has been moved or is being written
+            continue
+        target.append((int(name), data, mtime))
+    return executing, queued
+
+
+# fields of a command set when it is started
+RUN_FIELDS = (
+    "pid",
+    "pgid",
+    "started_at",
+    "ready_at",
+    "real_cmd",
+    "resource",
+    "jobid",
+    "booked",
+    "affinity",
+    "lease",
+    "pid_start",
+    "runner_pid",
+    "runner_start",
+    "preemption",
+)
+
+
+def requeue_command(top_dir, pool, idx, fields, counter):
+    """Put a running command back in the queue at its position.
+
+    fields are added to the queued command and its counter field is
+    incremented. Return the data of the running command or None.
+    """
+    seq = Seq(argparse.Namespace(top_dir=top_dir, pool=pool))
+    execfile = os.path.join(top_dir, "queue", pool, str(idx) + EXEC_EXT)
+    seq.lock()
+    try:
+        try:
+            with open(execfile) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        queued = {k: v for k, v in data.items() if k not in RUN_FIELDS}
+        queued.update(fields)
+        queued[counter] = data.get(counter, 0) + 1
+        with open(execfile, "w") as f:
+            json.dump(queued, f)
+        os.rename(execfile, os.path.join(top_dir, "queue", pool, str(idx)))
+    finally:
+        seq.unlock()
+    return data
+
+
+def call_hook(cmd, pool, env, timeout, *args):
+    """Call a hook returning (return code, output).
+
+    The return code is None when the hook cannot be started or does not
+    finish in timeout seconds.
+    """
+    hook_env = dict(os.environ)
+    hook_env.update(env)
+    hook_env["DCI_QUEUE"] = pool
+    log.info("Calling hook %s %s" % (cmd, " ".join(args)))
+    try:
+        proc = subprocess.run(
+            shlex.split(cmd) + list(args),
+            env=hook_env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            timeout=timeout or None,
+        )
+    except subprocess.TimeoutExpired as excp:
+        output = excp.output or ""
+        if isinstance(output, bytes):
+            output = output.decode("utf-8", errors="replace")
+        return None, "timeout after %ds: %s" % (timeout, output)
+    except OSError as excp:
+        return None, str(excp)
+    return proc.returncode, proc.stdout
+
+
+def wait_any(pids, timeout):
+    """Wait up to timeout seconds for one of the processes to exit.
+
+    Return True if one did. A pidfd per process is used to be woken up as
+    soon as one exits, even if it is not a child of the caller. Without
+    pidfd support, the processes are polled.
+    """
+    pidfds = []
+    try:
+        for pid in pids:
+            try:
+                pidfds.append(os.pidfd_open(pid))
+            except ProcessLookupError:
+                return True
+            except (AttributeError, OSError):
+                break
+        else:
+            poller = select.poll()
+            for pidfd in pidfds:
+                poller.register(pidfd, select.POLLIN)
+            return poller.poll(max(timeout, 0) * 1000) != []
+    finally:
+        for pidfd in pidfds:
+            os.close(pidfd)
+    end = time.time() + timeout
+    while True:
+        for pid in pids:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return True
+        if time.time() >= end:
+            return False
+        time.sleep(0.1)
+
+
+def wait_process(pid, timeout):
+    """Wait up to timeout seconds for a process to exit. Return True if it did."""
+    return wait_any([pid], timeout)
+
+
+def get_start_time(pid):
+    """Return the start time of a process in clock ticks since boot, or None.
+
+    With the pid, it identifies a process even when its pid is reused.
+    """
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "stat")) as f:
+            stat = f.read()
+    except OSError:
+        return None
+    try:
+        # the process name in parentheses can contain spaces
+        return int(stat[stat.rindex(")") + 2 :].split()[19])
+    except (ValueError, IndexError):
+        return None
+
+
+def process_alive(pid, start_time=None):
+    """Return True if the process pid runs and was started at start_time.
+
+    Without start time, or without /proc, only the pid is checked.
+    """
+    if start_time is not None and os.path.isdir(PROC_DIR):
+        return get_start_time(pid) == start_time
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def group_exists(pgid):
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def group_alive(pgid, start_time=None):
+    """Return True if the group of a command started at start_time has processes.
+
+    The pid of a group leader cannot be reused while its group exists: a
+    group with this id and a leader started at another time is another
+    group.
+    """
+    if not group_exists(pgid):
+        return False
+    leader_start = get_start_time(pgid)
+    return start_time is None or leader_start is None or leader_start == start_time
+
+
+def get_group_pids(pgid):
+    """Return the pids of the running processes of a group or None without /proc.
+
+    The zombies, dead but not yet reaped by their parent, are ignored.
+    """
+    try:
+        names = os.listdir(PROC_DIR)
+    except OSError:
+        return None
+    pids = []
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(PROC_DIR, name, "stat")) as f:
+                stat = f.read()
+            # the process name in parentheses can contain spaces
+            fields = stat[stat.rindex(")") + 2 :].split()
+            if int(fields[2]) == pgid and fields[0] != "Z":
+                pids.append(int(name))
+        except (OSError, ValueError, IndexError):
+            continue
+    return pids
+
+
+def wait_group(pgid, timeout):
+    """Wait up to timeout seconds for all the processes of a group to exit.
+
+    The processes of the group are waited for with wait_any and the group
+    is scanned again each time one of them exits. Without /proc, the group
+    is polled.
+    """
+    end = time.time() + timeout
+    while True:
+        pids = get_group_pids(pgid)
+        if pids is None:
+            if not group_exists(pgid):
+                return True
+            if time.time() >= end:
+                return False
+            time.sleep(0.1)
+            continue
+        if not pids:
+            return True
+        if time.time() >= end:
+            return False
+        wait_any(pids, end - time.time())
+
+
+def terminate_group(pgid, grace_period):
+    """Stop all the processes of a group, killing them after grace_period seconds.
+
+    Return True when the group is gone.
+    """
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(pgid, sig)
+        except ProcessLookupError:
+            return True
+        log.info("Sent signal %d to the leftover processes of group %d" % (sig, pgid))
+        if wait_group(pgid, grace_period):
+            return True
+        log.warning("Group %d still running after %ds" % (pgid, grace_period))
+    return False
+
+
+def terminate_command(data, grace_period):
+    """Stop a running command, killing it after grace_period seconds.
+
+    Commands are started in their own process group (pgid in data) and
+    the whole group is signaled so that no child keeps using the
+    resources. Return True when the command is stopped.
+    """
+    pid = data["pid"]
+    pgid = data.get("pgid")
+    sig_func = os.killpg if pgid else os.kill
+    target = pgid or pid
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        log.info(
+            "Sending signal %d to %s %d" % (sig, "group" if pgid else "process", target)
+        )
+        try:
+            sig_func(target, sig)
+        except ProcessLookupError:
+            return True
+        start = time.time()
+        if wait_process(pid, grace_period):
+            if not pgid or wait_group(pgid, grace_period - (time.time() - start)):
+                return True
+        log.warning("Process %d still running after %ds" % (pid, grace_period))
+    return False
+
+
+def get_fingerprint(data):
+    """Return a hash identifying a command by its command line and directory."""
+    return hashlib.sha1(
+        json.dumps([data["cmd"], data["wd"]]).encode("utf-8")
+    ).hexdigest()
+
+
+def get_jobs_file(top_dir, pool, idx):
+    """Path of the JSON lines index of the DCI jobs written by dci-pipeline."""
+    return os.path.join(top_dir, "log", pool, "%s.jobs" % idx)
+
+
+def read_jobs_file(path):
+    """Return {job id: {"name": ..., "status": ...}} in scheduling order.
+
+    The file is append-only: the last status of a job wins. It can be
+    compressed with gzip once the command is finished.
+    """
+    jobs = {}
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            job = jobs.setdefault(data["job_id"], {})
+            job["name"] = data.get("name")
+            job["status"] = data.get("status")
+    return jobs
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("true", "yes", "on", "1"):
+        return True
+    if str(value).lower() in ("false", "no", "off", "0"):
+        return False
+    raise ValueError("invalid boolean value: %s" % value)
+
+
+_SIZE_RE = re.compile(r"^\s*(\d+)\s*([kmgt]?)b?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_size(value):
+    """Convert a size like 500M or 10G into a number of bytes."""
+    if isinstance(value, int):
+        return value
+    m = _SIZE_RE.match(str(value))
+    if not m:
+        raise ValueError("invalid size: %s" % value)
+    return int(m.group(1)) * _SIZE_UNITS[m.group(2).lower()]
+
+
+def one_of(*choices):
+    """Return a conversion function accepting only the given values."""
+
+    def convert(value):
+        if value not in choices:
+            raise ValueError("%s is not one of %s" % (value, ", ".join(choices)))
+        return value
+
+    return convert
+
+
+def parse_weights(value):
+    """Convert a string like alice=2,bob=1 into a {name: weight} dict."""
+    if isinstance(value, dict):
+        return value
+    weights = {}
+    for item in str(value).split(","):
+        if not item.strip():
+            continue
+        name, sep, weight = item.rpartition("=")
+        if not sep or not name.strip():
+            raise ValueError("invalid weight: %s" % item)
+        weights[name.strip()] = float(weight)
+        if weights[name.strip()] <= 0:
+            raise ValueError("weight must be positive: %s" % item)
+    return weights
+
+
+# name: (conversion function, default value)
+CONFIG_KEYS = {
+    "log-compress": (to_bool, False),
+    "log-max-size": (parse_size, 0),
+    "log-max-age": (int, 0),
+    "scheduling-policy": (
+        one_of("strict", "aging", "fair-share", "shortest-job-first"),
+        "strict",
+    ),
+    "aging-interval": (int, 3600),
+    "fair-share-key": (one_of("user", "wd"), "user"),
+    "fair-share-weights": (parse_weights, {}),
+    "backfill-max-wait": (int, 3600),
+    "affinity": (to_bool, False),
+    "affinity-max-wait": (int, 600),
+    "history-max-size": (parse_size, 10 * 1024**2),
+    "metrics": (to_bool, False),
+    "metrics-dir": (str, ""),
+    "scale-up-cmd": (str, ""),
+    "scale-up-queue-depth": (int, 0),
+    "scale-down-cmd": (str, ""),
+    "scale-down-idle-time": (int, 0),
+    "scale-cooldown": (int, 600),
+    "scale-min-size": (int, 0),
+    "scale-max-size": (int, 0),
+    "scale-timeout": (int, 600),
+    "health-check-cmd": (str, ""),
+    "health-check-timeout": (int, 300),
+    "kill-grace-period": (int, 300),
+    "preemption-priority": (int, 0),
+    "max-running": (int, 0),
+    "host-max-running": (int, 0),
+    "host-max-load": (float, 0.0),
+    "host-min-memory": (parse_size, 0),
+}
+
+# settings of the whole host, shared by all the pools
+HOST_CONFIG_KEYS = ("host-max-running", "host-max-load", "host-min-memory")
+
+
+def get_pool_capacity(top_dir, pool, config=None):
+    """Return the maximum number of resources of a pool or None if unbounded.
+
+    A pool with a scale-up hook can grow up to scale-max-size resources.
+    """
+    if config is None:
+        config = get_config(top_dir, pool)
+    try:
+        size = len(os.listdir(os.path.join(top_dir, "pool", pool)))
+    except FileNotFoundError:
+        size = 0
+    if config["scale-up-cmd"]:
+        if not config["scale-max-size"]:
+            return None
+        return max(size, config["scale-max-size"])
+    return size
+
+
+def get_config_path(top_dir, pool):
+    return os.path.join(top_dir, "config", pool, "config.json")
+
+
+def get_host_config_path(top_dir):
+    return os.path.join(top_dir, "config", "host.json")
+
+
+def load_config_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def get_config(top_dir, pool):
+    """Return the configuration of a pool merged with the default values.
+
+    The HOST_CONFIG_KEYS settings come from the host configuration.
+    """
+    config = {key: default for key, (_, default) in CONFIG_KEYS.items()}
+    for key, value in load_config_file(get_config_path(top_dir, pool)).items():
+        if key not in HOST_CONFIG_KEYS:
+            config[key] = value
+    for key, value in load_config_file(get_host_config_path(top_dir)).items():
+        if key in HOST_CONFIG_KEYS:
+            config[key] = value
+    return config
+
+
+def set_config(top_dir, pool, key, value):
+    """Store a configuration value for a pool. A None value resets the key.
+
+    The HOST_CONFIG_KEYS settings are stored for all the pools in the host
+    configuration.
+    """
+    if key in HOST_CONFIG_KEYS:
+        path = get_host_config_path(top_dir)
+    else:
+        path = get_config_path(top_dir, pool)
+    config = load_config_file(path)
+    if value is None:
+        config.pop(key, None)
+    else:
+        config[key] = CONFIG_KEYS[key][0](value)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmpfile = path + ".tmp"
+    with open(tmpfile, "w") as f:
+        json.dump(config, f)
+    os.rename(tmpfile, path)
+    log.debug("Updated config file %s: %s" % (path, config))
+    return config
+
+
 # lib.py ends here
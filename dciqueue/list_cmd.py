@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -19,9 +19,9 @@ import json
 import logging
 import os
 import sys
+import time
 
-from dciqueue import lib
-from dciqueue.run_cmd import EXT
+from dciqueue import affinity, history, lib, scheduling
 
 log = logging.getLogger(__name__)
 
@@ -32,6 +32,12 @@ def register_command(subparsers):
     parser = subparsers.add_parser(
         COMMAND, help="List the commands scheduled on a pool of resources"
     )
+    parser.add_argument(
+        "-j",
+        "--json",
+        action="store_true",
+        help="Output the pool state in JSON",
+    )
     parser.add_argument("pool", help="Name of the pool", nargs="?", default=None)
     return COMMAND
 
@@ -39,113 +45,195 @@ def register_command(subparsers):
 def execute_command(args):
     if args.pool is None:
         d = os.path.join(args.top_dir, "pool")
-        if os.path.exists(d):
-            p = os.listdir(d)
-            if len(p) == 0:
-                print("No pool was found on the host.")
-            else:
-                print("The following pools were found:")
-                for pool in p:
-                    print("  " + pool)
-                print(
-                    "Run the command below for the list of commands scheduled on your target pool:"
-                )
-                print("  " + sys.argv[0] + " list <pool>")
+        p = os.listdir(d) if os.path.exists(d) else []
+        if args.json:
+            json.dump({"pools": sorted(p)}, sys.stdout)
+            sys.stdout.write("\n")
+        elif len(p) == 0:
+            print("No pool was found on the host.")
+        else:
+            print("The following pools were found:")
+            for pool in p:
+                print("  " + pool)
+            print(
+                "Run the command below for the list of commands scheduled on your target pool:"
+            )
+            print("  " + sys.argv[0] + " list <pool>")
         return 0
 
     if not lib.check_pool(args.top_dir, args.pool):
         return 1
 
-    first, next = lib.get_seq(args)
+    state = get_pool_state(args.top_dir, args.pool)
+
+    if args.json:
+        json.dump(state, sys.stdout)
+        sys.stdout.write("\n")
+        return 0
+
+    display_state(state)
+    return 0
+
 
+def display_state(state):
+    """Print the state of a pool returned by get_pool_state."""
+    pool = state["pool"]
+    print("Resources on the %s pool: %s" % (pool, " ".join(state["resources"])))
     print(
-        "Resources on the %s pool: %s"
-        % (
-            args.pool,
-            " ".join(os.listdir(os.path.join(args.top_dir, "pool", args.pool))),
-        )
+        "Available resources on the %s pool: %s" % (pool, " ".join(state["available"]))
     )
 
-    print(
-        "Available resources on the %s pool: %s"
-        % (
-            args.pool,
-            " ".join(os.listdir(os.path.join(args.top_dir, "available", args.pool))),
+    if state["removed"] != []:
+        print("Removed resources on the %s pool:" % pool)
+        for d in state["removed"]:
+            print(" %s: %s [%s]" % (d["resource"], d["reason"], d["date"]))
+
+    print("Executing commands on the %s pool:" % pool)
+    for entry in state["executing"]:
+        display_cmd(entry)
+
+    print("Queued commands on the %s pool:" % pool)
+    for entry in state["queued"]:
+        display_cmd(entry)
+
+    if state["affinity"]:
+        print(
+            "Affinity on the %s pool: %s"
+            % (
+                pool,
+                ", ".join(
+                    "%d %s (avg %ds)" % (value["count"], outcome, value["average"])
+                    for outcome, value in sorted(state["affinity"].items())
+                ),
+            )
         )
-    )
 
-    reasondir = os.path.join(args.top_dir, "reason", args.pool)
+
+def get_pool_state(top_dir, pool):
+    """Collect the state of a pool reading each file only once."""
+    now = time.time()
+
+    removed = []
+    reasondir = os.path.join(top_dir, "reason", pool)
     if os.path.exists(reasondir):
-        reasons = []
-        for fname in os.listdir(reasondir):
-            reasonfile = os.path.join(reasondir, fname)
-            if os.path.exists(reasonfile):
-                with open(reasonfile) as f:
-                    data = json.load(f)
-                    reasons.append(data)
-        if reasons != []:
-            print("Removed resources on the %s pool:" % args.pool)
-            for d in reasons:
-                print(" %s: %s [%s]" % (d["resource"], d["reason"], d["date"]))
-
-    print("Executing commands on the %s pool:" % args.pool)
-    for path in [
-        p
-        for p in os.listdir(os.path.join(args.top_dir, "queue", args.pool))
-        if p.endswith(EXT)
-    ]:
-        display_cmd(args, path, EXT)
-
-    print("Queued commands on the %s pool:" % args.pool)
-    for fname in sorted(
-        range(first, next), key=lambda x: get_pri(args, x), reverse=True
-    ):
-        display_cmd(args, str(fname))
+        for entry in os.scandir(reasondir):
+            try:
+                with open(entry.path) as f:
+                    removed.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+
+    executing, queued = lib.read_queue(top_dir, pool)
+    resources = os.listdir(os.path.join(top_dir, "pool", pool))
+    config = lib.get_config(top_dir, pool)
+    estimates = history.get_estimates(top_dir, pool)
+    eta = history.estimate_start_times(
+        queued,
+        executing,
+        len(resources),
+        config,
+        estimates,
+        now,
+    )
 
-    return 0
+    return {
+        "pool": pool,
+        "resources": resources,
+        "available": os.listdir(os.path.join(top_dir, "available", pool)),
+        "removed": removed,
+        "executing": [
+            get_entry(idx, data, mtime, now, estimates)
+            for idx, data, mtime in sorted(executing)
+        ],
+        # in the order of the scheduling policy of the pool
+        "queued": [
+            get_entry(idx, data, mtime, now, estimates, eta)
+            for idx, data, mtime in scheduling.sort_commands(
+                queued, executing, config, now, estimates
+            )
+        ],
+        # number of commands and average duration per affinity outcome
+        "affinity": affinity.get_stats(top_dir, pool),
+    }
+
+
+def get_entry(idx, data, mtime, now, estimates=None, eta=None):
+    """Convert the content of a command file into a list entry.
+
+    Commands scheduled before the queued_at field was recorded are using
+    the modification time of their file. The estimations from the history
+    are None when unknown.
+    """
+    queued_at = data.get("queued_at", mtime)
+    started_at = data.get("started_at")
+    entry = {
+        "id": idx,
+        "priority": data.get("priority", 0),
+        "cmd": data.get("real_cmd", data["cmd"]),
+        "wd": data["wd"],
+        "remove": data.get("remove", False),
+        "extra_pools": data.get("extra_pools", []),
+        "num_resources": data.get("num_resources", 1),
+        "resources": get_resources(data),
+        "queued_at": queued_at,
+    }
+    if started_at:
+        entry["started_at"] = started_at
+        entry["wait"] = started_at - queued_at
+        entry["duration"] = now - started_at
+    else:
+        entry["wait"] = now - queued_at
+    if estimates is not None:
+        entry["estimated_duration"] = history.estimate_duration(estimates, data)
+    if eta is not None and idx in eta:
+        entry["estimated_start"] = eta[idx][0]
+    if data.get("after"):
+        entry["after"] = data["after"]
+        entry["after_success"] = data.get("after_success", False)
+    if "user" in data:
+        entry["user"] = data["user"]
+    if "pid" in data:
+        entry["pid"] = data["pid"]
+    if "lease" in data:
+        entry["host"] = data["lease"]["host"]
+    return entry
 
 
 def get_resources(data):
     """Get the resources from the data."""
     res = [res for res, pool in data.get("booked", [])]
-    if res is []:
-        res = [data.get("resource", "unknown")]
+    if res == [] and "resource" in data:
+        res = [data["resource"]]
     return res
 
 
-def display_cmd(args, filename, ext=None):
-    cmdfile = os.path.join(args.top_dir, "queue", args.pool, filename)
-    if os.path.exists(cmdfile):
-        with open(cmdfile) as f:
-            data = json.load(f)
-            if "real_cmd" in data:
-                cmd = data["real_cmd"]
-            else:
-                cmd = data["cmd"]
-            print(
-                " %s%s%s: %s (wd: %s)%s"
-                % (
-                    filename[: -len(ext)] if ext else filename,
-                    (
-                        "(p%d)" % data["priority"]
-                        if "priority" in data and data["priority"] > 0
-                        else ""
-                    ),
-                    " [%s]" % ",".join(get_resources(data)),
-                    " ".join(cmd),
-                    data["wd"],
-                    " [REMOVE]" if "remove" in data and data["remove"] else "",
-                )
-            )
-
-
-def get_pri(args, filename):
-    cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(filename))
-    if os.path.exists(cmdfile):
-        with open(cmdfile) as f:
-            data = json.load(f)
-            return data["priority"] if "priority" in data else 0
-    return 0
+def display_cmd(entry):
+    eta = ""
+    if "estimated_start" in entry:
+        eta = " [%s]" % history.format_eta(
+            entry["estimated_start"], entry["estimated_duration"], time.time()
+        )
+    after = ""
+    if "after" in entry:
+        after = " [AFTER%s %s]" % (
+            "-SUCCESS" if entry["after_success"] else "",
+            ",".join(str(idx) for idx in entry["after"]),
+        )
+    print(
+        " %s%s%s%s: %s (wd: %s)%s%s%s%s"
+        % (
+            entry["id"],
+            "(p%d)" % entry["priority"] if entry["priority"] > 0 else "",
+            "(n%d)" % entry["num_resources"] if entry["num_resources"] > 1 else "",
+            " [%s]" % ",".join(entry["resources"]),
+            " ".join(entry["cmd"]),
+            entry["wd"],
+            " [REMOVE]" if entry["remove"] else "",
+            " [HOST %s]" % entry["host"] if "host" in entry else "",
+            after,
+            eta,
+        )
+    )
 
 
-# list_pool_cmd.py ends here
+# list_cmd.py ends here
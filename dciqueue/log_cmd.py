@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -15,12 +15,13 @@
 
 """ """
 
+import collections
 import logging
 import os
 import sys
 import time
 
-from dciqueue import lib
+from dciqueue import lib, retention
 
 log = logging.getLogger(__name__)
 
@@ -47,16 +48,35 @@ def execute_command(args):
     if not lib.check_pool(args.top_dir, args.pool):
         return 1
 
-    logfile = os.path.join(args.top_dir, "log", args.pool, args.id)
-    if not os.path.exists(logfile):
+    logfile = retention.get_log_path(args.top_dir, args.pool, args.id)
+    if not logfile:
         cmdfile = os.path.join(args.top_dir, "queue", args.pool, args.id)
         if not os.path.exists(cmdfile):
+            evicted = retention.get_evicted(args.top_dir, args.pool, args.id)
+            if evicted:
+                sys.stderr.write(
+                    "Log %s was evicted on %s (%s budget)\n"
+                    % (args.id, evicted["date"], evicted["reason"])
+                )
+                return 1
+            logfile = os.path.join(args.top_dir, "log", args.pool, args.id)
             sys.stderr.write(("No such file %s\n" % logfile))
             log.error("No such file %s" % logfile)
             return 1
         sys.stderr.write(("Waiting for command %s to start...\n" % args.id))
-        while not os.path.exists(logfile):
+        while not logfile:
             time.sleep(1)
+            logfile = retention.get_log_path(args.top_dir, args.pool, args.id)
+
+    # compressed logs are from finished commands: no need to follow them
+    if retention.is_compressed(logfile):
+        if args.follow or args.lines:
+            return display_compressed_log(logfile, args.lines or "10")
+        cmd = "zless"
+        log.debug("Executing %s %s" % (cmd, logfile))
+        os.execlp(cmd, cmd, logfile)
+        log.error("Should not go here")
+        return 1
 
     if args.follow or args.lines:
         cmd = "tail"
@@ -76,4 +96,18 @@ def execute_command(args):
     return 1
 
 
-# add_resource_cmd.py ends here
+def display_compressed_log(logfile, lines):
+    """Output the last N lines (or from line N with +N) of a compressed log."""
+    with retention.open_log(logfile) as f:
+        if lines.startswith("+"):
+            start = int(lines[1:])
+            for num, line in enumerate(f, 1):
+                if num >= start:
+                    sys.stdout.write(line)
+        else:
+            for line in collections.deque(f, maxlen=int(lines)):
+                sys.stdout.write(line)
+    return 0
+
+
+# log_cmd.py ends here
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Per-pool metrics in the Prometheus textfile format.
+
+The counters and histograms are kept in config/<pool>/metrics.json and
+the textfile dci_queue_<pool>.prom is rewritten, with the current
+gauges, each time an event is published. It can be exposed by the
+textfile collector of the node exporter using the metrics-dir setting
+of the pool.
+"""
+
+import json
+import logging
+import os
+import time
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+METRICS_FILE = "metrics.json"
+METRICS_LOCK = ".metrics.lck"
+# upper bounds in seconds of the histogram buckets
+DURATION_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400)
+LATENCY_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 3600)
+HISTOGRAMS = {
+    "wait_seconds": (
+        "Time spent by the commands in the queue before starting",
+        DURATION_BUCKETS,
+    ),
+    "run_seconds": ("Duration of the commands", DURATION_BUCKETS),
+    "dispatch_latency_seconds": (
+        "Time between a resource being free and a waiting command starting on it",
+        LATENCY_BUCKETS,
+    ),
+}
+
+
+def get_state_path(top_dir, pool):
+    return os.path.join(top_dir, "config", pool, METRICS_FILE)
+
+
+def get_textfile_path(top_dir, pool, config):
+    metrics_dir = config.get("metrics-dir") or os.path.join(top_dir, "metrics")
+    return os.path.join(metrics_dir, "dci_queue_%s.prom" % pool)
+
+
+def load(top_dir, pool):
+    try:
+        with open(get_state_path(top_dir, pool)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = {}
+    state.setdefault("histograms", {})
+    state.setdefault("counters", {})
+    return state
+
+
+def observe(state, name, value):
+    """Add a value to a histogram of the state."""
+    buckets = HISTOGRAMS[name][1]
+    histogram = state["histograms"].setdefault(
+        name, {"buckets": [0] * len(buckets), "sum": 0, "count": 0}
+    )
+    for pos, bound in enumerate(buckets):
+        if value <= bound:
+            histogram["buckets"][pos] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+
+def count(state, name, label):
+    counter = state["counters"].setdefault(name, {})
+    counter[label] = counter.get(label, 0) + 1
+
+
+def get_gauges(top_dir, pool):
+    """Return the current values of the gauges of the pool."""
+    executing, queued = lib.read_queue(top_dir, pool)
+    resources = os.listdir(os.path.join(top_dir, "pool", pool))
+    available = os.listdir(os.path.join(top_dir, "available", pool))
+    reason_dir = os.path.join(top_dir, "reason", pool)
+    removed = os.listdir(reason_dir) if os.path.exists(reason_dir) else []
+    return {
+        "queue_depth": len(queued),
+        "executing": len(executing),
+        "free": len(available),
+        "busy": len([res for res in resources if res not in available]),
+        "removed": len(removed),
+    }
+
+
+def format_textfile(pool, state, gauges):
+    labels = 'pool="%s"' % pool
+    lines = [
+        "# HELP dci_queue_queue_depth Number of queued commands",
+        "# TYPE dci_queue_queue_depth gauge",
+        "dci_queue_queue_depth{%s} %d" % (labels, gauges["queue_depth"]),
+        "# HELP dci_queue_executing Number of running commands",
+        "# TYPE dci_queue_executing gauge",
+        "dci_queue_executing{%s} %d" % (labels, gauges["executing"]),
+        "# HELP dci_queue_resources Number of resources per state",
+        "# TYPE dci_queue_resources gauge",
+    ]
+    for res_state in ("busy", "free", "removed"):
+        lines.append(
+            'dci_queue_resources{%s,state="%s"} %d'
+            % (labels, res_state, gauges[res_state])
+        )
+    lines += [
+        "# HELP dci_queue_commands_total Number of finished commands per result",
+        "# TYPE dci_queue_commands_total counter",
+    ]
+    for result, value in sorted(state["counters"].get("commands", {}).items()):
+        lines.append(
+            'dci_queue_commands_total{%s,result="%s"} %d' % (labels, result, value)
+        )
+    for name, (description, buckets) in sorted(HISTOGRAMS.items()):
+        histogram = state["histograms"].get(
+            name, {"buckets": [0] * len(buckets), "sum": 0, "count": 0}
+        )
+        lines += [
+            "# HELP dci_queue_%s %s" % (name, description),
+            "# TYPE dci_queue_%s histogram" % name,
+        ]
+        for bound, value in zip(buckets, histogram["buckets"]):
+            lines.append(
+                'dci_queue_%s_bucket{%s,le="%s"} %d' % (name, labels, bound, value)
+            )
+        lines += [
+            'dci_queue_%s_bucket{%s,le="+Inf"} %d' % (name, labels, histogram["count"]),
+            "dci_queue_%s_sum{%s} %s" % (name, labels, histogram["sum"]),
+            "dci_queue_%s_count{%s} %d" % (name, labels, histogram["count"]),
+        ]
+    lines.append("# HELP dci_queue_last_update_seconds Time of the last update")
+    lines.append("# TYPE dci_queue_last_update_seconds gauge")
+    lines.append("dci_queue_last_update_seconds{%s} %d" % (labels, time.time()))
+    return "\n".join(lines) + "\n"
+
+
+def update(top_dir, pool, wait=None, run=None, latency=None, result=None):
+    """Record the observations of an event and rewrite the textfile."""
+    config = lib.get_config(top_dir, pool)
+    if not config["metrics"]:
+        return None
+    # the queue is scanned outside of the lock, never held while booking
+    gauges = get_gauges(top_dir, pool)
+    locks = lib.PoolLock(top_dir, [pool], METRICS_LOCK)
+    locks.lock()
+    try:
+        state = load(top_dir, pool)
+        for name, value in (
+            ("wait_seconds", wait),
+            ("run_seconds", run),
+            ("dispatch_latency_seconds", latency),
+        ):
+            if value is not None:
+                observe(state, name, max(value, 0))
+        if result is not None:
+            count(state, "commands", result)
+        path = get_state_path(top_dir, pool)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.rename(path + ".tmp", path)
+
+        textfile = get_textfile_path(top_dir, pool, config)
+        os.makedirs(os.path.dirname(textfile), exist_ok=True)
+        # the textfile collector must never read a partial file
+        with open(textfile + ".tmp", "w") as f:
+            f.write(format_textfile(pool, state, gauges))
+        os.rename(textfile + ".tmp", textfile)
+    finally:
+        locks.unlock()
+    return textfile
+
+
+def publish(top_dir, pool, **observations):
+    """Update the metrics of a pool never failing the caller."""
+    try:
+        return update(top_dir, pool, **observations)
+    except Exception:
+        log.exception("Unable to update the metrics of pool %s" % pool)
+        return None
+
+
+def remove(top_dir, pool, config):
+    try:
+        os.unlink(get_textfile_path(top_dir, pool, config))
+    except FileNotFoundError:
+        pass
+
+
+# metrics.py ends here
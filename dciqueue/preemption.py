@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Preemption of running commands by urgent ones.
+
+When the preemption-priority setting of a pool is set, a queued command
+with at least this priority that cannot get resources signals the
+running commands with the lowest priority below the threshold and
+returns without waiting for them. The preemption is recorded in the
+preemption field of their running file.
+
+The runner of a preempted command puts it back in the queue with its
+original id, so at its original position, when it exits and records the
+preemption in the history. The resources are given back at the same
+time and the urgent command starts at the next run. A preempted command
+still running after kill-grace-period seconds is killed.
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+
+def is_urgent(config, data):
+    threshold = config["preemption-priority"]
+    return bool(threshold) and data.get("priority", 0) >= threshold
+
+
+def select_victims(config, executing, data, needed, now):
+    """Return the running commands to stop to get needed resources of the pool.
+
+    The lowest priority commands are selected first and, for the same
+    priority, the most recently started to lose the least work. Commands
+    started after now, by the current dispatch, are not preempted. The
+    resources of the commands already being preempted are counted as
+    freed.
+    """
+    for _, cmd, _ in executing:
+        if "preemption" in cmd:
+            needed -= cmd.get("num_resources", 1)
+    if needed <= 0:
+        return []
+    candidates = [
+        (idx, cmd)
+        for idx, cmd, _ in executing
+        if "pid" in cmd
+        and "preemption" not in cmd
+        and cmd.get("started_at", now) < now
+        and not cmd.get("remove")
+        and cmd.get("priority", 0) < config["preemption-priority"]
+        and cmd.get("priority", 0) < data.get("priority", 0)
+    ]
+    candidates.sort(key=lambda c: (c[1].get("priority", 0), -c[1].get("started_at", 0)))
+    victims = []
+    for idx, cmd in candidates:
+        if needed <= 0:
+            break
+        victims.append((idx, cmd))
+        needed -= cmd.get("num_resources", 1)
+    return victims if needed <= 0 else []
+
+
+def send_signal(data, sig):
+    """Signal the process group of a running command, or its process."""
+    pgid = data.get("pgid")
+    log.info(
+        "Sending signal %d to %s %d"
+        % (sig, "group" if pgid else "process", pgid or data["pid"])
+    )
+    try:
+        if pgid:
+            os.killpg(pgid, sig)
+        else:
+            os.kill(data["pid"], sig)
+    except ProcessLookupError:
+        pass
+
+
+def mark_preempted(top_dir, pool, idx, preemption):
+    """Record the preemption in the running file of a command.
+
+    Return the data of the command or None if it is not running anymore.
+    """
+    seq = lib.Seq(argparse.Namespace(top_dir=top_dir, pool=pool))
+    execfile = os.path.join(top_dir, "queue", pool, str(idx) + lib.EXEC_EXT)
+    seq.lock()
+    try:
+        try:
+            with open(execfile) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        data["preemption"] = preemption
+        with open(execfile + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.rename(execfile + ".tmp", execfile)
+    finally:
+        seq.unlock()
+    return data
+
+
+def preempt(top_dir, pool, config, idx, data, needed, now):
+    """Signal running commands to free needed resources of the pool for idx.
+
+    The preempted commands still running after kill-grace-period seconds
+    are killed. Return the ids of the newly preempted commands.
+    """
+    executing, _ = lib.read_queue(top_dir, pool)
+    for victim, cmd, _ in executing:
+        preemption = cmd.get("preemption")
+        if preemption and now - preemption["at"] > config["kill-grace-period"]:
+            log.warning("Preempted command %d still running, killing it" % victim)
+            send_signal(cmd, signal.SIGKILL)
+    victims = select_victims(config, executing, data, needed, now)
+    if not victims:
+        log.debug("No command to preempt for command %d" % idx)
+        return []
+    preempted = []
+    for victim, _ in victims:
+        victim_data = mark_preempted(top_dir, pool, victim, {"by": idx, "at": now})
+        if victim_data is None:
+            continue
+        log.info(
+            "Preempting command %d (priority %d) for command %d (priority %d)"
+            % (victim, victim_data.get("priority", 0), idx, data.get("priority", 0))
+        )
+        send_signal(victim_data, signal.SIGTERM)
+        preempted.append(victim)
+    return preempted
+
+
+def get_preemptor(top_dir, pool, idx, pid):
+    """Return the id of the command which preempted the process pid, or None."""
+    path = os.path.join(top_dir, "queue", pool, str(idx) + lib.EXEC_EXT)
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if data.get("pid") == pid and "preemption" in data:
+        return data["preemption"]["by"]
+    return None
+
+
+def requeue(top_dir, pool, idx, preempted_by):
+    """Put a preempted command back in the queue. Return its data or None."""
+    return lib.requeue_command(
+        top_dir, pool, idx, {"preempted_by": preempted_by}, "preemptions"
+    )
+
+
+# preemption.py ends here
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import json
+import logging
+import os
+import sys
+import time
+
+from dciqueue import client, dependencies, list_cmd, schedule_cmd, server
+
+log = logging.getLogger(__name__)
+
+COMMAND = "remote"
+
+DEFAULT_URL = "http://127.0.0.1:%d" % server.DEFAULT_PORT
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(COMMAND, help="Use the pools of a dci-queue server")
+    parser.add_argument(
+        "-u",
+        "--url",
+        help="URL of the dci-queue server",
+        default=os.getenv("DCI_QUEUE_SERVER", DEFAULT_URL),
+    )
+    actions = parser.add_subparsers(title="Actions", dest="action")
+    schedule = actions.add_parser("schedule", help="Schedule a command on a pool")
+    schedule.add_argument("-p", "--priority", type=int, default=0)
+    schedule.add_argument("-n", "--num-resources", type=int, default=1)
+    schedule.add_argument("-f", "--force", action="store_true")
+    schedule.add_argument("-e", "--extra-pool", action="append", default=[])
+    schedule.add_argument("--after", type=dependencies.parse_ids, default=[])
+    schedule.add_argument("--after-success", action="store_true")
+    schedule.add_argument("pool", help="Name of the pool")
+    schedule.add_argument("cmd", nargs="+")
+    run = actions.add_parser("run", help="Run the commands of a pool on this host")
+    run.add_argument("pool", help="Name of the pool")
+    list_parser = actions.add_parser("list", help="List the commands of a pool")
+    list_parser.add_argument("-j", "--json", action="store_true")
+    list_parser.add_argument("pool", help="Name of the pool", nargs="?")
+    log_parser = actions.add_parser("log", help="Display the output of a command")
+    log_parser.add_argument(
+        "-f", "--follow", action="store_true", help="Follow the output"
+    )
+    log_parser.add_argument("pool", help="Name of the pool")
+    log_parser.add_argument("id", type=int, help="Command id")
+    return COMMAND
+
+
+def execute_command(args):
+    if not args.action:
+        sys.stderr.write("No action: schedule, run, list or log\n")
+        return 1
+    queue_client = client.Client(args.url, os.getenv("DCI_QUEUE_TOKEN"))
+    try:
+        return globals()["execute_" + args.action](queue_client, args)
+    except client.ClientError as excp:
+        sys.stderr.write("%s\n" % excp)
+    except OSError as excp:
+        sys.stderr.write("Unable to reach %s: %s\n" % (args.url, excp))
+    return 1
+
+
+def execute_schedule(queue_client, args):
+    entry = {
+        "cmd": args.cmd,
+        "wd": os.getcwd(),
+        "user": schedule_cmd.get_user(),
+        "priority": args.priority,
+        "num_resources": args.num_resources,
+        "extra_pools": args.extra_pool,
+        "after": args.after,
+        "after_success": args.after_success,
+        "force": args.force,
+    }
+    for idx in queue_client.schedule(args.pool, [entry]):
+        print(idx)
+    return 0
+
+
+def execute_run(queue_client, args):
+    results = client.run(queue_client, args.pool)
+    log.info("Commands run from pool %s: %s" % (args.pool, results))
+    return 0
+
+
+def execute_list(queue_client, args):
+    if args.pool is None:
+        state = {"pools": queue_client.list_pools()}
+    else:
+        state = queue_client.get_pool_state(args.pool)
+    if args.json:
+        json.dump(state, sys.stdout)
+        sys.stdout.write("\n")
+    elif args.pool is None:
+        for pool in state["pools"]:
+            print(pool)
+    else:
+        list_cmd.display_state(state)
+    return 0
+
+
+def execute_log(queue_client, args):
+    offset = 0
+    while True:
+        content, offset, running = queue_client.read_log(args.pool, args.id, offset)
+        sys.stdout.buffer.write(content)
+        sys.stdout.flush()
+        if content:
+            # the server sends the log by chunks
+            continue
+        if not args.follow or not running:
+            return 0
+        time.sleep(1)
+
+
+# remote_cmd.py ends here
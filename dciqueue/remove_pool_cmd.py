@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2021 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -19,7 +19,7 @@ import logging
 import os
 import shutil
 
-from dciqueue import lib, uninstall_cmd
+from dciqueue import lib, metrics, uninstall_cmd
 
 log = logging.getLogger(__name__)
 
@@ -42,6 +42,7 @@ def execute_command(args):
     if not args.no_uninstall:
         uninstall_cmd.execute_command(args)
 
+    metrics.remove(args.top_dir, args.pool, lib.get_config(args.top_dir, args.pool))
     for key in lib.DIRS:
         d = os.path.join(args.top_dir, key, args.pool)
         log.debug(" Removing %s" % d)
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -23,7 +23,7 @@ import os
 import subprocess
 import sys
 
-from dciqueue import lib
+from dciqueue import lib, metrics
 
 log = logging.getLogger(__name__)
 
@@ -80,6 +80,7 @@ def execute_command(args):
         # the blocked resources (reason directory), then finish the execution
         if os.path.exists(path):
             os.unlink(path)
+        metrics.publish(args.top_dir, args.pool)
         return 0
 
     # if we're not forcing the removal of the resource, just move it to the
@@ -105,6 +106,7 @@ def execute_command(args):
             f,
         )
 
+    metrics.publish(args.top_dir, args.pool)
     return 0
 
 
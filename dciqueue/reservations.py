@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Resources of a pool reserved by the blocked commands of all the pools.
+
+A command blocked for more than backfill-max-wait seconds reserves its
+resources in its main and extra pools. The reservations are stored in
+config/<pool>/reservations.json, keyed by <pool of the command>:<id>,
+so that the runners of every pool honour them, including the runners
+booking the pool as an extra pool of their own commands.
+
+A reservation is dropped as soon as its command leaves the queue, or
+when it has not been refreshed by the runner of its pool for
+RESERVATION_TTL seconds.
+"""
+
+import json
+import logging
+import os
+import time
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+RESERVATIONS_FILE = "reservations.json"
+RESERVATIONS_LOCK = ".reservations.lck"
+RESERVATION_TTL = 600
+
+
+def get_path(top_dir, pool):
+    return os.path.join(top_dir, "config", pool, RESERVATIONS_FILE)
+
+
+def load(top_dir, pool):
+    try:
+        with open(get_path(top_dir, pool)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def is_valid(top_dir, key, entry, now):
+    """Return True if the command of a reservation is still queued."""
+    owner, _, idx = key.rpartition(":")
+    if now - entry.get("at", 0) > RESERVATION_TTL:
+        return False
+    return os.path.exists(os.path.join(top_dir, "queue", owner, idx))
+
+
+def reserve(top_dir, owner, idx, needed, now=None):
+    """Store the reservation of command idx of pool owner in the needed pools.
+
+    needed is a {pool: number of resources} dict.
+    """
+    if now is None:
+        now = time.time()
+    key = "%s:%d" % (owner, idx)
+    for pool, num in needed.items():
+        path = get_path(top_dir, pool)
+        locks = lib.PoolLock(top_dir, [pool], RESERVATIONS_LOCK)
+        locks.lock()
+        try:
+            state = {
+                k: entry
+                for k, entry in load(top_dir, pool).items()
+                if is_valid(top_dir, k, entry, now)
+            }
+            state[key] = {"num": num, "at": now}
+            tmpfile = path + ".tmp"
+            with open(tmpfile, "w") as f:
+                json.dump(state, f)
+            os.rename(tmpfile, path)
+        finally:
+            locks.unlock()
+
+
+def get_reserved(top_dir, pool, exclude_owner=None, now=None):
+    """Return the number of resources of a pool reserved by queued commands.
+
+    The reservations of the commands of exclude_owner are not counted.
+    """
+    if now is None:
+        now = time.time()
+    reserved = 0
+    for key, entry in load(top_dir, pool).items():
+        if key.rpartition(":")[0] == exclude_owner:
+            continue
+        if is_valid(top_dir, key, entry, now):
+            reserved += entry["num"]
+    return reserved
+
+
+# reservations.py ends here
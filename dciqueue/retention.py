@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Compression and retention of the job logs stored under log/<pool>.
+
+The <id>.jobs index written by dci-pipeline next to a log follows it: it
+is compressed and evicted at the same time.
+"""
+
+import datetime
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+
+log = logging.getLogger(__name__)
+
+COMPRESSED_EXT = ".gz"
+JOBS_EXT = ".jobs"
+EVICTED_INDEX = ".evicted"
+
+
+def get_log_dir(top_dir, pool):
+    return os.path.join(top_dir, "log", pool)
+
+
+def get_log_path(top_dir, pool, idx, ext=""):
+    """Return the path of the log of a job, compressed or not, or None."""
+    path = os.path.join(get_log_dir(top_dir, pool), str(idx) + ext)
+    if os.path.exists(path):
+        return path
+    if os.path.exists(path + COMPRESSED_EXT):
+        return path + COMPRESSED_EXT
+    return None
+
+
+def get_jobs_path(top_dir, pool, idx):
+    """Return the path of the jobs index of a job, compressed or not, or None."""
+    return get_log_path(top_dir, pool, idx, JOBS_EXT)
+
+
+def get_job_files(top_dir, pool, idx):
+    """Return the existing log and jobs index files of a job."""
+    return [
+        path
+        for path in (
+            get_log_path(top_dir, pool, idx),
+            get_jobs_path(top_dir, pool, idx),
+        )
+        if path
+    ]
+
+
+def is_compressed(path):
+    return path.endswith(COMPRESSED_EXT)
+
+
+def open_log(path):
+    """Open a log in text mode, decompressing it on the fly if needed."""
+    if is_compressed(path):
+        return gzip.open(path, "rt", errors="replace")
+    return open(path, errors="replace")
+
+
+def compress_file(path):
+    """Compress a file keeping its modification time."""
+    if not os.path.exists(path):
+        return None
+    tmpfile = path + COMPRESSED_EXT + ".tmp"
+    stat = os.stat(path)
+    with open(path, "rb") as src, gzip.open(tmpfile, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.utime(tmpfile, (stat.st_atime, stat.st_mtime))
+    os.rename(tmpfile, path + COMPRESSED_EXT)
+    os.unlink(path)
+    log.debug("Compressed %s" % path)
+    return path + COMPRESSED_EXT
+
+
+def compress_log(top_dir, pool, idx):
+    """Compress the log and the jobs index of a finished job.
+
+    Return the path of the compressed log, or of the compressed jobs index
+    when the log was already compressed, or None.
+    """
+    path = os.path.join(get_log_dir(top_dir, pool), str(idx))
+    compressed = compress_file(path)
+    return compress_file(path + JOBS_EXT) or compressed
+
+
+def list_logs(top_dir, pool):
+    """Return (mtime, size, idx, path) tuples for all the logs of a pool.
+
+    The size of a log includes the size of its jobs index. When a log is
+    gone but not its jobs index, path is the jobs index.
+    """
+    logs = {}
+    log_dir = get_log_dir(top_dir, pool)
+    for entry in os.scandir(log_dir):
+        idx = entry.name
+        if is_compressed(idx):
+            idx = idx[: -len(COMPRESSED_EXT)]
+        is_jobs = idx.endswith(JOBS_EXT)
+        if is_jobs:
+            idx = idx[: -len(JOBS_EXT)]
+        # skip the indexes and the temporary files
+        if not idx.isdigit():
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if idx not in logs:
+            logs[idx] = [stat.st_mtime, 0, idx, entry.path]
+        current = logs[idx]
+        current[0] = max(current[0], stat.st_mtime)
+        current[1] += stat.st_size
+        if not is_jobs:
+            current[3] = entry.path
+    return [tuple(current) for current in logs.values()]
+
+
+def compress_logs(top_dir, pool, running=()):
+    """Compress all the logs and jobs indexes of the finished jobs of a pool."""
+    compressed = []
+    for _, _, idx, _ in list_logs(top_dir, pool):
+        if idx in running:
+            continue
+        if compress_log(top_dir, pool, idx):
+            compressed.append(idx)
+    return compressed
+
+
+def record_eviction(top_dir, pool, idx, mtime, size, reason):
+    with open(os.path.join(get_log_dir(top_dir, pool), EVICTED_INDEX), "a") as f:
+        f.write(
+            json.dumps(
+                {
+                    "id": idx,
+                    "size": size,
+                    "mtime": str(datetime.datetime.fromtimestamp(mtime)),
+                    "date": str(datetime.datetime.now()),
+                    "reason": reason,
+                }
+            )
+            + "\n"
+        )
+
+
+def get_evicted(top_dir, pool, idx):
+    """Return the eviction record of a job log or None."""
+    path = os.path.join(get_log_dir(top_dir, pool), EVICTED_INDEX)
+    if not os.path.exists(path):
+        return None
+    found = None
+    with open(path) as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            if data.get("id") == str(idx):
+                found = data
+    return found
+
+
+def enforce_retention(top_dir, pool, config, running=()):
+    """Evict the oldest logs of finished jobs exceeding the age or size budgets.
+
+    Logs of running jobs are counted in the size budget but never evicted.
+    """
+    max_size = config.get("log-max-size", 0)
+    max_age = config.get("log-max-age", 0)
+    if not max_size and not max_age:
+        return []
+
+    logs = sorted(list_logs(top_dir, pool), key=lambda x: (x[0], int(x[2])))
+    total = sum(size for _, size, _, _ in logs)
+    limit = time.time() - max_age * 86400
+    evicted = []
+    for mtime, size, idx, path in logs:
+        if idx in running:
+            continue
+        if max_age and mtime < limit:
+            reason = "age"
+        elif max_size and total > max_size:
+            reason = "size"
+        else:
+            continue
+        removed = False
+        for path in get_job_files(top_dir, pool, idx):
+            try:
+                os.unlink(path)
+                removed = True
+            except FileNotFoundError:
+                pass
+        if not removed:
+            continue
+        log.info("Evicting log %s of pool %s (%s)" % (idx, pool, reason))
+        record_eviction(top_dir, pool, idx, mtime, size, reason)
+        total -= size
+        evicted.append(idx)
+    return evicted
+
+
+def rotate_logs(top_dir, pool, config, running=(), idx=None):
+    """Apply the log policy of a pool: compression then retention budgets.
+
+    When idx is given, only this log is compressed instead of scanning the
+    whole log directory for uncompressed logs.
+    """
+    if config.get("log-compress"):
+        if idx is not None:
+            if str(idx) not in running:
+                compress_log(top_dir, pool, idx)
+        else:
+            compress_logs(top_dir, pool, running)
+    return enforce_retention(top_dir, pool, config, running)
+
+
+# retention.py ends here
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import logging
+
+from dciqueue import lib, retention, run_cmd
+
+log = logging.getLogger(__name__)
+
+COMMAND = "rotate-logs"
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND,
+        help="Compress the logs of finished commands and apply the retention budgets of a pool",
+    )
+    parser.add_argument("pool", help="Name of the pool")
+    return COMMAND
+
+
+def execute_command(args):
+    if not lib.check_pool(args.top_dir, args.pool):
+        return 1
+
+    config = lib.get_config(args.top_dir, args.pool)
+    running = run_cmd.get_running_ids(args.top_dir, args.pool)
+    if config["log-compress"]:
+        compressed = retention.compress_logs(args.top_dir, args.pool, running)
+        log.info("Compressed %d logs in pool %s" % (len(compressed), args.pool))
+    evicted = retention.enforce_retention(args.top_dir, args.pool, config, running)
+    log.info("Evicted %d logs in pool %s" % (len(evicted), args.pool))
+    return 0
+
+
+# rotate_logs_cmd.py ends here
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -15,13 +15,28 @@
 
 """ """
 
+import argparse
 import json
 import logging
 import os
 import subprocess
 import sys
-
-from dciqueue import lib
+import time
+
+from dciqueue import (
+    admission,
+    affinity,
+    autoscale,
+    dependencies,
+    history,
+    lib,
+    metrics,
+    preemption,
+    remove_resource_cmd,
+    reservations,
+    retention,
+    scheduling,
+)
 
 if sys.version_info[0] == 2:
     FileNotFoundError = OSError
@@ -30,8 +45,16 @@ log = logging.getLogger(__name__)
 
 COMMAND = "run"
 
-EXT = ".exec"
+EXT = lib.EXEC_EXT
 RET_CODE = {}
+# time after which a booked command not started by a runner is stale
+STALE_GRACE = 60
+# maximum number of resources removed by the health checks of a dispatch
+MAX_HEALTH_REMOVALS = 3
+
+
+class HealthCheckError(Exception):
+    pass
 
 
 def register_command(subparsers):
@@ -50,134 +73,18 @@ def execute_command(args):
     if not lib.check_pool(args.top_dir, args.pool):
         return 1
 
-    commands = []
-    skipped_jobs = set()  # Track jobs that have been skipped to avoid infinite loop
-
-    while True:
-        booked_resources = []
-
-        # First, peek at the next job to check resource requirements
-        to_exec, idx = peek_next_command(args)
-
-        if not to_exec:
-            log.debug("No command to run in pool %s" % args.pool)
-            break
-        else:
-            # Check if we've already skipped this job to avoid infinite loop
-            if idx in skipped_jobs:
-                log.debug("All remaining jobs have been skipped, breaking loop")
-                break
-
-            with open(to_exec) as f:
-                data = json.load(f)
-
-            log.debug("Checking command %s" % data)
-
-            # Check if extra resources are available BEFORE booking any resources
-            extra_resources_available = True
-            for pool in data["extra_pools"]:
-                if not has_available_resource(args.top_dir, pool):
-                    log.debug("No available resource in pool %s" % pool)
-                    extra_resources_available = False
-                    break
-
-            # If extra resources are not available, skip this job
-            if not extra_resources_available:
-                log.debug("Skipping job due to unavailable extra resources")
-                skipped_jobs.add(idx)
-                continue
-
-            # Now book the primary resource
-            res = book_resource(args.top_dir, args.pool)
-
-            if res is None:
-                log.debug("No available resource anymore in pool %s" % args.pool)
-                break
-            log.debug("Booked resource %s in pool %s" % (res, args.pool))
-            booked_resources.append((res, args.pool))
-
-            # Now consume the job from the queue
-            to_exec, idx = get_command(args)
-
-            # book extra resources if needed
-            extra_booking_failed = False
-            for pool in data["extra_pools"]:
-                extra_res = book_resource(args.top_dir, pool)
-                if extra_res is None:
-                    log.debug("No available resource anymore in pool %s" % pool)
-                    free_resources(booked_resources, args.top_dir)
-                    extra_booking_failed = True
-                    break
-                booked_resources.append((extra_res, pool))
-
-            # If extra resource booking failed, skip this job and continue to next
-            if extra_booking_failed:
-                log.debug("Skipping job due to failed extra resource booking")
-                continue
-
-            data["real_cmd"] = [c.replace("@RESOURCE", res) for c in data["cmd"]]
-            data["resource"] = res
-            data["jobid"] = idx
-            data["booked"] = booked_resources
-
-            if "remove" in data and data["remove"]:
-                log.info("Removing resource %s" % res)
-                path = os.path.join(args.top_dir, "pool", args.pool, res)
-                if os.path.exists(path):
-                    os.unlink(path)
+    clean_stale_commands(args.top_dir, args.pool)
 
-            with open(to_exec, "w") as f:
-                json.dump(data, f)
+    try:
+        autoscale.spawn(args.top_dir, args.pool)
+    except Exception:
+        log.exception("Unable to autoscale pool %s" % args.pool)
 
-            try:
-                log.info("Running command %s (wd: %s)" % (data["cmd"], data["wd"]))
-                os.chdir(data["wd"])
-                os.environ["DCI_QUEUE"] = args.pool
-                os.environ["DCI_QUEUE_RES"] = res
-                os.environ["DCI_QUEUE_ID"] = str(idx)
-                os.environ["DCI_QUEUE_JOBID"] = "%s.%d" % (args.pool, idx)
-                num = 1
-                for r, p in booked_resources:
-                    os.environ[f"DCI_QUEUE{num}"] = p
-                    os.environ[f"DCI_QUEUE_RES{num}"] = r
-                    num += 1
-                if not args.command_output:
-                    out_fd = open(
-                        os.path.join(args.top_dir, "log", args.pool, str(idx)), "w"
-                    )
-                    # log environment variables
-                    out_fd.write(f'+ DCI_QUEUE={os.environ["DCI_QUEUE"]}\n')
-                    out_fd.write(f'+ DCI_QUEUE_RES={os.environ["DCI_QUEUE_RES"]}\n')
-                    out_fd.write(f'+ DCI_QUEUE_ID={os.environ["DCI_QUEUE_ID"]}\n')
-                    out_fd.write(f'+ DCI_QUEUE_JOBID={os.environ["DCI_QUEUE_JOBID"]}\n')
-                    for env_idx in range(1, num):
-                        out_fd.write(
-                            f'+ DCI_QUEUE{env_idx}={os.environ[f"DCI_QUEUE{env_idx}"]}\n'
-                        )
-                        out_fd.write(
-                            f'+ DCI_QUEUE_RES{env_idx}={os.environ[f"DCI_QUEUE_RES{env_idx}"]}\n'
-                        )
-                    out_fd.write("+ cd " + data["wd"] + "\n")
-                    out_fd.write("+ " + " ".join(data["real_cmd"]) + "\n")
-                    out_fd.flush()
-                    proc = subprocess.Popen(
-                        data["real_cmd"], stdout=out_fd, stderr=out_fd
-                    )
-                else:
-                    out_fd = None
-                    proc = subprocess.Popen(data["real_cmd"])
-                if proc:
-                    data["pid"] = proc.pid
-                    commands.append(
-                        [booked_resources, proc, out_fd, data["real_cmd"], idx, to_exec]
-                    )
-                with open(to_exec, "w") as f:
-                    json.dump(data, f)
-            except Exception:
-                log.exception("Unable to execute command")
-                free_resources(booked_resources, args.top_dir)
-                log.debug("Removing %s" % to_exec)
-                os.remove(to_exec)
+    commands = []
+    for to_exec, idx, data, booked_resources in dispatch_commands(args):
+        cmd = launch_command(args, to_exec, idx, data, booked_resources)
+        if cmd:
+            commands.append(cmd)
 
     if commands != []:
         log.info("Waiting for commands: %s" % commands)
@@ -186,48 +93,652 @@ def execute_command(args):
         while number > 0:
             log.debug("Waiting %d commands" % number)
             status = os.wait()
-            for booked, proc, fd, cmd, idx, to_exec in commands:
+            for booked, proc, fd, data, idx, to_exec in commands:
                 if proc and proc.pid == status[0]:
                     number -= 1
                     break
             else:
                 continue
+            preempted_by = None
             if proc:
                 proc.wait()
                 if fd:
                     fd.close()
-                log.info("%s returned %d" % (cmd, os.WEXITSTATUS(status[1])))
-                RET_CODE[idx] = os.WEXITSTATUS(status[1])
-                log.debug("Removing %s" % to_exec)
-                try:
-                    os.remove(to_exec)
-                except FileNotFoundError:
-                    pass
-            if booked != [] and args:
-                free_resources(booked, args.top_dir)
+                if os.WIFSIGNALED(status[1]):
+                    # like the shells do for a process killed by a signal
+                    RET_CODE[idx] = 128 + os.WTERMSIG(status[1])
+                else:
+                    RET_CODE[idx] = os.WEXITSTATUS(status[1])
+                log.info("%s returned %d" % (data["real_cmd"], RET_CODE[idx]))
+                kill_leftovers(args.top_dir, args.pool, data)
+                preempted_by = preemption.get_preemptor(
+                    args.top_dir, args.pool, idx, proc.pid
+                )
+                if preempted_by is not None:
+                    log.info("Command %d preempted by command %d" % (idx, preempted_by))
+                    preemption.requeue(args.top_dir, args.pool, idx, preempted_by)
+                else:
+                    log.debug("Removing %s" % to_exec)
+                    try:
+                        os.remove(to_exec)
+                    except FileNotFoundError:
+                        pass
+            finish_command(args, idx, data, booked, RET_CODE.get(idx), preempted_by)
     return 0
 
 
-def book_resource(top_dir, pool):
-    """Book a resource from the pool.
+def finish_command(args, idx, data, booked, exit_code, preempted_by=None):
+    """Give back the resources of a finished command and record its run."""
+    if booked != []:
+        free_resources(booked, args.top_dir)
+    record_history(args.top_dir, args.pool, idx, data, exit_code, preempted_by)
+    if preempted_by is not None:
+        result = "preempted"
+    elif exit_code == 0:
+        result = "success"
+    else:
+        result = "failure"
+    metrics.publish(
+        args.top_dir,
+        args.pool,
+        run=time.time() - data["started_at"],
+        result=result,
+    )
+    if "affinity" in data and preempted_by is None:
+        affinity.record_outcome(
+            args.top_dir,
+            args.pool,
+            data["affinity"],
+            time.time() - data["started_at"],
+        )
+    if not args.command_output:
+        rotate_logs(args.top_dir, args.pool, idx)
+
+
+def kill_leftovers(top_dir, pool, data):
+    """Terminate the processes left by a command before freeing its resources.
+
+    The group is sent SIGTERM then, if some of its processes are still
+    running after kill-grace-period seconds, SIGKILL.
+    """
+    if not data.get("pgid"):
+        return
+    grace_period = lib.get_config(top_dir, pool)["kill-grace-period"]
+    if not lib.terminate_group(data["pgid"], grace_period):
+        log.error(
+            "Leftover processes of group %d still running, freeing %s anyway"
+            % (data["pgid"], ", ".join(res for res, _ in data.get("booked", [])))
+        )
+
+
+def is_stale(data, mtime, now):
+    """Return True if a running command is neither running nor tracked.
+
+    The processes are identified by their pid and start time so that a
+    reused pid does not keep a dead command alive. A command whose
+    runner is alive is left to its runner and a command booked without
+    runner for more than STALE_GRACE seconds is stale.
+    """
+    if "lease" in data:
+        # remote command, expired by the server with its lease
+        return False
+    if "runner_pid" in data and lib.process_alive(
+        data["runner_pid"], data.get("runner_start")
+    ):
+        return False
+    if "pid" in data:
+        return not lib.process_alive(data["pid"], data.get("pid_start"))
+    return "runner_pid" in data or now - mtime > STALE_GRACE
+
+
+def clean_stale_commands(top_dir, pool, now=None):
+    """Give back the resources of the commands left by dead runners.
 
-    Removing the first symlink from the available directory.
+    Return the ids of the stale commands.
     """
-    available_dir = os.path.join(top_dir, "available", pool)
-    resources = [
-        f
-        for f in os.listdir(available_dir)
-        if os.path.islink(os.path.join(available_dir, f))
-    ]
+    if now is None:
+        now = time.time()
+    executing, _ = lib.read_queue(top_dir, pool)
+    stale = []
+    for idx, data, mtime in executing:
+        if not is_stale(data, mtime, now):
+            continue
+        if "preemption" in data:
+            # the runner died before putting it back in the queue
+            if not preemption.requeue(top_dir, pool, idx, data["preemption"]["by"]):
+                continue
+        else:
+            try:
+                os.unlink(os.path.join(top_dir, "queue", pool, str(idx) + EXT))
+            except FileNotFoundError:
+                # already cleaned by another runner
+                continue
+        booked = data.get("booked")
+        if booked is None:
+            booked = [(data["resource"], pool)] if "resource" in data else []
+        log.warning(
+            "Stale command %d found in pool %s (pid %s), freeing %s"
+            % (idx, pool, data.get("pid"), ", ".join(res for res, _ in booked))
+        )
+        # the children of the command can outlive it but its group id
+        # may have been reused once they are all gone
+        if data.get("pgid") and lib.group_alive(data["pgid"], data.get("pid_start")):
+            kill_leftovers(top_dir, pool, data)
+        elif data.get("pgid"):
+            log.info(
+                "Group %d of command %d is gone, not signaling it" % (data["pgid"], idx)
+            )
+        free_resources(booked, top_dir)
+        stale.append(idx)
+    if stale:
+        metrics.publish(top_dir, pool)
+    return stale
+
+
+def dispatch_commands(args):
+    """Book the resources of all the queued commands that can run now.
+
+    The queue is walked in the order of the scheduling policy and every
+    command whose main and extra pools all have a free resource is
+    started (backfill). A command blocked for more than backfill-max-wait
+    seconds reserves its resources in each of its pools, up to their
+    size, so that the commands behind it cannot take them and it is not
+    starved. The reservations are shared with the runners of the other
+    pools (see reservations.py) and a command needing more resources than
+    a pool has reserves nothing.
+
+    With the affinity setting, a command waits up to affinity-max-wait
+    seconds for the resources used by its previous run. Commands waiting
+    for other commands (schedule --after) are not considered and no more
+    command is started once an admission limit of the host is reached.
+    For the server, args.remote_host is the state of the remote runner
+    claiming the commands, which the admission limits are checked
+    against (see admission.py). The health checks of the resources
+    still run on the local host.
+
+    Yield (to_exec, idx, data, booked_resources) for each booked command.
+    """
+    config = lib.get_config(args.top_dir, args.pool)
+    max_wait = config["backfill-max-wait"]
+    remote_host = getattr(args, "remote_host", None)
+    executing, queued = lib.read_queue(args.top_dir, args.pool)
+    queued = get_ready_commands(args.top_dir, args.pool, queued, executing)
+    now = time.time()
+    estimates = get_estimates(args.top_dir, args.pool, config)
+    available = {}
+    reserved = {}
+    shared = {}
+    capacities = {}
+    removed = []
+    affinity_state = (
+        affinity.load(args.top_dir, args.pool) if config["affinity"] else None
+    )
+
+    def get_capacity(pool):
+        if pool not in capacities:
+            capacities[pool] = lib.get_pool_capacity(args.top_dir, pool)
+        return capacities[pool]
+
+    def free_count(pool):
+        if pool not in available:
+            available[pool] = count_available_resources(args.top_dir, pool)
+            # reserved by the commands of the other pools
+            shared[pool] = reservations.get_reserved(args.top_dir, pool, args.pool, now)
+        total = reserved.get(pool, 0) + shared[pool]
+        if get_capacity(pool) is not None:
+            total = min(total, get_capacity(pool))
+        return available[pool] - total
+
+    for idx, data, mtime in scheduling.sort_commands(
+        queued, executing, config, now, estimates
+    ):
+        if free_count(args.pool) <= 0 and not config["preemption-priority"]:
+            log.debug("No available resource anymore in pool %s" % args.pool)
+            break
+        pools = [args.pool] * data.get("num_resources", 1) + data.get("extra_pools", [])
+        needed = {}
+        for pool in pools:
+            needed[pool] = needed.get(pool, 0) + 1
+        waited = now - data.get("queued_at", mtime)
+        preferred = []
+        if affinity_state is not None:
+            preferred = get_preferred_resources(
+                args.top_dir, args.pool, affinity_state, data
+            )
+            busy = [
+                res
+                for res in preferred
+                if not os.path.islink(
+                    os.path.join(args.top_dir, "available", args.pool, res)
+                )
+            ]
+            if busy and waited < config["affinity-max-wait"]:
+                log.debug("Command %d waiting for resources %s" % (idx, busy))
+                continue
+        if free_count(args.pool) < needed[args.pool] and preemption.is_urgent(
+            config, data
+        ):
+            if preemption.preempt(
+                args.top_dir,
+                args.pool,
+                config,
+                idx,
+                data,
+                needed[args.pool] - max(free_count(args.pool), 0),
+                now,
+            ):
+                available.clear()
+        if any(free_count(pool) < num for pool, num in needed.items()):
+            if max_wait and waited > max_wait:
+                if any(
+                    get_capacity(pool) is not None and num > get_capacity(pool)
+                    for pool, num in needed.items()
+                ):
+                    log.warning(
+                        "Command %d needs more resources than %s have, not"
+                        " reserving them" % (idx, ", ".join(needed))
+                    )
+                    continue
+                log.info(
+                    "Reserving resources in %s for command %d waiting for %ds"
+                    % (", ".join(needed), idx, waited)
+                )
+                for pool, num in needed.items():
+                    reserved[pool] = reserved.get(pool, 0) + num
+                reservations.reserve(args.top_dir, args.pool, idx, needed, now)
+            else:
+                log.debug("Skipping command %d, no resource in %s" % (idx, pools))
+            continue
 
-    for res in resources:
+        # cheap check before booking, done again under the host lock
+        reason = admission.check(args.top_dir, args.pool, config, remote_host)
+        if reason:
+            log.info("Not starting more commands on pool %s: %s" % (args.pool, reason))
+            break
+
+        freed = {}
         try:
-            filename = os.path.join(available_dir, res)
-            os.remove(filename)
-            log.debug("Removed symlink %s" % filename)
-            return res
-        except FileNotFoundError:
+            booked_resources = book_healthy_resources(
+                args.top_dir, pools, {args.pool: preferred}, freed, removed
+            )
+        except HealthCheckError as excp:
+            log.error("%s, not starting more commands" % excp)
+            break
+        if booked_resources is None and len(removed) >= MAX_HEALTH_REMOVALS:
+            log.error(
+                "%d resources removed by the health checks, not starting more"
+                " commands on pool %s" % (len(removed), args.pool)
+            )
+            break
+        if booked_resources is None:
+            # another runner took the resources, count them again
+            available.clear()
             continue
+
+        # the runners of all the pools check the limits and start their
+        # commands (counted as running once moved to .exec) one at a time
+        host_lock = lib.HostLock(args.top_dir)
+        host_lock.lock()
+        try:
+            reason = admission.check(args.top_dir, args.pool, config, remote_host)
+            if reason is None:
+                to_exec, idx = get_command(args, idx)
+            if reason is None and to_exec is not None and remote_host:
+                # counted as running on the remote host from now on
+                set_remote_host(to_exec, remote_host["name"])
+        finally:
+            host_lock.unlock()
+        if reason:
+            log.info(
+                "Not starting command %d on pool %s: %s" % (idx, args.pool, reason)
+            )
+            free_resources(booked_resources, args.top_dir)
+            break
+        if to_exec is None:
+            log.debug("Command %d already consumed" % idx)
+            free_resources(booked_resources, args.top_dir)
+            available.clear()
+            continue
+
+        for pool in pools:
+            available[pool] -= 1
+        with open(to_exec) as f:
+            data = json.load(f)
+        # the command starts when the last of its resources is free
+        data["ready_at"] = max([data.get("queued_at", mtime)] + list(freed.values()))
+        if affinity_state is not None:
+            record_affinity(args.top_dir, args.pool, data, preferred, booked_resources)
+        yield to_exec, idx, data, booked_resources
+
+
+def get_ready_commands(top_dir, pool, queued, executing):
+    """Return the queued commands whose predecessors are finished.
+
+    The commands whose predecessors had to succeed and did not are
+    removed from the queue.
+    """
+    ready, waiting, cancelled = dependencies.split_ready(
+        top_dir, pool, queued, executing
+    )
+    if waiting:
+        log.debug(
+            "Commands waiting for other commands: %s"
+            % ", ".join(str(idx) for idx, _, _ in waiting)
+        )
+    for idx, _, _ in cancelled:
+        try:
+            os.unlink(os.path.join(top_dir, "queue", pool, str(idx)))
+        except FileNotFoundError:
+            pass
+    if cancelled:
+        metrics.publish(top_dir, pool)
+    return ready
+
+
+def get_preferred_resources(top_dir, pool, affinity_state, data):
+    """Return the resources, still in the pool, used by the previous run."""
+    return [
+        res
+        for res in affinity.get_preferred(
+            affinity_state, affinity.get_affinity_key(data)
+        )
+        if os.path.exists(os.path.join(top_dir, "pool", pool, res))
+    ]
+
+
+def record_affinity(top_dir, pool, data, preferred, booked_resources):
+    """Store the resources of a command and if it got the preferred ones."""
+    resources = [res for res, p in booked_resources[: data.get("num_resources", 1)]]
+    if not preferred:
+        data["affinity"] = "new"
+    elif set(preferred) <= set(resources):
+        data["affinity"] = "hit"
+    else:
+        data["affinity"] = "miss"
+    log.debug("Affinity %s for command %s" % (data["affinity"], data["cmd"]))
+    affinity.record_resources(top_dir, pool, affinity.get_affinity_key(data), resources)
+
+
+def get_command_env(args, idx, booked_resources):
+    """Return the environment variables describing a booked command."""
+    env = {
+        "DCI_QUEUE": args.pool,
+        "DCI_QUEUE_RES": booked_resources[0][0],
+        "DCI_QUEUE_ID": str(idx),
+        "DCI_QUEUE_JOBID": "%s.%d" % (args.pool, idx),
+        "DCI_PIPELINE_JOBS_FILE": lib.get_jobs_file(args.top_dir, args.pool, idx),
+    }
+    for num, (r, p) in enumerate(booked_resources, 1):
+        env[f"DCI_QUEUE{num}"] = p
+        env[f"DCI_QUEUE_RES{num}"] = r
+    return env
+
+
+def launch_command(args, to_exec, idx, data, booked_resources):
+    """Start a booked command returning its tracking list or None."""
+    res = booked_resources[0][0]
+    data["real_cmd"] = [replace_resources(c, booked_resources) for c in data["cmd"]]
+    data["resource"] = res
+    data["jobid"] = idx
+    data["booked"] = booked_resources
+    data["runner_pid"] = os.getpid()
+    data["runner_start"] = lib.get_start_time(data["runner_pid"])
+
+    if "remove" in data and data["remove"]:
+        log.info("Removing resource %s" % res)
+        path = os.path.join(args.top_dir, "pool", args.pool, res)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    with open(to_exec, "w") as f:
+        json.dump(data, f)
+
+    try:
+        log.info("Running command %s (wd: %s)" % (data["cmd"], data["wd"]))
+        os.chdir(data["wd"])
+        os.environ.update(get_command_env(args, idx, booked_resources))
+        num = len(booked_resources) + 1
+        if not args.command_output:
+            out_fd = open(os.path.join(args.top_dir, "log", args.pool, str(idx)), "w")
+            # log environment variables
+            out_fd.write(f'+ DCI_QUEUE={os.environ["DCI_QUEUE"]}\n')
+            out_fd.write(f'+ DCI_QUEUE_RES={os.environ["DCI_QUEUE_RES"]}\n')
+            out_fd.write(f'+ DCI_QUEUE_ID={os.environ["DCI_QUEUE_ID"]}\n')
+            out_fd.write(f'+ DCI_QUEUE_JOBID={os.environ["DCI_QUEUE_JOBID"]}\n')
+            for env_idx in range(1, num):
+                out_fd.write(
+                    f'+ DCI_QUEUE{env_idx}={os.environ[f"DCI_QUEUE{env_idx}"]}\n'
+                )
+                out_fd.write(
+                    f'+ DCI_QUEUE_RES{env_idx}={os.environ[f"DCI_QUEUE_RES{env_idx}"]}\n'
+                )
+            out_fd.write("+ cd " + data["wd"] + "\n")
+            out_fd.write("+ " + " ".join(data["real_cmd"]) + "\n")
+            out_fd.flush()
+            # in its own session to be able to stop all its processes
+            proc = subprocess.Popen(
+                data["real_cmd"],
+                stdout=out_fd,
+                stderr=out_fd,
+                start_new_session=True,
+            )
+            data["pgid"] = proc.pid
+        else:
+            out_fd = None
+            # keep the terminal session to receive the keyboard signals
+            proc = subprocess.Popen(data["real_cmd"])
+        data["pid"] = proc.pid
+        data["pid_start"] = lib.get_start_time(proc.pid)
+        data["started_at"] = time.time()
+        with open(to_exec, "w") as f:
+            json.dump(data, f)
+        metrics.publish(
+            args.top_dir,
+            args.pool,
+            wait=data["started_at"] - data.get("queued_at", data["started_at"]),
+            latency=data["started_at"] - data.get("ready_at", data["started_at"]),
+        )
+        return [booked_resources, proc, out_fd, data, idx, to_exec]
+    except Exception:
+        log.exception("Unable to execute command")
+        free_resources(booked_resources, args.top_dir)
+        log.debug("Removing %s" % to_exec)
+        os.remove(to_exec)
+    return None
+
+
+def replace_resources(arg, booked_resources):
+    """Replace @RESOURCE1..N by the booked resources and @RESOURCE by the first."""
+    # from the highest number to not replace the start of @RESOURCE10
+    for num in range(len(booked_resources), 0, -1):
+        arg = arg.replace("@RESOURCE%d" % num, booked_resources[num - 1][0])
+    return arg.replace("@RESOURCE", booked_resources[0][0])
+
+
+def get_estimates(top_dir, pool, config):
+    """Return the expected durations when the scheduling policy needs them."""
+    if config["scheduling-policy"] != "shortest-job-first":
+        return None
+    return history.get_estimates(top_dir, pool)
+
+
+def record_history(top_dir, pool, idx, data, exit_code, preempted_by=None):
+    try:
+        history.record(top_dir, pool, idx, data, exit_code, preempted_by=preempted_by)
+        history.compact(
+            top_dir, pool, lib.get_config(top_dir, pool)["history-max-size"]
+        )
+    except Exception:
+        log.exception("Unable to record command %s in history of pool %s" % (idx, pool))
+
+
+def get_running_ids(top_dir, pool):
+    """Return the ids of the commands being executed in a pool."""
+    return set(
+        f[: -len(EXT)]
+        for f in os.listdir(os.path.join(top_dir, "queue", pool))
+        if f.endswith(EXT)
+    )
+
+
+def rotate_logs(top_dir, pool, idx=None):
+    try:
+        config = lib.get_config(top_dir, pool)
+        retention.rotate_logs(
+            top_dir, pool, config, get_running_ids(top_dir, pool), idx
+        )
+    except Exception:
+        log.exception("Unable to rotate logs of pool %s" % pool)
+
+
+def find_available_resources(top_dir, pool, num, preferred=()):
+    """Return up to num available resources of a pool, preferred ones first.
+
+    The directory is scanned lazily and without stat calls: the scan
+    stops as soon as enough resources are found.
+    """
+    available_dir = os.path.join(top_dir, "available", pool)
+    found = [
+        res for res in preferred if os.path.islink(os.path.join(available_dir, res))
+    ][:num]
+    if len(found) == num:
+        return found
+    with os.scandir(available_dir) as entries:
+        for entry in entries:
+            if entry.is_symlink() and entry.name not in found:
+                found.append(entry.name)
+                if len(found) == num:
+                    break
+    return found
+
+
+def book_resources(top_dir, pools, preferred=None, freed=None):
+    """Book one resource in each pool, all of them or none.
+
+    The booking locks of the pools are taken in a global order, then the
+    resources are selected and finally their symlinks are removed from
+    the available directories. Other runners never see a partial set.
+
+    preferred is an optional {pool: [resources]} dict of the resources to
+    book first when they are available. When the freed dict is given, it
+    is filled with the time each booked resource was made available.
+
+    Return the list of (resource, pool) booked or None.
+    """
+    preferred = preferred or {}
+    needed = {}
+    for pool in pools:
+        needed[pool] = needed.get(pool, 0) + 1
+
+    locks = lib.BookingLock(top_dir, needed)
+    locks.lock()
+    try:
+        candidates = {}
+        for pool, num in needed.items():
+            candidates[pool] = find_available_resources(
+                top_dir, pool, num, preferred.get(pool, ())
+            )
+            if len(candidates[pool]) < num:
+                log.debug("No available resource anymore in pool %s" % pool)
+                return None
+
+        booked_resources = []
+        for pool in pools:
+            res = candidates[pool].pop(0)
+            filename = os.path.join(top_dir, "available", pool, res)
+            try:
+                if freed is not None:
+                    freed[(res, pool)] = os.lstat(filename).st_mtime
+                os.remove(filename)
+            except FileNotFoundError:
+                # removed by remove-resource in the meantime
+                log.debug("Resource %s removed from pool %s" % (res, pool))
+                free_resources(booked_resources, top_dir)
+                return None
+            log.debug("Booked resource %s in pool %s" % (res, pool))
+            booked_resources.append((res, pool))
+        return booked_resources
+    finally:
+        locks.unlock()
+
+
+def check_resource(top_dir, pool, res, config):
+    """Run the health check hook of the pool on a booked resource.
+
+    Return None when the resource is healthy or the output of the check.
+    Raise HealthCheckError when the check cannot be run or times out.
+    """
+    if not config["health-check-cmd"]:
+        return None
+    ret, output = lib.call_hook(
+        config["health-check-cmd"],
+        pool,
+        {"DCI_QUEUE_RES": res},
+        config["health-check-timeout"],
+        res,
+    )
+    if ret is None:
+        raise HealthCheckError(
+            "Unable to check resource %s in pool %s: %s" % (res, pool, output)
+        )
+    if ret == 0:
+        return None
+    log.error(
+        "Health check of resource %s in pool %s failed (%d): %s"
+        % (res, pool, ret, output)
+    )
+    return output.strip() or "exit code %d" % ret
+
+
+def book_healthy_resources(top_dir, pools, preferred=None, freed=None, removed=None):
+    """Book the resources of a command and run their health checks.
+
+    The resources failing their check are removed from their pool with
+    the output of the check as reason, appended to the removed list, and
+    other resources are booked instead until MAX_HEALTH_REMOVALS
+    resources are removed. When a check cannot be run, the booked
+    resources are given back and HealthCheckError is raised. Return the
+    list of (resource, pool) booked or None.
+    """
+    configs = {}
+    if removed is None:
+        removed = []
+    while len(removed) < MAX_HEALTH_REMOVALS:
+        booked_resources = book_resources(top_dir, pools, preferred, freed)
+        if booked_resources is None:
+            return None
+        failed = []
+        try:
+            for res, pool in booked_resources:
+                if pool not in configs:
+                    configs[pool] = lib.get_config(top_dir, pool)
+                output = check_resource(top_dir, pool, res, configs[pool])
+                if output is not None:
+                    failed.append((res, pool, output))
+        except HealthCheckError:
+            free_resources(booked_resources, top_dir)
+            raise
+        if not failed:
+            return booked_resources
+        for res, pool, output in failed:
+            removed.append((res, pool))
+            remove_resource_cmd.execute_command(
+                argparse.Namespace(
+                    top_dir=top_dir,
+                    pool=pool,
+                    name=res,
+                    reason="health check failed: %s" % output[-500:],
+                    force=False,
+                )
+            )
+        free_resources(
+            [
+                (res, pool)
+                for res, pool in booked_resources
+                if (res, pool) not in [(r, p) for r, p, _ in failed]
+            ],
+            top_dir,
+        )
     return None
 
 
@@ -246,80 +757,47 @@ def free_resources(resources, top_dir):
         free_resource(r, top_dir, pool)
 
 
-def peek_next_command(args):
-    """Peek at the next command without consuming it from the queue."""
-    seq = lib.Seq(args)
+def count_available_resources(top_dir, pool):
+    """Return the number of available resources in the pool."""
+    available_dir = os.path.join(top_dir, "available", pool)
+    if not os.path.exists(available_dir):
+        return 0
 
-    seq.lock()
-    first, next = seq.get()
+    with os.scandir(available_dir) as entries:
+        return len([entry for entry in entries if entry.is_symlink()])
 
-    to_exec = None
-    index = None
-    pri = -1
-    # first pass to find the highest priority job
-    for idx in range(first, next):
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(idx))
-        if os.path.exists(cmdfile):
-            log.debug("getting priority for %s" % cmdfile)
-            with open(cmdfile) as cmdfd:
-                data = json.load(cmdfd)
-                priority = data["priority"] if "priority" in data else 0
-                if priority > pri:
-                    log.debug("top priority so far %s => %d" % (cmdfile, priority))
-                    index = idx
-                    pri = priority
-    if index is not None:
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(index))
-        to_exec = cmdfile  # Don't move the file, just return the path
 
-    seq.unlock()
-    log.debug("peek_next_command %s %s" % (to_exec, index))
-    return to_exec, index
+def set_remote_host(to_exec, host):
+    """Record the remote host running a command before its lease is set.
 
-
-def has_available_resource(top_dir, pool):
-    """Check if there's at least one available resource in the pool."""
-    available_dir = os.path.join(top_dir, "available", pool)
-    if not os.path.exists(available_dir):
-        return False
-
-    resources = [
-        f
-        for f in os.listdir(available_dir)
-        if os.path.islink(os.path.join(available_dir, f))
-    ]
-    return len(resources) > 0
+    The temporary lease expires after STALE_GRACE seconds if the server
+    does not replace it.
+    """
+    with open(to_exec) as f:
+        data = json.load(f)
+    data["lease"] = {"host": host, "expires": time.time() + STALE_GRACE}
+    with open(to_exec, "w") as f:
+        json.dump(data, f)
 
 
-def get_command(args):
-    """Get the next command to execute from the queue."""
+def get_command(args, index):
+    """Consume the queued command index selected by dispatch_commands."""
     seq = lib.Seq(args)
 
     seq.lock()
     first, next = seq.get()
 
     to_exec = None
-    index = None
-    pri = -1
-    # first pass to find the highest priority job
-    for idx in range(first, next):
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(idx))
-        if os.path.exists(cmdfile):
-            log.debug("getting priority for %s" % cmdfile)
-            with open(cmdfile) as cmdfd:
-                data = json.load(cmdfd)
-                priority = data["priority"] if "priority" in data else 0
-                if priority > pri:
-                    log.debug("top priority so far %s => %d" % (cmdfile, priority))
-                    index = idx
-                    pri = priority
-    if index is not None:
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(index))
-        movedfile = cmdfile + EXT
+    cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(index))
+    movedfile = cmdfile + EXT
+    try:
         os.rename(cmdfile, movedfile)
         to_exec = movedfile
         if index == first:
             seq.set(index + 1, next)
+    except FileNotFoundError:
+        # unscheduled or consumed by another runner in the meantime
+        index = None
 
     seq.unlock()
     log.debug("get_command %s %s" % (to_exec, index))
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -15,13 +15,15 @@
 
 """ """
 
+import getpass
 import json
 import logging
 import os
+import shlex
 import sys
 import time
 
-from dciqueue import lib, run_cmd
+from dciqueue import dependencies, history, lib, metrics, run_cmd
 
 if sys.version_info[0] == 2:
     FileNotFoundError = IOError
@@ -64,6 +66,35 @@ def register_command(subparsers):
         type=int,
         default=0,
     )
+    parser.add_argument(
+        "-n",
+        "--num-resources",
+        help="Number of resources to book in the pool (@RESOURCE1..N)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "-a",
+        "--affinity-key",
+        help="Key to reuse the resources of the previous run (pipeline name...)",
+        default=None,
+    )
+    parser.add_argument(
+        "--after",
+        help="Run after the commands with these ids (id[,id...]) are finished",
+        type=dependencies.parse_ids,
+        default=[],
+    )
+    parser.add_argument(
+        "--after-success",
+        action="store_true",
+        help="Cancel the command if one of the --after commands failed",
+    )
+    parser.add_argument(
+        "--from-file",
+        help="Queue the commands of a JSON lines file (- for stdin) and print their ids",
+        default=None,
+    )
     # add -e <pool> option to store multiple pools in the same command
     parser.add_argument("-e", "--extra-pool", action="append", default=[])
     parser.add_argument("pool", help="Name of the pool")
@@ -75,61 +106,20 @@ def execute_command(args):
     if not lib.check_pool(args.top_dir, args.pool):
         return 1
 
-    for c in args.cmd:
-        if "@RESOURCE" in c:
-            break
-    else:
-        sys.stderr.write("no @RESOURCE in command: %s\n" % " ".join(args.cmd))
-        return 1
-
-    seq_obj = lib.Seq(args)
-    seq_obj.lock()
-    first, idx = seq_obj.get()
-
-    found = False
-    if not args.force:
-        for cmdfile in [
-            p
-            for p in os.listdir(os.path.join(args.top_dir, "queue", args.pool))
-            if p not in (".seq", ".seq.lck")
-        ]:
-            try:
-                with open(
-                    os.path.join(args.top_dir, "queue", args.pool, cmdfile), "r"
-                ) as f:
-                    data = json.load(f)
-                if data["cmd"] == args.cmd and data["wd"] == os.getcwd():
-                    found = True
-                    break
-            except FileNotFoundError:
-                continue
+    if args.from_file:
+        return schedule_manifest(args)
 
-    if found:
-        log.info("Not scheduling a duplicated command")
-    else:
-        queuefile = os.path.join(args.top_dir, "queue", args.pool, str(idx))
-        cwd = os.getcwd()
-        # validate extra pools exist
-        for pool in args.extra_pool:
-            if not lib.check_pool(args.top_dir, pool):
-                log.error("Pool %s does not exist" % pool)
-                seq_obj.unlock()
-                return 1
-        with open(queuefile, "w") as f:
-            json.dump(
-                {
-                    "cmd": args.cmd,
-                    "wd": cwd,
-                    "remove": args.remove_resource,
-                    "priority": args.priority,
-                    "extra_pools": args.extra_pool,
-                },
-                f,
-            )
-        log.info("Command %s (wd: %s) queued as %s" % (args.cmd, cwd, queuefile))
-        seq_obj.set(first, idx + 1)
+    data = get_command_data(args, {})
+    error = validate(args.top_dir, args.pool, data)
+    if error:
+        sys.stderr.write(error + "\n")
+        return 1
 
-    seq_obj.unlock()
+    ids = queue_commands(args, [data])
+    if ids is None:
+        return 1
+    idx = ids[0]
+    queuefile = os.path.join(args.top_dir, "queue", args.pool, str(idx))
 
     if args.block:
         log.info("In block mode, running the queue from pool %s" % args.pool)
@@ -145,4 +135,168 @@ def execute_command(args):
     return 0
 
 
+def schedule_manifest(args):
+    """Queue all the commands of a JSON lines manifest and print their ids."""
+    if args.block or args.cmd:
+        sys.stderr.write("--from-file cannot be used with --block or a command\n")
+        return 1
+    try:
+        if args.from_file == "-":
+            lines = sys.stdin.readlines()
+        else:
+            with open(args.from_file) as f:
+                lines = f.readlines()
+    except OSError as excp:
+        sys.stderr.write("unable to read %s: %s\n" % (args.from_file, excp))
+        return 1
+    commands = []
+    for num, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            if not isinstance(entry, dict):
+                raise ValueError("not an object")
+            data = get_command_data(args, entry)
+        except ValueError as excp:
+            sys.stderr.write("%s:%d: invalid entry: %s\n" % (args.from_file, num, excp))
+            return 1
+        error = validate(args.top_dir, args.pool, data)
+        if error:
+            sys.stderr.write("%s:%d: %s\n" % (args.from_file, num, error))
+            return 1
+        commands.append(data)
+    ids = queue_commands(args, commands)
+    if ids is None:
+        return 1
+    for idx in ids:
+        print(idx)
+    return 0
+
+
+def get_command_data(args, entry):
+    """Return the queue data of a command, the options being the defaults."""
+    cmd = entry.get("cmd", args.cmd)
+    if isinstance(cmd, str):
+        cmd = shlex.split(cmd)
+    return {
+        "cmd": cmd,
+        "wd": entry.get("wd", os.getcwd()),
+        "remove": entry.get("remove", args.remove_resource),
+        "priority": int(entry.get("priority", args.priority)),
+        "extra_pools": entry.get("extra_pools", args.extra_pool),
+        "num_resources": int(entry.get("num_resources", args.num_resources)),
+        "affinity_key": entry.get("affinity_key", args.affinity_key),
+        "user": get_user(),
+        "after": [int(idx) for idx in entry.get("after", args.after)],
+        "after_success": entry.get("after_success", args.after_success),
+        "force": entry.get("force", args.force),
+    }
+
+
+def validate(top_dir, pool, data):
+    """Return why a command cannot be queued or None."""
+    for c in data["cmd"]:
+        if "@RESOURCE" in c:
+            break
+    else:
+        return "no @RESOURCE in command: %s" % " ".join(data["cmd"])
+
+    if data["num_resources"] < 1:
+        return "invalid number of resources: %d" % data["num_resources"]
+
+    if data["after_success"] and not data["after"]:
+        return "--after-success needs --after"
+
+    for extra_pool in data["extra_pools"]:
+        if not lib.check_pool(top_dir, extra_pool):
+            return "Pool %s does not exist" % extra_pool
+
+    # a command needing more resources than a pool has would block it
+    needed = {}
+    for name in [pool] * data["num_resources"] + data["extra_pools"]:
+        needed[name] = needed.get(name, 0) + 1
+    for name, num in needed.items():
+        capacity = lib.get_pool_capacity(top_dir, name)
+        if capacity is not None and num > capacity:
+            return "%d resources needed in pool %s which has %d" % (
+                num,
+                name,
+                capacity,
+            )
+    return None
+
+
+def queue_commands(args, commands):
+    """Queue the commands under a single lock. Return their ids or None.
+
+    The queue is scanned once for duplicated commands: the id of the
+    already queued command is returned for them. Nothing is queued if a
+    command depends on a command scheduled after it.
+    """
+    seq_obj = lib.Seq(args)
+    seq_obj.lock()
+    try:
+        first, idx = seq_obj.get()
+        executing, queued = lib.read_queue(args.top_dir, args.pool)
+        existing = {
+            (json.dumps(data["cmd"]), data["wd"]): cmd_id
+            for cmd_id, data, _ in executing + queued
+        }
+
+        ids = []
+        new_commands = []
+        for data in commands:
+            key = (json.dumps(data["cmd"]), data["wd"])
+            if not data.pop("force") and key in existing:
+                log.info("Not scheduling a duplicated command")
+                ids.append(existing[key])
+                continue
+            for after in data["after"]:
+                if after < 1 or after >= idx:
+                    sys.stderr.write("invalid command id in --after: %d\n" % after)
+                    return None
+            existing[key] = idx
+            ids.append(idx)
+            new_commands.append((idx, data))
+            idx += 1
+
+        for cmd_id, data in new_commands:
+            queuefile = os.path.join(args.top_dir, "queue", args.pool, str(cmd_id))
+            data["queued_at"] = time.time()
+            with open(queuefile, "w") as f:
+                json.dump(data, f)
+            log.info(
+                "Command %s (wd: %s) queued as %s"
+                % (data["cmd"], data["wd"], queuefile)
+            )
+        seq_obj.set(first, idx)
+    finally:
+        seq_obj.unlock()
+
+    if new_commands:
+        metrics.publish(args.top_dir, args.pool)
+        log_eta(args.top_dir, args.pool, new_commands[-1][0])
+    return ids
+
+
+def log_eta(top_dir, pool, idx):
+    """Log the estimated start time and duration of a queued command."""
+    try:
+        now = time.time()
+        eta = history.get_eta(top_dir, pool, now)
+        if idx in eta:
+            log.info("Command %d: %s" % (idx, history.format_eta(*eta[idx], now)))
+    except Exception:
+        log.exception("Unable to estimate the start time of command %d" % idx)
+
+
+def get_user():
+    """Return the name of the user scheduling the command for the fair share."""
+    try:
+        return getpass.getuser()
+    except Exception:
+        return str(os.getuid())
+
+
 # schedule_cmd.py ends here
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Scheduling policies deciding which queued command to run next.
+
+A policy is a function taking the queued commands, the executing
+commands, the pool configuration, the current time and the expected
+durations computed from the history. It returns a function computing a
+sort key for a queued (id, data, mtime) tuple: the command with the
+smallest key is run first.
+"""
+
+import heapq
+import logging
+import time
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+
+def get_priority(data):
+    return data.get("priority", 0)
+
+
+def get_queued_at(data, mtime):
+    return data.get("queued_at", mtime)
+
+
+def strict_policy(queued, executing, config, now, estimates):
+    """Highest priority first then in order of submission."""
+
+    def key(cmd):
+        idx, data, _ = cmd
+        return (-get_priority(data), idx)
+
+    return key
+
+
+def aging_policy(queued, executing, config, now, estimates):
+    """Priority increased by one every aging-interval seconds of wait."""
+    interval = config.get("aging-interval") or 3600
+
+    def key(cmd):
+        idx, data, mtime = cmd
+        waited = max(now - get_queued_at(data, mtime), 0)
+        return (-(get_priority(data) + waited / interval), idx)
+
+    return key
+
+
+def get_owner(data, config):
+    return data.get(config.get("fair-share-key") or "user") or ""
+
+
+def fair_share_policy(queued, executing, config, now, estimates):
+    """Owner with the lowest number of running commands per weight first.
+
+    Owners are the users or the working directories of the commands
+    according to fair-share-key. Inside the share of an owner, commands
+    are ordered like in the strict policy.
+    """
+    weights = config.get("fair-share-weights") or {}
+    usage = {}
+    for _, data, _ in executing:
+        owner = get_owner(data, config)
+        usage[owner] = usage.get(owner, 0) + 1
+
+    def key(cmd):
+        idx, data, _ = cmd
+        owner = get_owner(data, config)
+        share = usage.get(owner, 0) / float(weights.get(owner, 1) or 1)
+        return (share, -get_priority(data), idx)
+
+    return key
+
+
+def fair_share_order(queued, executing, config):
+    """Return the queued commands in the order of successive fair share picks.
+
+    Only the share of the owner of the picked command changes after each
+    pick: a heap holds the next command of each owner with its share.
+    """
+    weights = config.get("fair-share-weights") or {}
+    usage = {}
+    for _, data, _ in executing:
+        owner = get_owner(data, config)
+        usage[owner] = usage.get(owner, 0) + 1
+    owners = {}
+    for cmd in queued:
+        owners.setdefault(get_owner(cmd[1], config), []).append(cmd)
+
+    def push(heap, owner):
+        idx, data, _ = owners[owner][-1]
+        share = usage.get(owner, 0) / float(weights.get(owner, 1) or 1)
+        heapq.heappush(heap, (share, -get_priority(data), idx, owner))
+
+    heap = []
+    for owner, cmds in owners.items():
+        # next command of the owner last
+        cmds.sort(key=lambda cmd: (get_priority(cmd[1]), -cmd[0]))
+        push(heap, owner)
+    ordered = []
+    while heap:
+        owner = heapq.heappop(heap)[3]
+        ordered.append(owners[owner].pop())
+        usage[owner] = usage.get(owner, 0) + 1
+        if owners[owner]:
+            push(heap, owner)
+    return ordered
+
+
+def shortest_job_first_policy(queued, executing, config, now, estimates):
+    """Highest priority first then the shortest expected duration.
+
+    Commands without any history use the median duration of the pool.
+    """
+    estimates = estimates or {}
+    default = estimates.get(None) or 0
+
+    def key(cmd):
+        idx, data, _ = cmd
+        duration = estimates.get(lib.get_fingerprint(data), default)
+        return (-get_priority(data), duration, idx)
+
+    return key
+
+
+POLICIES = {
+    "strict": strict_policy,
+    "aging": aging_policy,
+    "fair-share": fair_share_policy,
+    "shortest-job-first": shortest_job_first_policy,
+}
+
+
+def sort_commands(queued, executing, config, now=None, estimates=None):
+    """Return the queued commands in the order they should be run.
+
+    The fair share depends on the running commands so the order is
+    computed by simulating the successive dispatches.
+    """
+    if now is None:
+        now = time.time()
+    policy = POLICIES[config.get("scheduling-policy") or "strict"]
+    if policy is not fair_share_policy:
+        return sorted(queued, key=policy(queued, executing, config, now, estimates))
+    return fair_share_order(queued, executing, config)
+
+
+def select_command(queued, executing, config, now=None, estimates=None):
+    """Return the next (id, data, mtime) command to run or None."""
+    if not queued:
+        return None
+    if now is None:
+        now = time.time()
+    policy = POLICIES[config.get("scheduling-policy") or "strict"]
+    return min(queued, key=policy(queued, executing, config, now, estimates))
+
+
+# scheduling.py ends here
@@ -15,12 +15,9 @@
 
 """ """
 
-import json
 import logging
-import os
 
 from dciqueue import lib
-from dciqueue.run_cmd import EXT
 
 log = logging.getLogger(__name__)
 
@@ -40,19 +37,12 @@ def execute_command(args):
     if not lib.check_pool(args.top_dir, args.pool):
         return 1
 
-    first, next = lib.get_seq(args)
-
-    for idx in range(first, next):
-        p = os.path.join(args.top_dir, "queue", args.pool, str(idx))
-        if not os.path.exists(p):
-            p = os.path.join(args.top_dir, "queue", args.pool, str(idx) + EXT)
-            if not os.path.exists(p):
-                p = None
-        if p:
-            with open(p) as f:
-                data = json.load(f)
-                if data["cmd"] == args.cmd:
-                    print(idx)
+    # the requeued commands (preemption, admission) keep an id lower
+    # than the first one of the sequence: the whole queue is read
+    executing, queued = lib.read_queue(args.top_dir, args.pool)
+    for idx, data, _ in sorted(executing + queued, key=lambda c: c[0]):
+        if data["cmd"] == args.cmd:
+            print(idx)
     return 0
 
 
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import logging
+import os
+
+from dciqueue import server
+
+log = logging.getLogger(__name__)
+
+COMMAND = "serve"
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND, help="Share the pools with remote hosts over HTTP"
+    )
+    parser.add_argument(
+        "-b",
+        "--bind",
+        help="Address to listen on",
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        "-P",
+        "--port",
+        help="Port to listen on",
+        type=int,
+        default=server.DEFAULT_PORT,
+    )
+    parser.add_argument(
+        "--lease-time",
+        help="Seconds after which a command not renewed by its client is requeued",
+        type=int,
+        default=server.DEFAULT_LEASE_TIME,
+    )
+    return COMMAND
+
+
+def execute_command(args):
+    httpd = server.make_server(
+        args.top_dir,
+        args.bind,
+        args.port,
+        args.lease_time,
+        os.getenv("DCI_QUEUE_TOKEN"),
+    )
+    try:
+        server.serve(httpd)
+    except KeyboardInterrupt:
+        log.info("Stopping the server")
+    return 0
+
+
+# serve_cmd.py ends here
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""HTTP server sharing the pools of a top directory between hosts.
+
+The API is JSON over HTTP:
+
+- GET /pools: names of the pools.
+- GET /pools/<pool>: state of a pool like dci-queue list -j.
+- POST /pools/<pool>/commands {"commands": [...]}: queue commands
+  described like the lines of schedule --from-file, return their ids.
+- POST /pools/<pool>/claim {"host": ..., "load": ..., "memory": ...}:
+  book the next command that can run and return it with its lease, or
+  204 if there is none. The host limits of the admission control are
+  checked against the load and available memory sent by the runner and
+  the commands leased to its host. The health checks of the resources
+  run on the server host.
+- POST /pools/<pool>/commands/<id>/renew {"lease": ...}: extend a lease.
+- POST /pools/<pool>/commands/<id>/release {"lease": ..., "exit_code": ...}:
+  end a command and give back its resources.
+- POST /pools/<pool>/commands/<id>/log?lease=...: append to the log.
+- GET /pools/<pool>/commands/<id>/log?offset=N: read up to MAX_LOG_READ
+  bytes of the log from offset N. The X-Offset header is the next
+  offset and X-Running is 1 while the command is running.
+
+A claimed command is running on the host of the client as long as its
+lease is renewed. When a lease expires, because the client host died
+for example, the command is put back in the queue and its resources are
+given back. A renew or release with a lost lease gets a 409 answer.
+"""
+
+import argparse
+import collections
+import gzip
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from dciqueue import lib, list_cmd, metrics, retention, run_cmd, schedule_cmd
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8421
+DEFAULT_LEASE_TIME = 300
+# maximum interval between 2 checks of the expired leases
+EXPIRE_INTERVAL = 10
+# maximum size of a log chunk returned by a read
+MAX_LOG_READ = 1024 * 1024
+# number of compressed logs kept open between 2 reads
+MAX_LOG_READERS = 16
+
+
+class LeaseError(Exception):
+    pass
+
+
+class QueueServer(object):
+    """Queue operations on a top directory for remote clients."""
+
+    def __init__(self, top_dir, lease_time=DEFAULT_LEASE_TIME):
+        self.top_dir = top_dir
+        self.lease_time = lease_time
+        # one dispatch at a time per pool, the hooks and preemptions it
+        # runs do not block the other pools nor the leases
+        self.pool_locks = {}
+        self.pool_locks_guard = threading.Lock()
+        # protects the read-modify-write of the leased command files
+        self.lease_lock = threading.Lock()
+        # open compressed logs by path, in least recently used order, so
+        # that reading a log by chunks decompresses it only once
+        self.log_readers = collections.OrderedDict()
+        self.log_readers_lock = threading.Lock()
+
+    def get_pool_lock(self, pool):
+        with self.pool_locks_guard:
+            return self.pool_locks.setdefault(pool, threading.Lock())
+
+    def get_args(self, pool):
+        return argparse.Namespace(
+            top_dir=self.top_dir,
+            pool=pool,
+            command_output=False,
+            cmd=[],
+            remove_resource=False,
+            priority=0,
+            extra_pool=[],
+            num_resources=1,
+            affinity_key=None,
+            after=[],
+            after_success=False,
+            force=False,
+        )
+
+    def get_execfile(self, pool, idx):
+        return os.path.join(self.top_dir, "queue", pool, str(idx) + lib.EXEC_EXT)
+
+    def list_pools(self):
+        return sorted(os.listdir(os.path.join(self.top_dir, "pool")))
+
+    def get_pool_state(self, pool):
+        return list_cmd.get_pool_state(self.top_dir, pool)
+
+    def schedule(self, pool, entries):
+        """Queue the commands. Return their ids or raise ValueError."""
+        args = self.get_args(pool)
+        commands = []
+        for entry in entries:
+            if not isinstance(entry, dict) or "cmd" not in entry:
+                raise ValueError("invalid command: %s" % entry)
+            data = schedule_cmd.get_command_data(args, entry)
+            data["user"] = entry.get("user", data["user"])
+            error = schedule_cmd.validate(self.top_dir, pool, data)
+            if error:
+                raise ValueError(error)
+            commands.append(data)
+        ids = schedule_cmd.queue_commands(args, commands)
+        if ids is None:
+            raise ValueError("invalid command id in after")
+        return ids
+
+    def claim(self, pool, host, state=None):
+        """Book the next command that can run in the pool for a client.
+
+        state is the {"load": ..., "memory": ...} of the client host.
+        """
+        self.expire_leases()
+        with self.get_pool_lock(pool):
+            return self.claim_command(pool, host, state)
+
+    def claim_command(self, pool, host, state=None):
+        args = self.get_args(pool)
+        args.remote_host = dict(state or {}, name=host)
+        for to_exec, idx, data, booked in run_cmd.dispatch_commands(args):
+            break
+        else:
+            return None
+        now = time.time()
+        data["real_cmd"] = [run_cmd.replace_resources(c, booked) for c in data["cmd"]]
+        data["resource"] = booked[0][0]
+        data["jobid"] = idx
+        data["booked"] = booked
+        data["started_at"] = now
+        data["lease"] = {
+            "token": uuid.uuid4().hex,
+            "host": host,
+            "expires": now + self.lease_time,
+        }
+        if data.get("remove"):
+            log.info("Removing resource %s" % booked[0][0])
+            path = os.path.join(self.top_dir, "pool", pool, booked[0][0])
+            if os.path.exists(path):
+                os.unlink(path)
+        with open(to_exec, "w") as f:
+            json.dump(data, f)
+        env = run_cmd.get_command_env(args, idx, booked)
+        with open(os.path.join(self.top_dir, "log", pool, str(idx)), "w") as f:
+            for key, value in sorted(env.items()):
+                f.write("+ %s=%s\n" % (key, value))
+            f.write("+ host " + host + "\n")
+            f.write("+ cd " + data["wd"] + "\n")
+            f.write("+ " + " ".join(data["real_cmd"]) + "\n")
+        metrics.publish(
+            self.top_dir,
+            pool,
+            wait=now - data.get("queued_at", now),
+            latency=now - data.get("ready_at", now),
+        )
+        log.info(
+            "Command %d of pool %s claimed by %s on %s"
+            % (idx, pool, host, ",".join(res for res, _ in booked))
+        )
+        return {
+            "id": idx,
+            "cmd": data["real_cmd"],
+            "wd": data["wd"],
+            "env": env,
+            "lease": data["lease"]["token"],
+            "lease_time": self.lease_time,
+        }
+
+    def read_execfile(self, pool, idx):
+        try:
+            with open(self.get_execfile(pool, idx)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read_leased(self, pool, idx, token):
+        """Return the data of a leased command or raise LeaseError."""
+        data = self.read_execfile(pool, idx)
+        if data is None:
+            raise LeaseError("command %s is not running" % idx)
+        lease = data.get("lease")
+        if not lease or not token or not hmac.compare_digest(lease["token"], token):
+            raise LeaseError("lease of command %s lost" % idx)
+        return data
+
+    def renew(self, pool, idx, token):
+        with self.lease_lock:
+            data = self.read_leased(pool, idx, token)
+            data["lease"]["expires"] = time.time() + self.lease_time
+            execfile = self.get_execfile(pool, idx)
+            with open(execfile + ".tmp", "w") as f:
+                json.dump(data, f)
+            os.rename(execfile + ".tmp", execfile)
+        return data["lease"]["expires"]
+
+    def release(self, pool, idx, token, exit_code):
+        with self.lease_lock:
+            data = self.read_leased(pool, idx, token)
+            try:
+                os.unlink(self.get_execfile(pool, idx))
+            except FileNotFoundError:
+                pass
+        log.info(
+            "Command %d of pool %s returned %s on %s"
+            % (idx, pool, exit_code, data["lease"]["host"])
+        )
+        run_cmd.finish_command(
+            self.get_args(pool), idx, data, data["booked"], exit_code
+        )
+
+    def append_log(self, pool, idx, token, content):
+        self.read_leased(pool, idx, token)
+        with open(os.path.join(self.top_dir, "log", pool, str(idx)), "ab") as f:
+            f.write(content)
+
+    def read_log(self, pool, idx, offset):
+        """Return (content, next offset, running) or None without log.
+
+        At most MAX_LOG_READ bytes are returned. The offsets of a
+        compressed log are the ones of its content.
+        """
+        running = os.path.exists(self.get_execfile(pool, idx))
+        path = retention.get_log_path(self.top_dir, pool, idx)
+        if path is None:
+            return None
+        try:
+            if retention.is_compressed(path):
+                content = self.read_compressed(path, offset)
+            else:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    content = f.read(MAX_LOG_READ)
+        except FileNotFoundError:
+            return None
+        return content, offset + len(content), running
+
+    def read_compressed(self, path, offset):
+        """Read a chunk of a compressed log from offset.
+
+        The log stays open at the end of the chunk so that the next read
+        does not decompress it again from the start.
+        """
+        with self.log_readers_lock:
+            reader = self.log_readers.pop(path, None)
+        if reader is not None and reader.tell() > offset:
+            reader.close()
+            reader = None
+        if reader is None:
+            reader = gzip.open(path, "rb")
+        try:
+            reader.seek(offset)
+            content = reader.read(MAX_LOG_READ)
+        except BaseException:
+            reader.close()
+            raise
+        if len(content) < MAX_LOG_READ:
+            # end of the log
+            reader.close()
+            return content
+        closed = []
+        with self.log_readers_lock:
+            if path in self.log_readers:
+                closed.append(self.log_readers.pop(path))
+            self.log_readers[path] = reader
+            while len(self.log_readers) > MAX_LOG_READERS:
+                closed.append(self.log_readers.popitem(last=False)[1])
+        for reader in closed:
+            reader.close()
+        return content
+
+    def expire_leases(self, now=None):
+        """Put back in the queue the commands whose lease expired.
+
+        The commands left by dead local runners are cleaned at the same
+        time.
+        """
+        if now is None:
+            now = time.time()
+        expired = []
+        for pool in self.list_pools():
+            run_cmd.clean_stale_commands(self.top_dir, pool, now)
+            executing, _ = lib.read_queue(self.top_dir, pool)
+            for idx, data, _ in executing:
+                if not data.get("lease") or data["lease"]["expires"] > now:
+                    continue
+                with self.lease_lock:
+                    # renewed or released in the meantime
+                    data = self.read_execfile(pool, idx)
+                    lease = data and data.get("lease")
+                    if not lease or lease["expires"] > now:
+                        continue
+                    data = lib.requeue_command(
+                        self.top_dir, pool, idx, {}, "lease_expirations"
+                    )
+                if data is None:
+                    continue
+                log.warning(
+                    "Lease of command %d of pool %s on %s expired, requeuing it"
+                    % (idx, pool, lease["host"])
+                )
+                run_cmd.free_resources(data["booked"], self.top_dir)
+                metrics.publish(self.top_dir, pool)
+                expired.append((pool, idx))
+        return expired
+
+
+ROUTES = (
+    ("GET", re.compile(r"^/pools$"), "get_pools"),
+    ("GET", re.compile(r"^/pools/([^/]+)$"), "get_pool"),
+    ("POST", re.compile(r"^/pools/([^/]+)/commands$"), "post_commands"),
+    ("POST", re.compile(r"^/pools/([^/]+)/claim$"), "post_claim"),
+    ("POST", re.compile(r"^/pools/([^/]+)/commands/(\d+)/renew$"), "post_renew"),
+    ("POST", re.compile(r"^/pools/([^/]+)/commands/(\d+)/release$"), "post_release"),
+    ("POST", re.compile(r"^/pools/([^/]+)/commands/(\d+)/log$"), "post_log"),
+    ("GET", re.compile(r"^/pools/([^/]+)/commands/(\d+)/log$"), "get_log"),
+)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Map the HTTP requests to the QueueServer operations."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        log.debug("%s %s" % (self.address_string(), format % args))
+
+    def send_json(self, code, value):
+        body = json.dumps(value).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, code, message):
+        self.send_json(code, {"error": message})
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def read_json(self):
+        body = self.read_body()
+        return json.loads(body) if body else {}
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+        token = self.server.token
+        if token and not hmac.compare_digest(
+            self.headers.get("Authorization", ""), "Bearer " + token
+        ):
+            self.read_body()
+            return self.send_error_json(401, "invalid token")
+        for route_method, regexp, name in ROUTES:
+            m = regexp.match(url.path)
+            if m and route_method == method:
+                break
+        else:
+            self.read_body()
+            return self.send_error_json(404, "unknown path %s" % url.path)
+        groups = list(m.groups())
+        if groups and not lib.check_pool(self.server.queue.top_dir, groups[0]):
+            self.read_body()
+            return self.send_error_json(404, "no pool %s" % groups[0])
+        if len(groups) > 1:
+            groups[1] = int(groups[1])
+        try:
+            getattr(self, name)(*groups)
+        except LeaseError as excp:
+            self.send_error_json(409, str(excp))
+        except ValueError as excp:
+            self.send_error_json(400, str(excp))
+        except Exception:
+            log.exception("Unable to process %s %s" % (method, self.path))
+            self.send_error_json(500, "internal error")
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def get_pools(self):
+        self.send_json(200, {"pools": self.server.queue.list_pools()})
+
+    def get_pool(self, pool):
+        self.send_json(200, self.server.queue.get_pool_state(pool))
+
+    def post_commands(self, pool):
+        ids = self.server.queue.schedule(pool, self.read_json().get("commands", []))
+        self.send_json(200, {"ids": ids})
+
+    def post_claim(self, pool):
+        body = self.read_json()
+        host = body.get("host") or self.address_string()
+        # unknown to older clients
+        state = {}
+        for key in ("load", "memory"):
+            if isinstance(body.get(key), (int, float)):
+                state[key] = body[key]
+        claim = self.server.queue.claim(pool, host, state)
+        if claim is None:
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_json(200, claim)
+
+    def post_renew(self, pool, idx):
+        body = self.read_json()
+        expires = self.server.queue.renew(pool, idx, body.get("lease", ""))
+        self.send_json(200, {"expires": expires})
+
+    def post_release(self, pool, idx):
+        body = self.read_json()
+        self.server.queue.release(
+            pool, idx, body.get("lease", ""), body.get("exit_code")
+        )
+        self.send_json(200, {})
+
+    def post_log(self, pool, idx):
+        content = self.read_body()
+        lease = self.query.get("lease", [""])[0]
+        self.server.queue.append_log(pool, idx, lease, content)
+        self.send_json(200, {})
+
+    def get_log(self, pool, idx):
+        offset = int(self.query.get("offset", ["0"])[0])
+        res = self.server.queue.read_log(pool, idx, offset)
+        if res is None:
+            return self.send_error_json(404, "no log for command %d" % idx)
+        content, offset, running = res
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("X-Offset", str(offset))
+        self.send_header("X-Running", "1" if running else "0")
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def make_server(
+    top_dir, bind="127.0.0.1", port=DEFAULT_PORT, lease_time=None, token=None
+):
+    """Return an HTTP server, not started, on the pools of top_dir."""
+    server = ThreadingHTTPServer((bind, port), RequestHandler)
+    server.daemon_threads = True
+    server.queue = QueueServer(top_dir, lease_time or DEFAULT_LEASE_TIME)
+    server.token = token
+    return server
+
+
+def expire_loop(server, stop):
+    """Check the expired leases until stop is set."""
+    interval = min(server.queue.lease_time / 3.0, EXPIRE_INTERVAL)
+    while not stop.wait(interval):
+        try:
+            server.queue.expire_leases()
+        except Exception:
+            log.exception("Unable to check the expired leases")
+
+
+def serve(server):
+    stop = threading.Event()
+    thread = threading.Thread(target=expire_loop, args=(server, stop), daemon=True)
+    thread.start()
+    log.info("Serving %s on %s:%d" % (server.queue.top_dir, *server.server_address[:2]))
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+
+
+# server.py ends here
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -13,18 +13,38 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 
+import argparse
+import gzip
 import io
 import json
 import os
 import shutil
+import subprocess
+import sys
 import tempfile
+import threading
 import time
 import unittest
 import uuid
 from contextlib import redirect_stdout
 from unittest.mock import patch
 
-from dciqueue import lib, main, run_cmd
+from dciqueue import (
+    admission,
+    affinity,
+    dependencies,
+    autoscale,
+    client,
+    history,
+    lib,
+    main,
+    metrics,
+    reservations,
+    retention,
+    run_cmd,
+    scheduling,
+    server,
+)
 
 
 class TestQueue(unittest.TestCase):
@@ -570,6 +590,101 @@ class TestQueue(unittest.TestCase):
         self.file_exists("available", "8nodes", "cluster4")
         self.doesnt_exist("queue", "8nodes", "1" + run_cmd.EXT)
 
+    def test_run_unschedule_group(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "kill-grace-period", "2"]), 0
+        )
+        pidfile = os.path.join(self.queue_dir, "pid")
+        # a child ignoring SIGTERM
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "(trap '' TERM; exec sleep 3000) & echo $! > %s; wait; echo @RESOURCE"
+                    % pidfile,
+                ]
+            ),
+            0,
+        )
+        os.system("dci-queue run 8nodes &")
+        time.sleep(5)
+        self.doesnt_exist("available", "8nodes", "cluster4")
+        with open(pidfile) as f:
+            child = int(f.read())
+        start = time.time()
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "1"]), 0)
+        self.assertLess(time.time() - start, 10)
+        try:
+            with open("/proc/%d/stat" % child) as f:
+                self.assertEqual(f.read().split(")")[-1].split()[0], "Z")
+        except FileNotFoundError:
+            pass
+        time.sleep(1)
+        self.file_exists("available", "8nodes", "cluster4")
+        self.doesnt_exist("queue", "8nodes", "1" + run_cmd.EXT)
+
+    def test_run_leftovers(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "kill-grace-period", "1"]), 0
+        )
+        pidfile = os.path.join(self.queue_dir, "pid")
+        # the command exits leaving a child ignoring SIGTERM
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "(trap '' TERM; exec sleep 3000) & echo $! > %s; echo @RESOURCE"
+                    % pidfile,
+                ]
+            ),
+            0,
+        )
+        start = time.time()
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        # killed after the grace period, before the resource is given back
+        self.assertGreaterEqual(time.time() - start, 1)
+        with open(pidfile) as f:
+            child = int(f.read())
+        try:
+            with open("/proc/%d/stat" % child) as f:
+                self.assertEqual(f.read().split(")")[-1].split()[0], "Z")
+        except FileNotFoundError:
+            pass
+        self.file_exists("available", "8nodes", "cluster4")
+
+    def test_wait_group(self):
+        proc = subprocess.Popen(
+            ["bash", "-c", "sleep 1 & sleep 2 & wait"], start_new_session=True
+        )
+        try:
+            self.assertFalse(lib.wait_group(proc.pid, 0.2))
+            start = time.time()
+            with patch("time.sleep") as sleep:
+                self.assertTrue(lib.wait_group(proc.pid, 10))
+            # woken up by the exits, without polling
+            sleep.assert_not_called()
+            self.assertLess(time.time() - start, 5)
+        finally:
+            proc.wait()
+
     def test_run_invalid_command(self):
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
         self.assertEqual(
@@ -587,12 +702,47 @@ class TestQueue(unittest.TestCase):
 
     def test_run_no_resource(self):
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        os.unlink(os.path.join(self.queue_dir, "available", "8nodes", "cluster4"))
         self.assertEqual(
             main.main(["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE"]), 0
         )
         self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
         self.file_exists("queue", "8nodes", "1")
 
+    def test_schedule_too_many_resources(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "extra"]), 0)
+        for res in ("cluster4", "cluster5"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-n", "3", "8nodes", "echo", "@RESOURCE"]
+            ),
+            1,
+        )
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-e", "extra", "8nodes", "echo", "@RESOURCE"]
+            ),
+            1,
+        )
+        self.doesnt_exist("queue", "8nodes", "1")
+        # the pool can grow up to scale-max-size
+        for key, value in (("scale-up-cmd", "true"), ("scale-max-size", "3")):
+            self.assertEqual(
+                main.main(["dci-queue", "config", "8nodes", key, value]), 0
+            )
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-n", "3", "8nodes", "echo", "@RESOURCE"]
+            ),
+            0,
+        )
+        self.file_exists("queue", "8nodes", "1")
+
     def test_list(self):
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
 
@@ -658,6 +808,49 @@ class TestQueue(unittest.TestCase):
         self.assertEqual(rc, 0)
         self.assertIn("[resA,resB]", output)
 
+    def test_list_json(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        for cmd in (
+            ["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE", "1"],
+            ["dci-queue", "schedule", "-p", "2", "8nodes", "echo", "@RESOURCE", "2"],
+            ["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE", "3"],
+        ):
+            self.assertEqual(main.main(cmd), 0)
+        now = time.time()
+        with open(
+            os.path.join(self.queue_dir, "queue", "8nodes", "4" + run_cmd.EXT), "w"
+        ) as f:
+            json.dump(
+                {
+                    "cmd": ["sleep", "@RESOURCE"],
+                    "real_cmd": ["sleep", "cluster5"],
+                    "wd": "/tmp",
+                    "resource": "cluster5",
+                    "booked": [["cluster5", "8nodes"]],
+                    "queued_at": now - 100,
+                    "started_at": now - 40,
+                    "pid": 1,
+                },
+                f,
+            )
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "list", "--json", "8nodes"])
+            output = buf.getvalue()
+        self.assertEqual(rc, 0)
+        state = json.loads(output)
+        self.assertEqual(state["resources"], ["cluster4"])
+        self.assertEqual(state["available"], ["cluster4"])
+        self.assertEqual([e["id"] for e in state["queued"]], [2, 1, 3])
+        self.assertTrue(all(e["wait"] >= 0 for e in state["queued"]))
+        executing = state["executing"][0]
+        self.assertEqual(executing["id"], 4)
+        self.assertEqual(executing["resources"], ["cluster5"])
+        self.assertAlmostEqual(executing["wait"], 60, delta=1)
+        self.assertGreaterEqual(executing["duration"], 40)
+
     def test_log_level(self):
         self.assertEqual(
             main.main(["dci-queue", "-l", "CRITICAL", "add-pool", "-n", "8nodes"]), 0
@@ -701,6 +894,34 @@ class TestQueue(unittest.TestCase):
             main.main(["dci-queue", "search", "8nodes", "echo", "@RESOURCE"]), 0
         )
 
+    def test_search_requeued(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        for num in ("1", "2"):
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule", "8nodes", "echo", num, "@RESOURCE"]
+                ),
+                0,
+            )
+        args = argparse.Namespace(top_dir=self.queue_dir, pool="8nodes")
+        self.assertEqual(run_cmd.get_command(args, 1)[1], 1)
+        self.assertEqual(lib.get_seq(args), (2, 3))
+        # put back in the queue below the first id of the sequence
+        self.assertIsNotNone(
+            lib.requeue_command(self.queue_dir, "8nodes", 1, {}, "preemptions")
+        )
+        for num, idx in (("1", "1\n"), ("2", "2\n")):
+            with io.StringIO() as buf, redirect_stdout(buf):
+                rc = main.main(
+                    ["dci-queue", "search", "8nodes", "echo", num, "@RESOURCE"]
+                )
+                output = buf.getvalue()
+            self.assertEqual(rc, 0)
+            self.assertEqual(output, idx)
+
     def test_searchdir(self):
         self.assertEqual(main.main(["dci-queue", "log", "8nodes", "1"]), 1)
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
@@ -775,6 +996,43 @@ class TestQueue(unittest.TestCase):
         self.assertEqual(rc, 0)
         self.assertEqual(output, job_ids)
 
+    def test_dci_job_via_jobs_file(self):
+        job_id = uuid.uuid4()
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res"]), 0)
+        main.main(
+            [
+                "dci-queue",
+                "schedule",
+                "8nodes",
+                "--",
+                "bash",
+                "-c",
+                'echo \'{"name": "@RESOURCE", "job_id": "%s", "status": "new"}\''
+                " >> $DCI_PIPELINE_JOBS_FILE;"
+                'echo \'{"name": "@RESOURCE", "job_id": "%s", "status": "success"}\''
+                " >> $DCI_PIPELINE_JOBS_FILE" % (job_id, job_id),
+            ]
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists("log", "8nodes", "1.jobs")
+        # the jobs file must be used even if the log is gone
+        os.unlink(os.path.join(self.queue_dir, "log", "8nodes", "1"))
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "dci-job", "8nodes", "1"])
+            output = buf.getvalue()
+        self.assertEqual(rc, 0)
+        self.assertEqual(output, "res:%s\n" % job_id)
+        # and once compressed
+        retention.compress_log(self.queue_dir, "8nodes", 1)
+        self.doesnt_exist("log", "8nodes", "1.jobs")
+        self.file_exists("log", "8nodes", "1.jobs.gz")
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "dci-job", "8nodes", "1"])
+            output = buf.getvalue()
+        self.assertEqual(rc, 0)
+        self.assertEqual(output, "res:%s\n" % job_id)
+
     def test_add_crontab(self):
         crontab_file = os.path.join(self.queue_dir, "crontab")
         with open(crontab_file, "w"):
@@ -805,6 +1063,1415 @@ class TestQueue(unittest.TestCase):
         self.doesnt_exist("queue", "8nodes", "1234" + run_cmd.EXT)
         self.file_exists("available", "8nodes", "res")
 
+    def test_stale_commands(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster4", "cluster5", "cluster6", "cluster7", "cluster8"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+            os.unlink(os.path.join(self.queue_dir, "available", "8nodes", res))
+        pid = os.getpid()
+        start = lib.get_start_time(pid)
+        self.assertIsNotNone(start)
+        commands = {
+            # pid reused by another process
+            1: {
+                "pid": pid,
+                "pgid": pid,
+                "pid_start": start + 1,
+                "booked": [["cluster4", "8nodes"]],
+            },
+            # command still running after the death of its runner
+            2: {
+                "pid": pid,
+                "pid_start": start,
+                "runner_pid": pid,
+                "runner_start": start + 1,
+                "booked": [["cluster5", "8nodes"]],
+            },
+            # runner dead before starting the command
+            3: {
+                "runner_pid": pid,
+                "runner_start": start + 1,
+                "booked": [["cluster6", "8nodes"], ["cluster7", "8nodes"]],
+            },
+            # being started
+            4: {"booked": [["cluster8", "8nodes"]]},
+        }
+        for idx, data in commands.items():
+            execfile = os.path.join(
+                self.queue_dir, "queue", "8nodes", str(idx) + run_cmd.EXT
+            )
+            with open(execfile, "w") as fd:
+                json.dump(data, fd)
+        with patch("os.killpg") as killpg:
+            self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        # the group of the reused pid is only probed, not signaled
+        self.assertEqual([c.args[1] for c in killpg.call_args_list if c.args[1]], [])
+        self.doesnt_exist("queue", "8nodes", "1" + run_cmd.EXT)
+        self.file_exists("queue", "8nodes", "2" + run_cmd.EXT)
+        self.doesnt_exist("queue", "8nodes", "3" + run_cmd.EXT)
+        self.file_exists("queue", "8nodes", "4" + run_cmd.EXT)
+        for res in ("cluster4", "cluster6", "cluster7"):
+            self.file_exists("available", "8nodes", res)
+        self.doesnt_exist("available", "8nodes", "cluster5")
+        self.doesnt_exist("available", "8nodes", "cluster8")
+        self.assertEqual(
+            run_cmd.clean_stale_commands(
+                self.queue_dir, "8nodes", time.time() + run_cmd.STALE_GRACE + 1
+            ),
+            [4],
+        )
+        self.file_exists("available", "8nodes", "cluster8")
+
+    def test_stale_command_leftovers(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res"]), 0)
+        os.unlink(os.path.join(self.queue_dir, "available", "8nodes", "res"))
+        # the child of the command outlives it
+        proc = subprocess.Popen(
+            ["bash", "-c", "sleep 60 & echo $!; sleep 0.5"],
+            stdout=subprocess.PIPE,
+            start_new_session=True,
+        )
+        child = int(proc.stdout.readline())
+        pid_start = lib.get_start_time(proc.pid)
+        proc.wait()
+        proc.stdout.close()
+        self.assertTrue(lib.group_exists(proc.pid))
+        pid = os.getpid()
+        with open(
+            os.path.join(self.queue_dir, "queue", "8nodes", "1" + run_cmd.EXT), "w"
+        ) as fd:
+            json.dump(
+                {
+                    "pid": proc.pid,
+                    "pgid": proc.pid,
+                    "pid_start": pid_start,
+                    "runner_pid": pid,
+                    "runner_start": lib.get_start_time(pid) + 1,
+                    "booked": [["res", "8nodes"]],
+                },
+                fd,
+            )
+        self.assertEqual(run_cmd.clean_stale_commands(self.queue_dir, "8nodes"), [1])
+        self.file_exists("available", "8nodes", "res")
+        end = time.time() + 10
+        while time.time() < end:
+            try:
+                with open("/proc/%d/stat" % child) as f:
+                    # dead children of init can stay zombies in containers
+                    if f.read().rsplit(")", 1)[1].split()[0] == "Z":
+                        break
+            except FileNotFoundError:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail("child %d of the stale command still running" % child)
+
+    def test_config(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "log-max-size", "2M"]), 0
+        )
+        self.assertEqual(
+            lib.get_config(self.queue_dir, "8nodes")["log-max-size"], 2 * 1024**2
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "log-max-age", "abc"]), 1
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "-u", "8nodes", "log-max-size"]), 0
+        )
+        self.assertEqual(lib.get_config(self.queue_dir, "8nodes")["log-max-size"], 0)
+
+    def test_log_compress(self):
+        job_id = uuid.uuid4()
+        res = "res"
+        with open(os.path.join(self.queue_dir, res), "w") as f:
+            f.write(
+                'changed: [jumphost] => {"changed": true, "job": {"name": "%s","id": "%s"}}\n'
+                % ("compressed", job_id)
+            )
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "log-compress", "true"]), 0
+        )
+        main.main(
+            [
+                "dci-queue",
+                "schedule",
+                "8nodes",
+                "cat",
+                os.path.join(self.queue_dir, "@RESOURCE"),
+            ]
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.doesnt_exist("log", "8nodes", "1")
+        self.file_exists("log", "8nodes", "1.gz")
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "dci-job", "8nodes", "1"])
+            output = buf.getvalue()
+        self.assertEqual(rc, 0)
+        self.assertEqual(output, "compressed:%s\n" % job_id)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "log", "-n", "1", "8nodes", "1"])
+            output = buf.getvalue()
+        self.assertEqual(rc, 0)
+        self.assertIn(str(job_id), output)
+        self.assertNotIn("DCI_QUEUE", output)
+
+    def test_log_retention(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        log_dir = os.path.join(self.queue_dir, "log", "8nodes")
+        now = time.time()
+        for idx in range(1, 6):
+            path = os.path.join(log_dir, str(idx))
+            with open(path, "wb") as f:
+                # random data to have compressed logs of the same size
+                f.write(os.urandom(1000))
+            mtime = now - (6 - idx) * 86400 + 3600
+            os.utime(path, (mtime, mtime))
+            with open(path + ".jobs", "w") as f:
+                f.write('{"job_id": "%s", "status": "success"}\n' % idx)
+            os.utime(path + ".jobs", (mtime, mtime))
+        # 3 is still running
+        open(os.path.join(self.queue_dir, "queue", "8nodes", "3" + run_cmd.EXT), "w")
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "log-max-size", "3700"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "log-max-age", "4"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "log-compress", "on"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "rotate-logs", "8nodes"]), 0)
+        # 1 is too old, 2 is evicted for size, 3 is running
+        self.doesnt_exist("log", "8nodes", "1")
+        self.doesnt_exist("log", "8nodes", "1.jobs")
+        self.doesnt_exist("log", "8nodes", "2")
+        self.doesnt_exist("log", "8nodes", "2.jobs.gz")
+        self.file_exists("log", "8nodes", "3")
+        self.file_exists("log", "8nodes", "3.jobs")
+        self.file_exists("log", "8nodes", "4.gz")
+        self.file_exists("log", "8nodes", "4.jobs.gz")
+        self.file_exists("log", "8nodes", "5.gz")
+        self.file_exists("log", "8nodes", "5.jobs.gz")
+        with open(os.path.join(log_dir, ".evicted")) as f:
+            evicted = [json.loads(line) for line in f]
+        self.assertEqual(
+            [(e["id"], e["reason"]) for e in evicted], [("1", "age"), ("2", "size")]
+        )
+        self.assertEqual(main.main(["dci-queue", "log", "8nodes", "2"]), 1)
+
+    def test_scheduling_policies(self):
+        now = 10000
+        queued = [
+            (1, {"priority": 0, "user": "fred", "queued_at": now - 7200}, 0),
+            (2, {"priority": 1, "user": "ci", "queued_at": now - 60}, 0),
+            (3, {"priority": 1, "user": "ci", "queued_at": now - 30}, 0),
+        ]
+        executing = [
+            (4, {"priority": 1, "user": "ci"}, 0),
+            (5, {"priority": 1, "user": "ci"}, 0),
+            (6, {"priority": 0, "user": "fred"}, 0),
+        ]
+        config = lib.get_config(self.queue_dir, "8nodes")
+        self.assertEqual(
+            scheduling.select_command(queued, executing, config, now)[0], 2
+        )
+        config["scheduling-policy"] = "aging"
+        self.assertEqual(
+            scheduling.select_command(queued, executing, config, now)[0], 1
+        )
+        config["aging-interval"] = 86400
+        self.assertEqual(
+            scheduling.select_command(queued, executing, config, now)[0], 2
+        )
+        config["scheduling-policy"] = "fair-share"
+        self.assertEqual(
+            [c[0] for c in scheduling.sort_commands(queued, executing, config, now)],
+            [1, 2, 3],
+        )
+        config["fair-share-weights"] = {"ci": 3}
+        self.assertEqual(
+            [c[0] for c in scheduling.sort_commands(queued, executing, config, now)],
+            [2, 3, 1],
+        )
+        self.assertIsNone(scheduling.select_command([], executing, config, now))
+        # same order as picking the commands one after the other
+        queued = [
+            (idx, {"priority": idx % 3, "user": "user%d" % (idx * 7 % 5)}, 0)
+            for idx in range(1, 200)
+        ]
+        config["fair-share-weights"] = {"user1": 2, "user3": 0.5}
+        remaining = list(queued)
+        running = list(executing)
+        expected = []
+        while remaining:
+            cmd = scheduling.select_command(remaining, running, config, now)
+            remaining.remove(cmd)
+            running.append(cmd)
+            expected.append(cmd[0])
+        self.assertEqual(
+            [c[0] for c in scheduling.sort_commands(queued, executing, config, now)],
+            expected,
+        )
+
+    def test_run_aging(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        for num, pri in ((1, "0"), (2, "1")):
+            marker = os.path.join(self.queue_dir, "%d-@RESOURCE" % num)
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule", "-p", pri, "8nodes", "touch", marker]
+                ),
+                0,
+            )
+        path = os.path.join(self.queue_dir, "queue", "8nodes", "1")
+        with open(path) as f:
+            data = json.load(f)
+        self.assertIn("user", data)
+        data["queued_at"] -= 7200
+        with open(path, "w") as f:
+            json.dump(data, f)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "scheduling-policy", "bad"]),
+            1,
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "scheduling-policy", "aging"]),
+            0,
+        )
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "list", "--json", "8nodes"])
+            output = buf.getvalue()
+        self.assertEqual(rc, 0)
+        self.assertEqual([c["id"] for c in json.loads(output)["queued"]], [1, 2])
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists(".", ".", "1-cluster4")
+        self.doesnt_exist(".", ".", "2-cluster4")
+        self.file_exists("queue", "8nodes", "2")
+
+    def test_run_backfill(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "primary"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "extra"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "primary", "res1"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "extra", "ext1"]), 0)
+        os.unlink(os.path.join(self.queue_dir, "available", "extra", "ext1"))
+        for num, extra in ((1, ["-e", "extra"]), (2, []), (3, [])):
+            marker = os.path.join(self.queue_dir, "%d-@RESOURCE" % num)
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule", "-f"]
+                    + extra
+                    + ["primary", "touch", marker]
+                ),
+                0,
+            )
+        # the blocked multi-pool command has waited too long: it reserves
+        # the resource of the primary pool
+        path = os.path.join(self.queue_dir, "queue", "primary", "1")
+        with open(path) as f:
+            data = json.load(f)
+        data["queued_at"] -= 7200
+        with open(path, "w") as f:
+            json.dump(data, f)
+        self.assertEqual(main.main(["dci-queue", "run", "primary"]), 0)
+        self.doesnt_exist(".", ".", "2-res1")
+        self.file_exists("queue", "primary", "1")
+        self.file_exists("available", "primary", "res1")
+        # without reservation, the next command that fits is run
+        self.assertEqual(
+            main.main(["dci-queue", "config", "primary", "backfill-max-wait", "0"]),
+            0,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "primary"]), 0)
+        self.file_exists(".", ".", "2-res1")
+        self.doesnt_exist(".", ".", "3-res1")
+        self.file_exists("queue", "primary", "1")
+        self.doesnt_exist("queue", "primary", "2")
+        self.file_exists("queue", "primary", "3")
+        # the multi-pool command is run as soon as all its resources are free
+        self.assertEqual(main.main(["dci-queue", "add-resource", "extra", "ext1"]), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "primary"]), 0)
+        self.file_exists(".", ".", "1-res1")
+        self.file_exists("queue", "primary", "3")
+
+    def test_run_backfill_reservations(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "primary"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "extra"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "primary", "res1"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "extra", "ext1"]), 0)
+        ext1 = os.path.join(self.queue_dir, "available", "extra", "ext1")
+        os.unlink(ext1)
+        marker = os.path.join(self.queue_dir, "%s-@RESOURCE")
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-e", "extra", "primary", "touch"]
+                + [marker % "primary@RESOURCE2"]
+            ),
+            0,
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "extra", "touch", marker % "extra"]),
+            0,
+        )
+        path = os.path.join(self.queue_dir, "queue", "primary", "1")
+        with open(path) as f:
+            data = json.load(f)
+        data["queued_at"] -= 7200
+        with open(path, "w") as f:
+            json.dump(data, f)
+        # the multi-pool command reserves the resource of its extra pool
+        self.assertEqual(main.main(["dci-queue", "run", "primary"]), 0)
+        self.assertEqual(
+            list(reservations.load(self.queue_dir, "extra")), ["primary:1"]
+        )
+        os.symlink(os.path.join(self.queue_dir, "pool", "extra", "ext1"), ext1)
+        # the runner of the extra pool honours it
+        self.assertEqual(main.main(["dci-queue", "run", "extra"]), 0)
+        self.doesnt_exist(".", ".", "extra-ext1")
+        self.assertEqual(main.main(["dci-queue", "run", "primary"]), 0)
+        self.file_exists(".", ".", "primaryext1-res1")
+        # the reservation is gone with the command
+        self.assertEqual(reservations.get_reserved(self.queue_dir, "extra"), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "extra"]), 0)
+        self.file_exists(".", ".", "extra-ext1")
+
+    def test_run_backfill_reservation_cap(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster4", "cluster5"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        marker = os.path.join(self.queue_dir, "%d-@RESOURCE")
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-n", "2", "8nodes", "touch", marker % 1]
+            ),
+            0,
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "touch", marker % 2]), 0
+        )
+        path = os.path.join(self.queue_dir, "queue", "8nodes", "1")
+        with open(path) as f:
+            data = json.load(f)
+        data["queued_at"] -= 7200
+        with open(path, "w") as f:
+            json.dump(data, f)
+        # the pool has shrunk: the command can never run and reserves nothing
+        self.assertEqual(
+            main.main(["dci-queue", "remove-resource", "8nodes", "cluster5", "gone"]),
+            0,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists(".", ".", "2-cluster4")
+        self.file_exists("queue", "8nodes", "1")
+        self.assertEqual(reservations.load(self.queue_dir, "8nodes"), {})
+
+    def test_book_resources(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "primary"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "extra"]), 0)
+        for res in ("res1", "res2"):
+            self.assertEqual(
+                main.main(["dci-queue", "add-resource", "primary", res]), 0
+            )
+        self.assertEqual(main.main(["dci-queue", "add-resource", "extra", "ext1"]), 0)
+        # nothing is booked when one of the pools is exhausted
+        self.assertIsNone(
+            run_cmd.book_resources(self.queue_dir, ["primary", "extra", "extra"])
+        )
+        for res in ("res1", "res2"):
+            self.link_exists("available", "primary", res)
+        self.link_exists("available", "extra", "ext1")
+        booked = run_cmd.book_resources(self.queue_dir, ["primary", "extra", "primary"])
+        self.assertEqual(
+            sorted(booked),
+            [("ext1", "extra"), ("res1", "primary"), ("res2", "primary")],
+        )
+        self.assertEqual(booked[1], ("ext1", "extra"))
+        self.assertEqual(
+            run_cmd.count_available_resources(self.queue_dir, "primary"), 0
+        )
+        self.assertIsNone(run_cmd.book_resources(self.queue_dir, ["primary"]))
+        run_cmd.free_resources(booked, self.queue_dir)
+        self.assertEqual(
+            run_cmd.count_available_resources(self.queue_dir, "primary"), 2
+        )
+        self.link_exists("available", "extra", "ext1")
+
+    def test_run_gang(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster4", "cluster5", "cluster6"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-n", "0", "8nodes", "echo", "@RESOURCE"]
+            ),
+            1,
+        )
+        output = os.path.join(self.queue_dir, "output")
+        for _ in range(2):
+            self.assertEqual(
+                main.main(
+                    [
+                        "dci-queue",
+                        "schedule",
+                        "-f",
+                        "-n",
+                        "2",
+                        "8nodes",
+                        "--",
+                        "bash",
+                        "-c",
+                        "echo @RESOURCE1 @RESOURCE2 @RESOURCE $DCI_QUEUE_RES2 >> "
+                        + output,
+                    ]
+                ),
+                0,
+            )
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "list", "--json", "8nodes"])
+            output_json = buf.getvalue()
+        self.assertEqual(rc, 0)
+        self.assertEqual(
+            [c["num_resources"] for c in json.loads(output_json)["queued"]], [2, 2]
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        with open(output) as f:
+            lines = f.readlines()
+        # only one command can get 2 resources out of 3
+        self.assertEqual(len(lines), 1)
+        res1, res2, res, env_res2 = lines[0].split()
+        self.assertNotEqual(res1, res2)
+        self.assertEqual(res, res1)
+        self.assertEqual(env_res2, res2)
+        self.file_exists("queue", "8nodes", "2")
+        self.assertEqual(run_cmd.count_available_resources(self.queue_dir, "8nodes"), 3)
+
+    def test_run_affinity(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster4", "cluster5", "cluster6"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "affinity", "true"]), 0
+        )
+        output = os.path.join(self.queue_dir, "output")
+        cmd = [
+            "dci-queue",
+            "schedule",
+            "-f",
+            "-a",
+            "pipe1",
+            "8nodes",
+            "--",
+            "bash",
+            "-c",
+            "echo @RESOURCE >> " + output,
+        ]
+
+        def last_resource():
+            with open(output) as f:
+                return f.readlines()[-1].strip()
+
+        self.assertEqual(main.main(cmd), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        first = last_resource()
+        self.assertEqual(
+            affinity.get_preferred(affinity.load(self.queue_dir, "8nodes"), "pipe1"),
+            [first],
+        )
+        # the resource of the previous run is preferred
+        affinity.record_resources(self.queue_dir, "8nodes", "pipe1", ["cluster6"])
+        self.assertEqual(main.main(cmd), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(last_resource(), "cluster6")
+        # wait for the busy preferred resource then fall back to another one
+        os.unlink(os.path.join(self.queue_dir, "available", "8nodes", "cluster6"))
+        self.assertEqual(main.main(cmd), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists("queue", "8nodes", "3")
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "affinity-max-wait", "0"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.doesnt_exist("queue", "8nodes", "3")
+        self.assertNotEqual(last_resource(), "cluster6")
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "list", "--json", "8nodes"])
+            output_json = buf.getvalue()
+        self.assertEqual(rc, 0)
+        self.assertEqual(
+            {
+                outcome: value["count"]
+                for outcome, value in json.loads(output_json)["affinity"].items()
+            },
+            {"new": 1, "hit": 1, "miss": 1},
+        )
+        # only the most recently run keys are kept
+        with patch.object(affinity, "MAX_KEYS", 2):
+            for key in ("pipe2", "pipe1", "pipe3"):
+                affinity.record_resources(self.queue_dir, "8nodes", key, ["cluster4"])
+        self.assertEqual(
+            list(affinity.load(self.queue_dir, "8nodes")["resources"]),
+            ["pipe1", "pipe3"],
+        )
+
+    def test_history(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "exit 3",
+                    "@RESOURCE",
+                ]
+            ),
+            0,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        entries = list(history.read(self.queue_dir, "8nodes"))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["id"], 1)
+        self.assertEqual(entries[0]["exit_code"], 3)
+        self.assertEqual(entries[0]["resources"], [["cluster4", "8nodes"]])
+        self.assertGreaterEqual(entries[0]["ended_at"], entries[0]["started_at"])
+
+        # estimations from the previous runs
+        wd = os.getcwd()
+        for cmd, duration in (
+            (["long", "@RESOURCE"], 600),
+            (["short", "@RESOURCE"], 60),
+        ):
+            for _ in range(2):
+                history.record(
+                    self.queue_dir,
+                    "8nodes",
+                    0,
+                    {"cmd": cmd, "wd": wd, "started_at": 1000},
+                    0,
+                    1000 + duration,
+                )
+            self.assertEqual(main.main(["dci-queue", "schedule", "8nodes"] + cmd), 0)
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "config",
+                    "8nodes",
+                    "scheduling-policy",
+                    "shortest-job-first",
+                ]
+            ),
+            0,
+        )
+        now = time.time()
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "list", "--json", "8nodes"])
+            output = buf.getvalue()
+        self.assertEqual(rc, 0)
+        queued = json.loads(output)["queued"]
+        self.assertEqual([c["id"] for c in queued], [3, 2])
+        self.assertEqual([c["estimated_duration"] for c in queued], [60, 600])
+        self.assertAlmostEqual(queued[0]["estimated_start"], now, delta=30)
+        self.assertAlmostEqual(queued[1]["estimated_start"], now + 60, delta=30)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "list", "8nodes"])
+            output = buf.getvalue()
+        self.assertIn("long @RESOURCE (wd: %s) [start in " % wd, output)
+        self.assertIn(", duration 10m]", output)
+        # the estimations do not parse the history
+        short = lib.get_fingerprint({"cmd": ["short", "@RESOURCE"], "wd": wd})
+        with patch.object(history, "read", side_effect=AssertionError):
+            self.assertEqual(history.get_estimates(self.queue_dir, "8nodes")[short], 60)
+        # rebuilt from a history without durations
+        os.unlink(history.get_durations_path(self.queue_dir, "8nodes"))
+        self.assertEqual(history.get_estimates(self.queue_dir, "8nodes")[short], 60)
+        self.file_exists("log", "8nodes", history.DURATIONS_FILE)
+
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "history-max-size", "1"]), 0
+        )
+        self.assertTrue(history.compact(self.queue_dir, "8nodes", 1))
+        self.assertEqual(len(list(history.read(self.queue_dir, "8nodes"))), 3)
+        # no entry appended to the old file while compacting
+        locks = history.get_lock(self.queue_dir, "8nodes")
+        locks.lock()
+        thread = threading.Thread(
+            target=history.record,
+            args=(self.queue_dir, "8nodes", 5, {"cmd": ["true"], "wd": wd}, 0),
+        )
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(len(list(history.read(self.queue_dir, "8nodes"))), 3)
+        locks.unlock()
+        thread.join()
+        self.assertEqual(len(list(history.read(self.queue_dir, "8nodes"))), 4)
+
+    def test_metrics(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        # disabled by default
+        self.doesnt_exist(".", "metrics")
+        self.doesnt_exist("config", "8nodes", metrics.METRICS_FILE)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "metrics", "true"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster5"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "true", "@RESOURCE"]), 0
+        )
+        textfile = os.path.join(self.queue_dir, "metrics", "dci_queue_8nodes.prom")
+        with open(textfile) as f:
+            content = f.read()
+        self.assertIn('dci_queue_queue_depth{pool="8nodes"} 1\n', content)
+        self.assertIn('dci_queue_resources{pool="8nodes",state="free"} 2\n', content)
+        # the metrics do not wait for the resource bookings
+        locks = lib.BookingLock(self.queue_dir, ["8nodes"])
+        locks.lock()
+        try:
+            thread = threading.Thread(
+                target=metrics.update, args=(self.queue_dir, "8nodes")
+            )
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+        finally:
+            locks.unlock()
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "remove-resource", "8nodes", "cluster5", "debug"]),
+            0,
+        )
+        with open(textfile) as f:
+            content = f.read()
+        for line in (
+            'dci_queue_queue_depth{pool="8nodes"} 0',
+            'dci_queue_resources{pool="8nodes",state="free"} 1',
+            'dci_queue_resources{pool="8nodes",state="removed"} 1',
+            'dci_queue_commands_total{pool="8nodes",result="success"} 1',
+            'dci_queue_wait_seconds_bucket{pool="8nodes",le="60"} 1',
+            'dci_queue_wait_seconds_count{pool="8nodes"} 1',
+            'dci_queue_run_seconds_count{pool="8nodes"} 1',
+            'dci_queue_dispatch_latency_seconds_count{pool="8nodes"} 1',
+        ):
+            self.assertIn(line + "\n", content)
+        metrics_dir = os.path.join(self.queue_dir, "textfile")
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "metrics-dir", metrics_dir]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "clean", "8nodes"]), 0)
+        self.file_exists(".", "textfile", "dci_queue_8nodes.prom")
+        self.assertEqual(main.main(["dci-queue", "remove-pool", "-n", "8nodes"]), 0)
+        self.doesnt_exist(".", "textfile", "dci_queue_8nodes.prom")
+
+    def test_autoscale(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        scale_up = os.path.join(self.queue_dir, "scale-up.sh")
+        scale_down = os.path.join(self.queue_dir, "scale-down.sh")
+        with open(scale_up, "w") as f:
+            f.write("#!/bin/bash\necho auto$DCI_QUEUE_SIZE extra$DCI_QUEUE_DEPTH\n")
+        with open(scale_down, "w") as f:
+            f.write("#!/bin/bash\ntouch %s/$1-retired\n" % self.queue_dir)
+        os.chmod(scale_up, 0o755)
+        os.chmod(scale_down, 0o755)
+        for key, value in (
+            ("scale-up-cmd", scale_up),
+            ("scale-up-queue-depth", "1"),
+            ("scale-down-cmd", scale_down),
+            ("scale-down-idle-time", "60"),
+            ("scale-max-size", "1"),
+            ("scale-cooldown", "0"),
+        ):
+            self.assertEqual(
+                main.main(["dci-queue", "config", "8nodes", key, value]), 0
+            )
+        output = os.path.join(self.queue_dir, "output")
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "echo @RESOURCE > " + output,
+                ]
+            ),
+            0,
+        )
+        # the pool is scaled up in the background without blocking the run
+        with open(scale_up, "a") as f:
+            f.write("sleep 1\n")
+        start = time.time()
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertLess(time.time() - start, 1)
+        self.file_exists("queue", "8nodes", "1")
+        for _ in range(100):
+            if not autoscale.is_running(self.queue_dir, "8nodes") and os.path.exists(
+                os.path.join(self.queue_dir, "pool", "8nodes", "auto0")
+            ):
+                break
+            time.sleep(0.1)
+        # the new resource is used by the next run
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        with open(output) as f:
+            self.assertEqual(f.read(), "auto0\n")
+        self.file_exists("pool", "8nodes", "auto0")
+        self.doesnt_exist("pool", "8nodes", "extra1")
+        self.assertEqual(
+            autoscale.load(self.queue_dir, "8nodes")["resources"], ["auto0"]
+        )
+        # not idle for long enough
+        self.assertEqual(main.main(["dci-queue", "autoscale", "8nodes"]), 0)
+        self.file_exists("pool", "8nodes", "auto0")
+        link = os.path.join(self.queue_dir, "available", "8nodes", "auto0")
+        os.utime(link, (time.time() - 120, time.time() - 120), follow_symlinks=False)
+        self.assertEqual(main.main(["dci-queue", "autoscale", "8nodes"]), 0)
+        self.file_exists(".", ".", "auto0-retired")
+        self.doesnt_exist("pool", "8nodes", "auto0")
+        self.doesnt_exist("available", "8nodes", "auto0")
+        self.assertEqual(autoscale.load(self.queue_dir, "8nodes")["resources"], [])
+
+    def test_health_check(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "bad1"]), 0)
+        check = os.path.join(self.queue_dir, "check.sh")
+        with open(check, "w") as f:
+            f.write(
+                "#!/bin/bash\n"
+                "case $1 in bad*) echo broken lab $DCI_QUEUE_RES; exit 1;; "
+                "slow*) sleep 5;; esac\n"
+            )
+        os.chmod(check, 0o755)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "health-check-cmd", check]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "health-check-timeout", "1"]),
+            0,
+        )
+        output = os.path.join(self.queue_dir, "output")
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "echo @RESOURCE > " + output,
+                ]
+            ),
+            0,
+        )
+        # the broken resource is removed and the command stays queued
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists("queue", "8nodes", "1")
+        self.doesnt_exist("pool", "8nodes", "bad1")
+        with open(os.path.join(self.queue_dir, "reason", "8nodes", "bad1")) as f:
+            self.assertIn("broken lab bad1", json.load(f)["reason"])
+        # a check timing out leaves the resource in the pool
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "slow1"]), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists("queue", "8nodes", "1")
+        self.file_exists("pool", "8nodes", "slow1")
+        self.link_exists("available", "8nodes", "slow1")
+        self.assertEqual(
+            main.main(["dci-queue", "remove-resource", "8nodes", "slow1", "slow"]), 0
+        )
+        # no more than MAX_HEALTH_REMOVALS resources removed by a run
+        for num in range(2, 3 + run_cmd.MAX_HEALTH_REMOVALS):
+            self.assertEqual(
+                main.main(["dci-queue", "add-resource", "8nodes", "bad%d" % num]), 0
+            )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists("queue", "8nodes", "1")
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.queue_dir, "pool", "8nodes"))), 1
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(os.listdir(os.path.join(self.queue_dir, "pool", "8nodes")), [])
+        # the next healthy resource is used
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "good1"]), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.doesnt_exist("queue", "8nodes", "1")
+        with open(output) as f:
+            self.assertEqual(f.read(), "good1\n")
+
+    def test_health_check_missing_hook(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster5"]), 0
+        )
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "config",
+                    "8nodes",
+                    "health-check-cmd",
+                    os.path.join(self.queue_dir, "missing-check"),
+                ]
+            ),
+            0,
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "--", "echo", "@RESOURCE"]),
+            0,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        # the resources are kept and the command stays queued
+        self.file_exists("queue", "8nodes", "1")
+        for res in ("cluster4", "cluster5"):
+            self.file_exists("pool", "8nodes", res)
+            self.link_exists("available", "8nodes", res)
+
+    def test_preemption(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "preemption-priority", "5"]),
+            0,
+        )
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "sleep 3000; echo @RESOURCE",
+                ]
+            ),
+            0,
+        )
+        os.system("dci-queue run 8nodes &")
+        time.sleep(5)
+        self.file_exists("queue", "8nodes", "1" + run_cmd.EXT)
+        output = os.path.join(self.queue_dir, "output")
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "-p",
+                    "10",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "echo @RESOURCE > " + output,
+                ]
+            ),
+            0,
+        )
+        # the low priority command is signaled without waiting for it
+        start = time.time()
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertLess(time.time() - start, 5)
+        self.assertFalse(os.path.exists(output))
+        self.file_exists("queue", "8nodes", "2")
+        # its runner puts it back in the queue and frees its resource
+        for _ in range(100):
+            if os.path.exists(os.path.join(self.queue_dir, "queue", "8nodes", "1")):
+                break
+            time.sleep(0.1)
+        self.file_exists("queue", "8nodes", "1")
+        self.doesnt_exist("queue", "8nodes", "1" + run_cmd.EXT)
+        with open(os.path.join(self.queue_dir, "queue", "8nodes", "1")) as f:
+            data = json.load(f)
+        self.assertEqual(data["preemptions"], 1)
+        self.assertEqual(data["preempted_by"], 2)
+        self.assertNotIn("pid", data)
+        self.assertNotIn("preemption", data)
+        time.sleep(1)
+        # the urgent command starts at the next run
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        with open(output) as f:
+            self.assertEqual(f.read(), "cluster4\n")
+        entries = list(history.read(self.queue_dir, "8nodes"))
+        self.assertEqual(
+            [(e["id"], e.get("preempted_by")) for e in entries], [(1, 2), (2, None)]
+        )
+        # a command below the threshold doesn't preempt
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "preemption-priority", "20"]),
+            0,
+        )
+        os.system("dci-queue run 8nodes &")
+        time.sleep(5)
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-p", "10", "8nodes", "echo", "@RESOURCE"]
+            ),
+            0,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists("queue", "8nodes", "1" + run_cmd.EXT)
+        self.file_exists("queue", "8nodes", "3")
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "1"]), 0)
+
+    def test_dependencies(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster4", "cluster5"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "--after", "1", "8nodes", "@RESOURCE"]),
+            1,
+        )
+        output = os.path.join(self.queue_dir, "output")
+        for opts, cmd in (
+            ([], "sleep 2; exit 1 # @RESOURCE"),
+            (["--after", "1"], "echo @RESOURCE > " + output),
+            (["--after", "1", "--after-success"], "echo 3 @RESOURCE"),
+            (["--after", "3"], "echo 4 @RESOURCE"),
+            (["--after", "2", "--after-success"], "echo 5 @RESOURCE"),
+        ):
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule"]
+                    + opts
+                    + ["8nodes", "--", "bash", "-c", cmd]
+                ),
+                0,
+            )
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "--after-success", "8nodes", "@RESOURCE"]
+            ),
+            1,
+        )
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(main.main(["dci-queue", "list", "8nodes"]), 0)
+            self.assertIn(" [AFTER-SUCCESS 1]", buf.getvalue())
+        # only the first command can run
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(run_cmd.RET_CODE[1], 1)
+        self.assertFalse(os.path.exists(output))
+        for idx in ("2", "3", "4", "5"):
+            self.file_exists("queue", "8nodes", idx)
+        # 3 is cancelled as 1 failed, 2 and 4 run then 5
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertTrue(os.path.exists(output))
+        self.doesnt_exist("queue", "8nodes", "3")
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        for idx in ("2", "4", "5"):
+            self.doesnt_exist("queue", "8nodes", idx)
+        self.assertEqual(
+            [entry["id"] for entry in history.read(self.queue_dir, "8nodes")],
+            [1, 2, 4, 5],
+        )
+
+    def test_dependencies_history(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for num in range(4):
+            self.assertEqual(
+                main.main(["dci-queue", "add-resource", "8nodes", "cluster%d" % num]),
+                0,
+            )
+        for num in range(4):
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule", "8nodes", "echo", str(num), "@RESOURCE"]
+                ),
+                0,
+            )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "--after", "1", "--after-success"]
+                + ["8nodes", "echo", "@RESOURCE"]
+            ),
+            0,
+        )
+        # the compaction keeps the result of the awaited command
+        self.assertTrue(history.compact(self.queue_dir, "8nodes", 1))
+        self.assertEqual(
+            [entry["id"] for entry in history.read(self.queue_dir, "8nodes")],
+            [1, 3, 4],
+        )
+        _, queued = lib.read_queue(self.queue_dir, "8nodes")
+        # the results are not read during a compaction
+        locks = history.get_lock(self.queue_dir, "8nodes")
+        locks.lock()
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(
+                dependencies.split_ready(self.queue_dir, "8nodes", queued, [])
+            )
+        )
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        locks.unlock()
+        thread.join()
+        ready, waiting, cancelled = results[0]
+        self.assertEqual(([cmd[0] for cmd in ready], waiting, cancelled), ([5], [], []))
+
+    def test_admission(self):
+        for pool in ("8nodes", "4nodes"):
+            self.assertEqual(main.main(["dci-queue", "add-pool", "-n", pool]), 0)
+            for res in ("cluster1", "cluster2"):
+                self.assertEqual(main.main(["dci-queue", "add-resource", pool, res]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "max-running", "1"]), 0
+        )
+        for num in range(2):
+            self.assertEqual(
+                main.main(
+                    [
+                        "dci-queue",
+                        "schedule",
+                        "8nodes",
+                        "--",
+                        "bash",
+                        "-c",
+                        "sleep 3000 # %d @RESOURCE" % num,
+                    ]
+                ),
+                0,
+            )
+        os.system("dci-queue run 8nodes &")
+        time.sleep(5)
+        # only one command of the pool can run
+        self.file_exists("queue", "8nodes", "1" + run_cmd.EXT)
+        self.file_exists("queue", "8nodes", "2")
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.file_exists("queue", "8nodes", "2")
+        self.file_exists("available", "8nodes", "cluster2")
+        # host wide limit
+        self.assertEqual(
+            main.main(["dci-queue", "config", "4nodes", "host-max-running", "1"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "4nodes", "echo", "@RESOURCE"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "4nodes"]), 0)
+        self.file_exists("queue", "4nodes", "1")
+        # the host settings are shared by all the pools
+        self.assertEqual(
+            lib.get_config(self.queue_dir, "8nodes")["host-max-running"], 1
+        )
+        self.assertNotIn(
+            "host-max-running",
+            lib.load_config_file(lib.get_config_path(self.queue_dir, "4nodes")),
+        )
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "1"]), 0)
+        time.sleep(1)
+        # memory limit
+        self.assertEqual(
+            main.main(["dci-queue", "config", "4nodes", "host-min-memory", "1000T"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "4nodes"]), 0)
+        if admission.get_available_memory() is not None:
+            self.file_exists("queue", "4nodes", "1")
+        self.assertEqual(
+            main.main(["dci-queue", "config", "-u", "4nodes", "host-min-memory"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "4nodes"]), 0)
+        self.doesnt_exist("queue", "4nodes", "1")
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "2"]), 0)
+
+    def test_admission_host_lock(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE"]), 0
+        )
+        host_lock = lib.HostLock(self.queue_dir)
+        host_lock.lock()
+        try:
+            runner = threading.Thread(
+                target=main.main, args=(["dci-queue", "run", "8nodes"],)
+            )
+            runner.start()
+            time.sleep(1)
+            # booked but not started while another runner holds the lock
+            self.file_exists("queue", "8nodes", "1")
+        finally:
+            host_lock.unlock()
+        runner.join(10)
+        self.assertFalse(runner.is_alive())
+        self.doesnt_exist("queue", "8nodes", "1")
+        self.file_exists("available", "8nodes", "cluster4")
+
+    def test_available_memory(self):
+        meminfo = os.path.join(self.queue_dir, "meminfo")
+        with open(meminfo, "w") as f:
+            f.write("MemTotal:       16000000 kB\nMemAvailable:    2048 kB\n")
+        self.assertEqual(admission.get_available_memory(meminfo), 2048 * 1024)
+        self.assertIsNone(admission.get_available_memory(meminfo + ".missing"))
+
+    def test_schedule_from_file(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE"]), 0
+        )
+        manifest = os.path.join(self.queue_dir, "manifest.jsonl")
+        with open(manifest, "w") as f:
+            f.write(
+                json.dumps({"cmd": ["echo", "1", "@RESOURCE"], "priority": 3})
+                + "\n\n"
+                + json.dumps({"cmd": "echo '2 3' @RESOURCE", "after": [2]})
+                + "\n"
+                # duplicate of the command queued before
+                + json.dumps({"cmd": ["echo", "@RESOURCE"]})
+                + "\n"
+            )
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(
+                ["dci-queue", "schedule", "-p", "1", "--from-file", manifest, "8nodes"]
+            )
+            output = buf.getvalue()
+        self.assertEqual(rc, 0)
+        self.assertEqual(output, "2\n3\n1\n")
+        with open(os.path.join(self.queue_dir, "queue", "8nodes", "2")) as f:
+            self.assertEqual(json.load(f)["priority"], 3)
+        with open(os.path.join(self.queue_dir, "queue", "8nodes", "3")) as f:
+            data = json.load(f)
+        self.assertEqual(data["cmd"], ["echo", "2 3", "@RESOURCE"])
+        self.assertEqual(data["priority"], 1)
+        self.assertEqual(data["after"], [2])
+        # from stdin, nothing is queued when an entry is invalid
+        stdin = sys.stdin
+        try:
+            sys.stdin = io.StringIO(
+                json.dumps({"cmd": ["echo", "4", "@RESOURCE"]})
+                + "\n"
+                + json.dumps({"cmd": ["echo", "5", "@RESOURCE"], "after": [5]})
+                + "\n"
+            )
+            self.assertEqual(
+                main.main(["dci-queue", "schedule", "--from-file", "-", "8nodes"]), 1
+            )
+            sys.stdin = io.StringIO(json.dumps({"cmd": ["echo", "4"]}) + "\n")
+            self.assertEqual(
+                main.main(["dci-queue", "schedule", "--from-file", "-", "8nodes"]), 1
+            )
+        finally:
+            sys.stdin = stdin
+        self.doesnt_exist("queue", "8nodes", "4")
+
+    def start_server(self, lease_time=None, token=None):
+        httpd = server.make_server(self.queue_dir, "127.0.0.1", 0, lease_time, token)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        return httpd, "http://127.0.0.1:%d" % httpd.server_address[1]
+
+    def test_server_clients(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster4", "cluster5"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        _, url = self.start_server()
+        queue_client = client.Client(url)
+        self.assertEqual(queue_client.list_pools(), ["8nodes"])
+        ids = queue_client.schedule(
+            "8nodes",
+            [
+                {
+                    "cmd": [
+                        "bash",
+                        "-c",
+                        "sleep 1; echo %d $DCI_QUEUE_RES @RESOURCE" % n,
+                    ],
+                    "wd": self.queue_dir,
+                }
+                for n in range(3)
+            ],
+        )
+        self.assertEqual(ids, [1, 2, 3])
+        # 2 clients on different hosts share the 2 resources
+        results = {}
+        threads = [
+            threading.Thread(
+                target=lambda host: results.update(
+                    client.run(client.Client(url), "8nodes", host)
+                ),
+                args=(host,),
+            )
+            for host in ("host1", "host2")
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {1: 0, 2: 0, 3: 0})
+        content, offset, running = queue_client.read_log("8nodes", 1)
+        self.assertFalse(running)
+        self.assertEqual(offset, len(content))
+        self.assertRegex(content.decode(), r"\+ host host[12]\n")
+        self.assertRegex(content.decode(), r"\n0 (cluster[45]) \1\n")
+        # logs compressed by the retention are still served
+        retention.compress_log(self.queue_dir, "8nodes", 1)
+        self.assertEqual(
+            queue_client.read_log("8nodes", 1, 2), (content[2:], offset, False)
+        )
+        self.assertEqual(
+            sorted(entry["id"] for entry in history.read(self.queue_dir, "8nodes")),
+            [1, 2, 3],
+        )
+        self.file_exists("available", "8nodes", "cluster4")
+        self.file_exists("available", "8nodes", "cluster5")
+        # command line client
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "remote", "-u", url, "schedule", "8nodes", "--"]
+                + ["bash", "-c", "exit 3 # @RESOURCE"]
+            ),
+            0,
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "remote", "-u", url, "run", "8nodes"]), 0
+        )
+        entry = list(history.read(self.queue_dir, "8nodes"))[-1]
+        self.assertEqual((entry["id"], entry["exit_code"]), (4, 3))
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "remote", "-u", url, "list", "-j", "8nodes"])
+            state = json.loads(buf.getvalue())
+        self.assertEqual(rc, 0)
+        self.assertEqual(state["queued"], [])
+
+    def test_server_lease(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        httpd, url = self.start_server(lease_time=1, token="secret")
+        with self.assertRaises(client.ClientError) as ctx:
+            client.Client(url).list_pools()
+        self.assertEqual(ctx.exception.code, 401)
+        queue_client = client.Client(url, "secret")
+        self.assertEqual(
+            queue_client.schedule("8nodes", [{"cmd": "echo @RESOURCE"}]), [1]
+        )
+        claim = queue_client.claim("8nodes", "deadhost")
+        self.assertEqual(claim["cmd"], ["echo", "cluster4"])
+        self.assertEqual(claim["env"]["DCI_QUEUE_RES"], "cluster4")
+        self.assertIsNone(queue_client.claim("8nodes", "otherhost"))
+        self.file_exists("queue", "8nodes", "1" + run_cmd.EXT)
+        self.doesnt_exist("available", "8nodes", "cluster4")
+        queue_client.renew("8nodes", 1, claim["lease"])
+        # a long dispatch of the pool does not block the renewals
+        with httpd.queue.get_pool_lock("8nodes"):
+            client.Client(url, "secret", timeout=5).renew("8nodes", 1, claim["lease"])
+        # the host died: the lease expires
+        time.sleep(1.2)
+        self.assertEqual(httpd.queue.expire_leases(), [("8nodes", 1)])
+        self.file_exists("queue", "8nodes", "1")
+        self.file_exists("available", "8nodes", "cluster4")
+        with self.assertRaises(client.ClientError) as ctx:
+            queue_client.renew("8nodes", 1, claim["lease"])
+        self.assertEqual(ctx.exception.code, 409)
+        # unschedule a command running on a remote host
+        claim = queue_client.claim("8nodes", "host1")
+        self.assertEqual(claim["id"], 1)
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "1"]), 0)
+        self.doesnt_exist("queue", "8nodes", "1" + run_cmd.EXT)
+        self.file_exists("available", "8nodes", "cluster4")
+        with self.assertRaises(client.ClientError) as ctx:
+            queue_client.release("8nodes", 1, claim["lease"], 0)
+        self.assertEqual(ctx.exception.code, 409)
+
+    def test_server_admission(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster4", "cluster5"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        for key, value in (("host-max-running", "1"), ("host-max-load", "4")):
+            self.assertEqual(
+                main.main(["dci-queue", "config", "8nodes", key, value]), 0
+            )
+        for num in range(3):
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule", "8nodes", "echo", str(num), "@RESOURCE"]
+                ),
+                0,
+            )
+        httpd, _ = self.start_server()
+        queue = httpd.queue
+        # the limits apply to the load of the remote host, not of the server
+        with patch.object(admission, "get_load", return_value=100.0):
+            claim = queue.claim("8nodes", "host1", {"load": 0.5})
+        self.assertEqual(claim["id"], 1)
+        self.assertIsNone(queue.claim("8nodes", "host2", {"load": 5.0}))
+        # the commands leased to a host count for this host only
+        self.assertIsNone(queue.claim("8nodes", "host1", {"load": 0.5}))
+        self.assertEqual(admission.count_running(self.queue_dir, host="host1"), 1)
+        self.assertEqual(admission.count_running(self.queue_dir), 0)
+        claim = queue.claim("8nodes", "host2", {"load": 0.5})
+        self.assertEqual(claim["id"], 2)
+        self.file_exists("queue", "8nodes", "3")
+        with open(queue.get_execfile("8nodes", 2)) as f:
+            self.assertEqual(json.load(f)["lease"]["host"], "host2")
+
+    def test_server_read_log(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        log_dir = os.path.join(self.queue_dir, "log", "8nodes")
+        content = os.urandom(5000)
+        with open(os.path.join(log_dir, "1"), "wb") as f:
+            f.write(content)
+        httpd, url = self.start_server()
+        queue_client = client.Client(url)
+        with patch.object(server, "MAX_LOG_READ", 2048):
+            self.assertEqual(
+                queue_client.read_log("8nodes", 1), (content[:2048], 2048, False)
+            )
+            retention.compress_log(self.queue_dir, "8nodes", 1)
+            with patch.object(server.gzip, "open", wraps=gzip.open) as opener:
+                chunks = []
+                offset = 0
+                while True:
+                    chunk, offset, _ = queue_client.read_log("8nodes", 1, offset)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                # decompressed once for the 3 chunks, once more for the end
+                self.assertEqual(opener.call_count, 2)
+            self.assertEqual([len(chunk) for chunk in chunks], [2048, 2048, 904])
+            self.assertEqual(b"".join(chunks), content)
+            self.assertEqual(httpd.queue.log_readers, {})
+            # the command line client reads all the chunks
+            with patch.object(sys, "stdout") as stdout:
+                stdout.buffer = io.BytesIO()
+                self.assertEqual(
+                    main.main(["dci-queue", "remote", "-u", url, "log", "8nodes", "1"]),
+                    0,
+                )
+                self.assertEqual(stdout.buffer.getvalue(), content)
+
     def test_partial_resource_booking_bug(self):
         """Test that demonstrates the bug where jobs launch with partial resource booking.
 
@@ -819,7 +2486,9 @@ class TestQueue(unittest.TestCase):
         # Add resources: primary pool has resources, extra pool has NO resources
         self.assertEqual(main.main(["dci-queue", "add-resource", "primary", "res1"]), 0)
         self.assertEqual(main.main(["dci-queue", "add-resource", "primary", "res2"]), 0)
-        # Intentionally NOT adding resources to extra pool to simulate unavailable resources
+        # The extra pool has a resource but it is not available (booked elsewhere)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "extra", "res3"]), 0)
+        os.unlink(os.path.join(self.queue_dir, "available", "extra", "res3"))
 
         # Create a test script that will detect if it runs with partial resources
         test_script = os.path.join(self.queue_dir, "test_partial_booking.sh")
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2020-2025 Red Hat, Inc
+# Copyright (C) 2020-2026 Red Hat, Inc
 #
 # Licensed under the Apache License, Version 2.0 (the "License"); you may
 # not use this file except in compliance with the License. You may obtain
@@ -18,16 +18,13 @@
 import json
 import logging
 import os
-import signal
 import sys
-import time
 
-from dciqueue import lib
-from dciqueue.run_cmd import EXT
+from dciqueue import lib, metrics
+from dciqueue.run_cmd import EXT, free_resources
 
 if sys.version_info[0] == 2:
     FileNotFoundError = OSError
-    ProcessLookupError = OSError
 
 log = logging.getLogger(__name__)
 
@@ -60,33 +57,37 @@ def execute_command(args):
                         "Un-queuing command %s from %s by killing %d"
                         % (args.id, args.pool, data["pid"])
                     )
-                    os.kill(data["pid"], signal.SIGTERM)
-                    # wait for the process to exit
-                    sec = 300
-                    while sec > 0:
-                        try:
-                            log.info("Waiting for process %d to finish" % data["pid"])
-                            os.kill(data["pid"], 0)
-                            time.sleep(1)
-                            sec = sec - 1
-                        except ProcessLookupError:
-                            log.info(
-                                "Process %d is finished, removing %s"
-                                % (data["pid"], queuefile)
-                            )
-                            try:
-                                os.unlink(queuefile)
-                            except FileNotFoundError:
-                                pass
-                            break
-                    if sec <= 0:
-                        sys.stderr.write("Unable to finish command %d\n" % args.id)
+                    grace_period = lib.get_config(args.top_dir, args.pool)[
+                        "kill-grace-period"
+                    ]
+                    if not lib.terminate_command(data, grace_period):
+                        sys.stderr.write("Unable to finish command %s\n" % args.id)
                         return 1
+                    log.info(
+                        "Process %d is finished, removing %s" % (data["pid"], queuefile)
+                    )
+                    try:
+                        os.unlink(queuefile)
+                    except FileNotFoundError:
+                        pass
+                elif "lease" in data:
+                    # the client stops the command when its lease is lost
+                    log.info(
+                        "Un-queuing command %s from %s running on %s"
+                        % (args.id, args.pool, data["lease"]["host"])
+                    )
+                    try:
+                        os.unlink(queuefile)
+                    except FileNotFoundError:
+                        pass
+                    else:
+                        free_resources(data["booked"], args.top_dir)
                 else:
-                    sys.stderr.write("Unable to stop command %d\n" % args.id)
+                    sys.stderr.write("Unable to stop command %s\n" % args.id)
                     return 1
         else:
             log.info("File not found %s" % queuefile)
+    metrics.publish(args.top_dir, args.pool)
     return 0
 
 
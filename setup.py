@@ -25,7 +25,7 @@ readme = open(os.path.join(root_dir, "README.md")).read()
 setuptools.setup(
     name="dci-pipeline",
     version="0.15.0",  # keep in sync with dci-pipeline.spec and Dockerfile
-    packages=setuptools.find_packages(exclude=("tests")),
+    packages=setuptools.find_packages(exclude=("tests", "tests.*")),
     author="Distributed CI team",
     author_email="distributed-ci@redhat.com",
     description="DCI Pipeline",
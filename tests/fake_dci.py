@@ -0,0 +1,58 @@
+#
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+"""Fake DCI API responses and jobs shared by the unit tests."""
+
+
+class Response(object):
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.text = str(content)
+
+    def json(self):
+        return self.content
+
+
+def make_job(num, status="success", components=True, name=None, updated_at=None):
+    """Return the job num of pipeline1.
+
+    components is a list of (type, name) tuples, True for an ocp 4.<num>
+    component or False to not embed the components.
+    """
+    job = {
+        "id": "job%d" % num,
+        "pipeline_id": "pipeline1",
+        "status": status,
+        "data": {"pipeline": {"name": name or "job%d" % num}},
+    }
+    if updated_at:
+        job["updated_at"] = updated_at
+    if components is True:
+        components = [("ocp", "4.%d" % num)]
+    if components is not False:
+        job["components"] = [
+            {"type": c_type, "name": c_name} for c_type, c_name in components
+        ]
+    return job
+
+
+def make_run(num, status, components):
+    """Return the jobs of a run of a single job pipeline."""
+    return [make_job(num, status, components, "openshift")]
+
+
+# fake_dci.py ends here